@@ -17,9 +17,6 @@ function AdminDashboard() {
     totalPests: 0 // New stat for total pests
   });
   const [recentDetections, setRecentDetections] = useState([]);
-  const [allUsers, setAllUsers] = useState([]); // New state for all users
-  const [allFeedback, setAllFeedback] = useState([]); // New state for all feedback
-  const [allPesticides, setAllPesticides] = useState([]); // New state for all pesticides
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const navigate = useNavigate();
@@ -59,21 +56,12 @@ function AdminDashboard() {
     const fetchAdminData = async () => {
       setLoading(true);
       try {
-        const reports = await ApiService.getReports();
-        const users = await ApiService.getUsers();
-        const feedback = await ApiService.getFeedback();
-        const pesticides = await ApiService.getPesticides();
-        const pests = await ApiService.getPests(); // Fetch pests
-        
-        // Calculate total counts
-        const totalReportsCount = reports.length;
-        const totalUsersCount = users.length;
-        const totalFeedbackCount = feedback.length;
-        const totalPesticidesCount = pesticides.length;
-        const totalPestsCount = pests.length; // Calculate total pests
+        // One aggregated request instead of downloading the reports, users, feedback,
+        // pesticides and pests tables
+        const adminStats = await ApiService.getAdminStats({ latest: 5 });
+        const { totals } = adminStats;
 
-        // Get recent detections (e.g., last 5)
-        const recent = reports.slice(0, 5).map(report => ({
+        const recent = adminStats.latest_detections.map(report => ({
           user_name: report.user_id, // Use user_id for now
           pest_name: report.pest_name,
           confidence: report.confidence,
@@ -81,18 +69,14 @@ function AdminDashboard() {
         }));
 
         setStats({
-          totalUsers: totalUsersCount,
-          totalDetections: totalReportsCount, 
-          totalReports: totalReportsCount,
-          totalFeedback: totalFeedbackCount,
-          totalPesticides: totalPesticidesCount,
-          totalPests: totalPestsCount // Update totalPests stat
+          totalUsers: totals.users,
+          totalDetections: totals.reports,
+          totalReports: totals.reports,
+          totalFeedback: totals.feedback,
+          totalPesticides: totals.pesticides,
+          totalPests: totals.pests
         });
         setRecentDetections(recent);
-        setAllUsers(users); // Store all users for potential display
-        setAllFeedback(feedback); // Store all feedback for potential display
-        setAllPesticides(pesticides); // Store all pesticides for potential display
-        
       } catch (err) {
         console.error('Error fetching admin data:', err);
         setError('Failed to load admin data. Please check backend connection.');
@@ -87,8 +87,8 @@ function PestDetectPage() {
     try {
       console.log('Starting pest detection...');
       
-      // Call the actual API
-      const predictionResult = await ApiService.detectPest(selectedFile);
+      // Call the actual API; pest details come back in the same response
+      const predictionResult = await ApiService.detectPest(selectedFile, { topK: 3, includeInfo: true });
       console.log('API Prediction Response:', predictionResult);
 
       if (predictionResult.error) {
@@ -97,10 +97,14 @@ function PestDetectPage() {
         return;
       }
 
-      // Fetch detailed pest information
-      console.log('Fetching detailed pest info for:', predictionResult.class);
-      const pestInfo = await ApiService.getPestInfo(predictionResult.class);
-      console.log('API Pest Info Response:', pestInfo);
+      const [best, ...alternatives] = predictionResult.predictions || [];
+      let pestInfo = best;
+      if (!pestInfo || !pestInfo.description) {
+        // Older backend without embedded details: fall back to a second request
+        console.log('Fetching detailed pest info for:', predictionResult.class);
+        pestInfo = await ApiService.getPestInfo(predictionResult.class);
+        console.log('API Pest Info Response:', pestInfo);
+      }
 
       if (pestInfo.error) {
         // Handle case where pest info isn't found or has an error
@@ -129,7 +133,8 @@ function PestDetectPage() {
         confidence: predictionResult.confidence,
         description: pestInfo.description,
         pesticides: pestInfo.pesticides,
-        // Add other fields from pestInfo if available and needed
+        // Runner-up classes with their own details, for display when the top match is uncertain
+        alternatives: alternatives,
       };
 
       setSuccess('Pest detected successfully with full details!');
@@ -12,16 +12,38 @@ function PestReportsPage() {
   const [error, setError] = useState('');
   const [filter, setFilter] = useState('all');
   const [searchTerm, setSearchTerm] = useState('');
+  const [appliedSearch, setAppliedSearch] = useState(''); // pest name prefix the list is filtered by
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [matchCount, setMatchCount] = useState({ count: 0, exact: true });
   const navigate = useNavigate();
 
+  // Server-side filters for the filter option and the submitted search
+  const filterParams = (value, search) => {
+    const params = search ? { pest_name_prefix: search } : {};
+    if (value === 'high_confidence') {
+      return { ...params, min_confidence: 0.8 };
+    }
+    if (value === 'low_confidence') {
+      return { ...params, max_confidence: 0.8 };
+    }
+    if (value === 'recent') {
+      const sevenDaysAgo = new Date();
+      sevenDaysAgo.setDate(sevenDaysAgo.getDate() - 7);
+      return { ...params, since: sevenDaysAgo.toISOString() };
+    }
+    return params;
+  };
+
   useEffect(() => {
     const fetchReports = async () => {
       setLoading(true);
       try {
-        const fetchedReports = await ApiService.getReports();
-        // Assuming fetchedReports items have id, date (timestamp), pest_name, confidence, user_id
-        // Map backend data to frontend expected structure (if needed, currently backend returns compatible structure)
-        setReports(fetchedReports);
+        const page = await ApiService.getReports({ filters: filterParams(filter, appliedSearch) });
+        // Report items have id, timestamp, pest_name, confidence, user_id
+        setReports(page.results);
+        setNextCursor(ApiService.cursorFrom(page.next));
+        setMatchCount({ count: page.count, exact: page.count_is_exact });
       } catch (err) {
         console.error('Error fetching reports:', err);
         setError('Failed to load reports. Please try again.');
@@ -31,12 +53,26 @@ function PestReportsPage() {
     };
 
     fetchReports();
-  }, []); // Empty dependency array means this runs once on mount
+  }, [filter, appliedSearch]); // Refetch whenever the filter or the search changes
+
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const page = await ApiService.getReports({ cursor: nextCursor, filters: filterParams(filter, appliedSearch) });
+      setReports(previous => [...previous, ...page.results]);
+      setNextCursor(ApiService.cursorFrom(page.next));
+    } catch (err) {
+      console.error('Error fetching reports:', err);
+      setError('Failed to load more reports. Please try again.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
   const handleSearch = (e) => {
     e.preventDefault();
-    // In a real app, this would filter the reports on frontend or send a search query to backend
-    console.log('Searching for:', searchTerm);
+    // Filtered by the server and paged like the rest of the list
+    setAppliedSearch(searchTerm.trim());
   };
 
   const handleFilterChange = (value) => {
@@ -86,26 +122,8 @@ function PestReportsPage() {
     { value: 'low_confidence', label: 'Low Confidence' }
   ];
 
-  const filteredReports = reports.filter(report => {
-    // Ensure report.pest_name exists before calling toLowerCase
-    if (searchTerm && (!report.pest_name || !report.pest_name.toLowerCase().includes(searchTerm.toLowerCase()))) {
-      return false;
-    }
-    if (filter === 'high_confidence' && report.confidence < 0.8) {
-      return false;
-    }
-    if (filter === 'low_confidence' && report.confidence >= 0.8) {
-      return false;
-    }
-    // Filter by recent (last 7 days) if needed, based on report.timestamp or report.date
-    // For now, assuming report.timestamp is available for recent filtering
-    if (filter === 'recent') {
-      const sevenDaysAgo = new Date();
-      sevenDaysAgo.setDate(sevenDaysAgo.getDate() - 7);
-      return new Date(report.timestamp) >= sevenDaysAgo; // Use timestamp for filtering
-    }
-    return true;
-  });
+  // Search, confidence and date filters are all applied by the server
+  const filteredReports = reports;
 
   return (
     <BackgroundContainer>
@@ -284,13 +302,32 @@ function PestReportsPage() {
                   </tbody>
                 </table>
               </div>
+
+              {nextCursor && (
+                <div style={{ textAlign: 'center', marginTop: '20px' }}>
+                  <button
+                    onClick={handleLoadMore}
+                    disabled={loadingMore}
+                    style={{
+                      padding: '10px 20px',
+                      background: '#1976d2',
+                      color: 'white',
+                      border: 'none',
+                      borderRadius: '6px',
+                      cursor: loadingMore ? 'default' : 'pointer'
+                    }}
+                  >
+                    {loadingMore ? 'Loading...' : 'Load More Reports'}
+                  </button>
+                </div>
+              )}
             </>
           ) : (
             <div style={{ textAlign: 'center', padding: '40px' }}>
               <div style={{ fontSize: '48px', marginBottom: '20px' }}>📊</div>
               <h3 style={{ margin: '0 0 10px 0', color: '#666' }}>No Reports Found</h3>
               <p style={{ color: '#666', margin: '0 0 20px 0' }}>
-                {searchTerm || filter !== 'all' 
+                {appliedSearch || filter !== 'all' 
                   ? 'Try adjusting your search or filter criteria.'
                   : 'Start by detecting a pest to create your first report!'
                 }
@@ -320,15 +357,15 @@ function PestReportsPage() {
           marginTop: '30px' 
         }}>
           <Card style={{ textAlign: 'center', background: '#e3f2fd' }}>
-            <h3 style={{ margin: '0 0 10px 0', color: '#1976d2' }}>Total Reports</h3>
+            <h3 style={{ margin: '0 0 10px 0', color: '#1976d2' }}>Loaded Reports</h3>
             <div style={{ fontSize: '24px', fontWeight: 'bold', color: '#1976d2' }}>
-              {reports.length}
+              {reports.length}{nextCursor ? '+' : ''}
             </div>
           </Card>
           <Card style={{ textAlign: 'center', background: '#f3e5f5' }}>
             <h3 style={{ margin: '0 0 10px 0', color: '#9c27b0' }}>Filtered Results</h3>
             <div style={{ fontSize: '24px', fontWeight: 'bold', color: '#9c27b0' }}>
-              {filteredReports.length}
+              {`${matchCount.count}${matchCount.exact ? '' : '+'}`}
             </div>
           </Card>
           <Card style={{ textAlign: 'center', background: '#e8f5e8' }}>
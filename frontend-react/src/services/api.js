@@ -46,10 +46,18 @@ class ApiService {
       throw error;
     }
   }
-  static async detectPest(imageFile) {
+  // topK lists the k most likely classes under `predictions`; includeInfo embeds each one's
+  // description and pesticides so no follow-up getPestInfo request is needed
+  static async detectPest(imageFile, { topK, includeInfo = false } = {}) {
     try {
       const formData = new FormData();
       formData.append('image', imageFile);
+      if (topK) {
+        formData.append('top_k', String(topK));
+      }
+      if (includeInfo) {
+        formData.append('include_info', '1');
+      }
 
       const response = await fetch(`${API_BASE_URL}/predict/`, {
         method: 'POST',
@@ -68,6 +76,109 @@ class ApiService {
     }
   }
 
+  // Queues the image and waits for the job by polling its status (no web thread is held
+  // between polls). useEvents switches to server-sent events, which hold a thread for up to
+  // SMARTPEST_JOB_EVENTS_WINDOW seconds per connection.
+  static async detectPestAsync(imageFile, { useEvents = false, timeoutMs = 300000 } = {}) {
+    const formData = new FormData();
+    formData.append('image', imageFile);
+
+    const response = await fetch(`${API_BASE_URL}/jobs/`, {
+      method: 'POST',
+      body: formData,
+    });
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const { job_id: jobId } = await response.json();
+    const deadline = Date.now() + timeoutMs;
+
+    if (useEvents) {
+      return new Promise((resolve, reject) => {
+        const events = new EventSource(`${API_BASE_URL}/jobs/${jobId}/events/`);
+        const timer = setTimeout(() => {
+          events.close();
+          reject(new Error(`Prediction job ${jobId} did not finish in time`));
+        }, timeoutMs);
+        events.addEventListener('status', (event) => {
+          const job = JSON.parse(event.data);
+          if (job.status === 'done' || job.status === 'failed') {
+            clearTimeout(timer);
+            events.close();
+            resolve(job);
+          }
+        });
+        // The server ends each stream after a short window; EventSource reconnects by itself,
+        // so only give up once it stops retrying
+        events.onerror = () => {
+          if (events.readyState === EventSource.CLOSED) {
+            clearTimeout(timer);
+            reject(new Error(`Lost connection while waiting for prediction job ${jobId}`));
+          }
+        };
+      });
+    }
+
+    let delay = 500;
+    while (Date.now() < deadline) {
+      await new Promise((resolve) => setTimeout(resolve, delay));
+      const statusResponse = await fetch(`${API_BASE_URL}/jobs/${jobId}/`);
+      if (!statusResponse.ok) {
+        throw new Error(`HTTP error! status: ${statusResponse.status}`);
+      }
+      const job = await statusResponse.json();
+      if (job.status === 'done' || job.status === 'failed') {
+        return job;
+      }
+      delay = Math.min(delay * 1.5, 3000);
+    }
+    throw new Error(`Prediction job ${jobId} did not finish in time`);
+  }
+
+  // Streams one NDJSON result per image; onResult is called as each line arrives
+  static async detectPestBatch(imageFiles, onResult) {
+    try {
+      const formData = new FormData();
+      imageFiles.forEach((file) => formData.append('images', file));
+
+      const response = await fetch(`${API_BASE_URL}/predict/batch/`, {
+        method: 'POST',
+        body: formData,
+      });
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      const results = [];
+      let buffered = '';
+      let summary = null;
+      for (;;) {
+        const { value, done } = await reader.read();
+        buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+        const lines = buffered.split('\n');
+        buffered = lines.pop();
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const entry = JSON.parse(line);
+          if (entry.summary) {
+            summary = entry.summary;
+          } else {
+            results.push(entry);
+            if (onResult) onResult(entry);
+          }
+        }
+        if (done) break;
+      }
+      return { results, summary };
+    } catch (error) {
+      console.error('API Error during batch detection:', error);
+      throw error;
+    }
+  }
+
   static async getPestInfo(pestName) {
     try {
       const response = await fetch(`${API_BASE_URL}/pest-info/${pestName}/`);
@@ -84,9 +195,51 @@ class ApiService {
     }
   }
 
-  static async getReports() {
+  // The cursor in a `next`/`previous` page link, or null at either end
+  static cursorFrom(link) {
+    return link ? new URL(link).searchParams.get('cursor') : null;
+  }
+
+  // Server-side full-text search; types is a subset of ['pest', 'pesticide', 'report', 'feedback']
+  static async search(query, { types = [], page = 1, pageSize = 20 } = {}) {
+    try {
+      const params = new URLSearchParams({ q: query, page: String(page), page_size: String(pageSize) });
+      if (types.length) {
+        params.append('type', types.join(','));
+      }
+      const response = await fetch(`${API_BASE_URL}/search/?${params}`);
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      const result = await response.json();
+      return result;
+    } catch (error) {
+      console.error('API Error:', error);
+      throw error;
+    }
+  }
+
+  // One page of reports, newest first: { count, count_is_exact, next, previous, results }.
+  // Pass the cursor of `next`/`previous` (see cursorFrom) to get the neighbouring page.
+  // filters: { pest_name, pest_name_prefix, user_id, min_confidence, max_confidence, since, until }
+  static async getReports({ cursor, pageSize, filters = {} } = {}) {
     try {
-      const response = await fetch(`${API_BASE_URL}/reports/`);
+      const params = new URLSearchParams();
+      Object.entries(filters).forEach(([name, value]) => {
+        if (value !== undefined && value !== null && value !== '') {
+          params.append(name, String(value));
+        }
+      });
+      if (cursor) {
+        params.append('cursor', cursor);
+      }
+      if (pageSize) {
+        params.append('page_size', String(pageSize));
+      }
+      const query = params.toString();
+      const response = await fetch(`${API_BASE_URL}/reports/${query ? `?${query}` : ''}`);
 
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
@@ -122,6 +275,29 @@ class ApiService {
     }
   }
 
+  // Dashboard totals, latest detections, per-pest counts and a per-day series (admin only)
+  static async getAdminStats({ latest = 5, days = 30 } = {}) {
+    try {
+      const token = localStorage.getItem('authToken');
+      const params = new URLSearchParams({ latest: String(latest), days: String(days) });
+      const response = await fetch(`${API_BASE_URL}/admin/stats/?${params}`, {
+        headers: {
+          'Authorization': `Token ${token}`,
+        },
+      });
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+
+      const result = await response.json();
+      return result;
+    } catch (error) {
+      console.error('API Error fetching admin stats:', error);
+      throw error;
+    }
+  }
+
   static async getUsers() {
     try {
       const token = localStorage.getItem('authToken');
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Keep the full-text search documents and detection rollups in step with every write
+        from . import rollups, search
+        search.connect_signals()
+        rollups.connect_signals()
@@ -0,0 +1,178 @@
+"""
+Dynamic micro-batching for model inference.
+
+Concurrent requests put their preprocessed inputs on one shared queue. A single
+worker thread drains the queue into batches of up to ``max_batch_size`` items,
+waiting at most ``max_wait_ms`` for more work once the first item of a batch has
+arrived, runs one forward pass per batch and hands every caller back its own
+result through a ``Future``.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Upper bounds (inclusive) of the queue depth histogram buckets
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class BatchingEngine:
+    """Collects concurrent inference requests and runs them as batches.
+
+    ``run_batch`` receives a list of inputs and must return a sequence with one
+    result per input, in the same order.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=5.0, name="default"):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.run_batch = run_batch
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stopped = False
+        # Stats
+        self._batch_sizes = {}
+        self._queue_depths = {bound: 0 for bound in QUEUE_DEPTH_BUCKETS}
+        self._queue_depths["+Inf"] = 0
+        self._max_queue_depth = 0
+        self._items = 0
+        self._batches = 0
+        self._errors = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    def submit(self, item):
+        """Queue ``item`` for the next batch and return a ``Future`` for its result."""
+        if self._stopped:
+            raise RuntimeError(f"Batching engine '{self.name}' has been shut down")
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        self._record_queue_depth(self._queue.qsize())
+        return future
+
+    def predict(self, item, timeout=None):
+        """Submit ``item`` and block until its result is ready."""
+        return self.submit(item).result(timeout=timeout)
+
+    def shutdown(self, wait=True):
+        """Stop the worker after it finishes the items already queued."""
+        self._stopped = True
+        self._queue.put(None)
+        if wait and self._worker is not None:
+            self._worker.join()
+
+    def stats(self):
+        """Snapshot of queue depth and batch size statistics."""
+        with self._lock:
+            batches = self._batches
+            return {
+                "name": self.name,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "queue_depth_histogram": {str(k): v for k, v in self._queue_depths.items()},
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "items": self._items,
+                "batches": batches,
+                "errors": self._errors,
+                "mean_batch_size": round(self._items / batches, 3) if batches else 0.0,
+                "mean_queue_wait_ms": round(self._wait_seconds * 1000.0 / self._items, 3) if self._items else 0.0,
+                "mean_batch_run_ms": round(self._run_seconds * 1000.0 / batches, 3) if batches else 0.0,
+                "queue_wait_seconds_total": round(self._wait_seconds, 6),
+                "batch_run_seconds_total": round(self._run_seconds, 6),
+            }
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._loop, name=f"batching-{self.name}", daemon=True
+                )
+                self._worker.start()
+
+    def _record_queue_depth(self, depth):
+        with self._lock:
+            if depth > self._max_queue_depth:
+                self._max_queue_depth = depth
+            for bound in QUEUE_DEPTH_BUCKETS:
+                if depth <= bound:
+                    self._queue_depths[bound] += 1
+                    break
+            else:
+                self._queue_depths["+Inf"] += 1
+
+    def _collect(self):
+        """Block for the first item, then gather more until full or the wait expires."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    entry = self._queue.get(timeout=remaining)
+                else:
+                    entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                # Put the sentinel back so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            items = [entry[0] for entry in batch]
+            futures = [entry[1] for entry in batch]
+            started = time.perf_counter()
+            waited = sum(started - entry[2] for entry in batch)
+            try:
+                results = self.run_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"run_batch returned {len(results)} results for {len(items)} inputs"
+                    )
+            except Exception as e:
+                with self._lock:
+                    self._errors += 1
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self._batches += 1
+                    self._items += len(items)
+                    self._batch_sizes[len(items)] = self._batch_sizes.get(len(items), 0) + 1
+                    self._wait_seconds += waited
+                    self._run_seconds += elapsed
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+
+def batching_enabled():
+    return os.environ.get("SMARTPEST_BATCHING", "1") == "1"
+
+
+def engine_settings():
+    """Batch size and wait limits from the environment."""
+    return {
+        "max_batch_size": int(os.environ.get("SMARTPEST_BATCH_MAX_SIZE", "8")),
+        "max_wait_ms": float(os.environ.get("SMARTPEST_BATCH_MAX_WAIT_MS", "5")),
+    }
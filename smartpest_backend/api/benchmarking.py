@@ -0,0 +1,133 @@
+"""
+Helpers shared by the benchmark and accuracy-regression management commands.
+"""
+import io
+import multiprocessing
+import os
+import resource
+import threading
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def list_images(folder, limit=None):
+    """Sorted image paths found (recursively) under ``folder``."""
+    paths = []
+    for root, _dirs, files in os.walk(folder):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.join(root, name))
+    paths.sort()
+    return paths[:limit] if limit else paths
+
+
+def synthetic_jpeg(width, height, seed=0, quality=90):
+    """Photo-like JPEG: smooth gradients plus sensor-style noise, so the encoder can't cheat."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    shape = (height, width)
+    base = np.stack([
+        np.broadcast_to(120 + 80 * x * y, shape),
+        np.broadcast_to(140 + 60 * np.sin(6 * x + 3 * y), shape),
+        np.broadcast_to(90 + 70 * y, shape),
+    ], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 12, (height, width, 3)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def rss_mb():
+    """Current resident set size of this process in MiB."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / 1024 if os.uname().sysname != "Darwin" else peak / (1024 * 1024)
+
+
+class RssSampler:
+    """Samples RSS in a background thread; ``peak_growth_mb`` is the high-water mark above the starting RSS.
+
+    Unlike ``ru_maxrss`` this isn't masked by whatever peak the process hit before measuring.
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.baseline_mb = 0.0
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.baseline_mb = self.peak_mb = rss_mb()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, rss_mb())
+
+    @property
+    def peak_growth_mb(self):
+        return self.peak_mb - self.baseline_mb
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of ``values`` (``pct`` in 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def latency_summary(seconds):
+    """Mean and tail latencies in milliseconds."""
+    if not seconds:
+        return {"count": 0}
+    ms = [s * 1000.0 for s in seconds]
+    return {
+        "count": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 3),
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+    }
+
+
+def run_isolated(func, *args):
+    """Run ``func(*args)`` in a fresh spawned process so memory numbers aren't polluted."""
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(func, args)
+
+
+def apply_env(overrides):
+    """Set (or unset, for ``None``) environment variables."""
+    for key, value in overrides.items():
+        if value is None:
+            os.environ.pop(key, None)
+        else:
+            os.environ[key] = str(value)
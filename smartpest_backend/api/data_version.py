@@ -0,0 +1,80 @@
+"""
+Data versions for HTTP conditional requests on rarely changing endpoints.
+
+Every write to the pest and pesticide reference data bumps the ``reference`` row of
+``DataVersion``. Views decorated with ``reference_cache`` derive a strong ETag and
+Last-Modified from that row, answer a matching ``If-None-Match`` (or
+``If-Modified-Since``) with 304 before doing any other work, and send Cache-Control
+with a max-age (SMARTPEST_REFERENCE_MAX_AGE seconds by default; 0 means revalidate
+every time). Checking the version is a single primary key lookup.
+"""
+import os
+from functools import wraps
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import DataVersion
+
+REFERENCE = 'reference'
+
+# Part of every ETag, so a change to how responses are built invalidates clients' copies
+_FORMAT = 'v1'
+
+
+def bump(key=REFERENCE):
+    """Record that the data behind ``key`` changed (once the current transaction commits)."""
+    def apply():
+        now = timezone.now()
+        if DataVersion.objects.filter(key=key).update(version=F('version') + 1, updated_at=now):
+            return
+        _, created = DataVersion.objects.get_or_create(key=key, defaults={'version': 1})
+        if not created:  # Created concurrently by another writer
+            DataVersion.objects.filter(key=key).update(version=F('version') + 1, updated_at=now)
+    transaction.on_commit(apply)
+
+
+def current(key=REFERENCE):
+    """``(version, updated_at)``; ``(0, None)`` before the first change."""
+    row = DataVersion.objects.filter(key=key).values_list('version', 'updated_at').first()
+    return row or (0, None)
+
+
+def _request_version(request, key):
+    # Looked up once per request although both the ETag and Last-Modified need it
+    cache = request.META.setdefault('smartpest.data_versions', {})
+    if key not in cache:
+        cache[key] = current(key)
+    return cache[key]
+
+
+def reference_cache(view=None, key=REFERENCE, max_age=None):
+    """Conditional GET support for a view (or view method via ``method_decorator``) over ``key``'s data."""
+    def decorator(func):
+        def etag(request, *args, **kwargs):
+            version, updated_at = _request_version(request, key)
+            # The timestamp keeps a recreated database's version 1 from matching an old version 1
+            stamp = int(updated_at.timestamp() * 1000) if updated_at else 0
+            return f"{key}-{version}-{stamp}-{_FORMAT}"
+
+        def last_modified(request, *args, **kwargs):
+            return _request_version(request, key)[1]
+
+        conditional = condition(etag_func=etag, last_modified_func=last_modified)(func)
+
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD') and response.status_code in (200, 304):
+                seconds = max_age if max_age is not None else int(os.environ.get('SMARTPEST_REFERENCE_MAX_AGE', '300'))
+                if seconds > 0:
+                    patch_cache_control(response, public=True, max_age=seconds)
+                else:
+                    # Stored but revalidated on every use: a cheap 304 while the data is unchanged
+                    patch_cache_control(response, public=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator(view) if view is not None else decorator
@@ -1,6 +1,15 @@
-from PIL import Image
+import hashlib
+import io
 import os
 import random
+import threading
+import time
+
+from . import metrics, pest_data
+from .batching import BatchingEngine, batching_enabled, engine_settings
+from .model_server import ModelServerClient, RemoteStage, model_server_paths
+from .prediction_cache import cache_enabled, cache_from_env, cache_key
+from .preprocessing import Preprocessor, load_image, open_image
 
 # Global variables for model and transforms
 model = None
@@ -8,8 +17,335 @@ transform = None
 class_names = []
 device = None
 
-def load_model():
-    global model, transform, class_names, device
+# Side length of the square input expected by the classifier
+INPUT_SIZE = 600
+
+# Model loading state reported by model_status()
+STATE_NOT_STARTED = "not_started"
+STATE_LOADING = "loading"
+STATE_READY = "ready"
+STATE_MOCK = "mock"
+STATE_FAILED = "failed"
+
+_load_state = STATE_NOT_STARTED
+_load_error = None
+_load_seconds = None
+_warmup_runs = 0
+_load_lock = threading.Lock()
+_load_done = threading.Event()
+
+# Micro-batching engines shared by all request threads of this process, one per cascade stage
+_engines = {}
+_engine_lock = threading.Lock()
+
+# Weights or export file the model was loaded from, and the version derived from it
+model_source = None
+fast_model_source = None
+_model_version = None
+
+# Prediction cache keyed by image bytes + model version
+_cache = None
+_cache_lock = threading.Lock()
+
+# Confidence-gated cascade: a cheap B0 pass first, B5 only for uncertain images
+STAGE_FAST = "b0"
+STAGE_FULL = "b5"
+fast_model = None
+fast_transform = None
+_cascade_lock = threading.Lock()
+_cascade_counts = {"images": 0, "escalated": 0, "fast_seconds": 0.0, "full_seconds": 0.0}
+
+# Client of the shared model server when SMARTPEST_MODEL_SERVER is set (see api/model_server.py)
+model_server = None
+
+# Directory holding weights, classes.txt and exported models
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "models")
+EXPORT_DIR = os.environ.get('SMARTPEST_EXPORT_DIR', os.path.join(MODELS_DIR, "exported"))
+
+# Inference backends selectable through SMARTPEST_INFERENCE_BACKEND
+BACKEND_EAGER = "torch-eager"
+BACKEND_TORCHSCRIPT = "torchscript"
+BACKEND_ONNXRUNTIME = "onnxruntime"
+BACKENDS = (BACKEND_EAGER, BACKEND_TORCHSCRIPT, BACKEND_ONNXRUNTIME)
+
+# File names written by the export_model management command
+EXPORTED_FILES = {
+    BACKEND_TORCHSCRIPT: "classifier.ts",
+    BACKEND_ONNXRUNTIME: "classifier.onnx",
+}
+
+# INT8 modes selectable through SMARTPEST_QUANTIZE
+QUANTIZE_OFF = "off"
+QUANTIZE_STATIC = "static"
+QUANTIZE_MODES = (QUANTIZE_OFF, QUANTIZE_STATIC)
+
+# Statically quantized ONNX model written by the quantize_model management command
+QUANTIZED_FILE = "classifier_int8.onnx"
+
+
+def inference_backend():
+    backend = os.environ.get('SMARTPEST_INFERENCE_BACKEND', BACKEND_EAGER).strip().lower()
+    if backend not in BACKENDS:
+        print(f"⚠️  Unknown SMARTPEST_INFERENCE_BACKEND '{backend}', using {BACKEND_EAGER}")
+        return BACKEND_EAGER
+    return backend
+
+
+def exported_model_path(backend):
+    return os.path.join(EXPORT_DIR, EXPORTED_FILES[backend])
+
+
+def quantize_mode():
+    mode = os.environ.get('SMARTPEST_QUANTIZE', QUANTIZE_OFF).strip().lower() or QUANTIZE_OFF
+    if mode == "dynamic":
+        # Dynamic quantization only covers Linear layers, i.e. nothing but EfficientNet's classifier head
+        print("⚠️  SMARTPEST_QUANTIZE=dynamic was removed (it left every convolution in fp32); "
+              "run `python manage.py quantize_model` and set SMARTPEST_QUANTIZE=static. Serving fp32")
+        return QUANTIZE_OFF
+    if mode not in QUANTIZE_MODES:
+        print(f"⚠️  Unknown SMARTPEST_QUANTIZE '{mode}', using {QUANTIZE_OFF}")
+        return QUANTIZE_OFF
+    return mode
+
+
+def quantized_model_path():
+    return os.path.join(EXPORT_DIR, QUANTIZED_FILE)
+
+
+def build_transform(size=INPUT_SIZE):
+    """Resize + normalize pipeline expected by the classifier."""
+    return Preprocessor(size)
+
+
+class OnnxClassifier:
+    """Callable wrapper giving an ONNX Runtime session the same interface as a torch module."""
+
+    def __init__(self, session):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        import torch
+        logits = self.session.run(None, {self.input_name: batch.cpu().numpy()})[0]
+        return torch.from_numpy(logits)
+
+
+def _load_exported_model(backend, path=None):
+    """Load a TorchScript or ONNX export together with the class names baked into it."""
+    global model, model_source, class_names
+    path = path or exported_model_path(backend)
+    if not os.path.exists(path):
+        print(f"❌ No {backend} export at {path}. Run `python manage.py export_model` first.")
+        return False
+    try:
+        if backend == BACKEND_TORCHSCRIPT:
+            import torch
+            extra_files = {"classes.txt": ""}
+            loaded = torch.jit.load(path, map_location=device, _extra_files=extra_files)
+            names = extra_files["classes.txt"]
+            names = names.decode("utf-8") if isinstance(names, bytes) else names
+            loaded.eval()
+        else:
+            import onnxruntime as ort
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            threads = int(os.environ.get('SMARTPEST_ORT_THREADS', '0'))
+            if threads:
+                options.intra_op_num_threads = threads
+            session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+            names = session.get_modelmeta().custom_metadata_map.get("classes", "")
+            loaded = OnnxClassifier(session)
+        names = [line.strip() for line in names.splitlines() if line.strip()]
+        if not names:
+            raise ValueError("export has no class names baked in")
+        model = loaded
+        model_source = path
+        class_names = names
+        print(f"✅ {backend} model loaded from {path} ({len(class_names)} classes)")
+        return True
+    except Exception as e:
+        print(f"❌ Failed to load {backend} model: {e}")
+        return False
+
+
+LFS_POINTER_PREFIX = b'version https://git-lfs.github.com/spec/v1'
+
+
+def is_lfs_pointer(path):
+    """True when ``path`` is a Git LFS pointer file rather than the weights themselves."""
+    with open(path, 'rb') as f:
+        return f.readline().startswith(LFS_POINTER_PREFIX)
+
+
+def weights_mmap_enabled():
+    return os.environ.get('SMARTPEST_WEIGHTS_MMAP', '1') == '1'
+
+
+def weights_path(path):
+    """The .safetensors conversion of a .pth checkpoint when there is one, else the checkpoint itself."""
+    converted = os.path.splitext(path)[0] + ".safetensors"
+    if os.path.exists(converted) and not is_lfs_pointer(converted):
+        return converted
+    return path
+
+
+def load_state_dict_file(path):
+    """Read a .safetensors or torch checkpoint into a CPU state dict.
+
+    With SMARTPEST_WEIGHTS_MMAP=1 (default) the tensors are backed by the memory-mapped
+    file, so their pages live in the OS page cache and are shared by every process
+    serving the same weights.
+    """
+    import torch
+    if is_lfs_pointer(path):
+        raise ValueError(f"{os.path.basename(path)} is a Git LFS pointer, not the weights")
+    mmap = weights_mmap_enabled()
+    if path.endswith(".safetensors"):
+        from safetensors.torch import load_file
+        state = load_file(path, device="cpu")
+        return state if mmap else {key: tensor.clone() for key, tensor in state.items()}
+    if mmap:
+        try:
+            return torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+        except Exception as e:
+            print(f"⚠️  Can't memory-map {os.path.basename(path)} ({e}), reading it into memory instead. "
+                  "Run `python manage.py convert_weights` to fix this.")
+    return torch.load(path, map_location="cpu")
+
+
+def _load_network(arch, path, strict=False):
+    """Build a timm ``arch`` network with the weights from ``path``, on the serving device.
+
+    When memory-mapping, the network is built on the meta device (no throwaway random
+    init) and the mapped tensors are assigned as its parameters without a copy.
+    """
+    import timm
+    import torch
+    state = load_state_dict_file(path)
+    mmap = weights_mmap_enabled()
+    if mmap:
+        with torch.device("meta"):
+            network = timm.create_model(arch, pretrained=False, num_classes=len(class_names))
+    else:
+        network = timm.create_model(arch, pretrained=False, num_classes=len(class_names))
+    missing, unexpected = network.load_state_dict(state, strict=strict, assign=mmap)
+    if missing and mmap:
+        # Keys absent from the checkpoint have no values on the meta device; keep their random init instead
+        network = timm.create_model(arch, pretrained=False, num_classes=len(class_names))
+        missing, unexpected = network.load_state_dict(state, strict=strict, assign=True)
+    if missing or unexpected:
+        print(f"⚠️  Loaded with non-strict mode. Missing keys: {len(missing)}, Unexpected keys: {len(unexpected)}")
+    return network.to(device).eval()
+
+
+def _load_eager_model():
+    """Build the timm network and load its weights, falling back to the pre-trained B0."""
+    global model, model_source, class_names
+
+    # Load class names
+    class_file = os.path.join(MODELS_DIR, "classes.txt")
+    with open(class_file, "r") as f:
+        class_names = [line.strip() for line in f.readlines() if line.strip()]
+    print(f"Loaded {len(class_names)} pest classes")
+    # Try to load model weights (a .safetensors conversion wins over the .pth next to it)
+    model_path = weights_path(os.path.join(MODELS_DIR, "best_model_b5.pth"))
+    pretrained_path = weights_path(os.path.join(MODELS_DIR, "pretrained_efficientnet_b0.pth"))
+    # Try the actual model first
+    if os.path.exists(model_path):
+        try:
+            if is_lfs_pointer(model_path):
+                print("\u26a0\ufe0f  Model file is a Git LFS pointer. Trying pre-trained model...")
+                raise Exception("Git LFS pointer")
+            started = time.perf_counter()
+            model = _load_network("efficientnet_b5", model_path)
+            model_source = model_path
+            print(f"✅ Actual ML model loaded successfully from {os.path.basename(model_path)} "
+                  f"in {time.perf_counter() - started:.2f}s!")
+            return True
+        except Exception as e:
+            print(f"❌ Failed to load actual model: {e}")
+    # Try pre-trained model as fallback
+    if os.path.exists(pretrained_path):
+        try:
+            model = _load_network("efficientnet_b0", pretrained_path, strict=True)
+            model_source = pretrained_path
+            print("✅ Pre-trained model loaded successfully!")
+            print("📝 Note: This is a pre-trained model, not specifically trained on pest data")
+            return True
+        except Exception as e:
+            print(f"❌ Failed to load pre-trained model: {e}")
+    print("❌ No model files found")
+    return False
+
+
+def cascade_enabled():
+    return os.environ.get('SMARTPEST_CASCADE', '0') == '1'
+
+
+def cascade_settings():
+    """Escalation thresholds and B0 input size for the cascade."""
+    return {
+        "fast_size": int(os.environ.get('SMARTPEST_CASCADE_B0_SIZE', '224')),
+        "min_confidence": float(os.environ.get('SMARTPEST_CASCADE_MIN_CONFIDENCE', '0.85')),
+        "min_margin": float(os.environ.get('SMARTPEST_CASCADE_MIN_MARGIN', '0')),
+    }
+
+
+def _load_fast_model():
+    """Load the B0 network used as the cascade's first stage.
+
+    Only ``best_efficientnet_b0.pth`` (trained on the pest classes) qualifies: the
+    pre-trained B0 has an untrained head, and its confident answers would be wrong.
+    """
+    global fast_model, fast_transform, fast_model_source
+    path = weights_path(os.path.join(MODELS_DIR, "best_efficientnet_b0.pth"))
+    if not os.path.exists(path) or is_lfs_pointer(path):
+        print("⚠️  Cascade disabled: no pest-trained B0 weights (models/best_efficientnet_b0.pth), "
+              "every image goes straight to the full model")
+        return False
+    try:
+        fast_model = _load_network("efficientnet_b0", path, strict=True)
+    except Exception as e:
+        print(f"⚠️  Cascade disabled: failed to load the B0 stage from {path}: {e}")
+        fast_model = None
+        return False
+    fast_model_source = path
+    fast_transform = build_transform(cascade_settings()["fast_size"])
+    print(f"✅ Cascade B0 stage loaded from {os.path.basename(path)}")
+    return True
+
+
+def _connect_model_server(paths):
+    """Use a model server's network instead of loading weights into this process."""
+    global model, fast_model, fast_transform, model_source, fast_model_source, class_names, model_server
+    client = ModelServerClient(paths)
+    wait = float(os.environ.get('SMARTPEST_MODEL_SERVER_WAIT', '60'))
+    try:
+        info = client.hello(wait_seconds=wait)
+    except Exception as e:
+        print(f"❌ Model server not reachable at {', '.join(paths)}: {e}")
+        return False
+    class_names = info["classes"]
+    model = RemoteStage(client, STAGE_FULL)
+    model_source = f"model-server:{info['model_version']}"
+    if info["cascade"]:
+        fast_model = RemoteStage(client, STAGE_FAST)
+        fast_model_source = model_source
+        fast_transform = build_transform(info["fast_size"])
+    model_server = client
+    print(f"✅ Using model server at {', '.join(paths)} (pid {info['pid']}, {len(class_names)} classes)")
+    return True
+
+
+def load_model(strict=False):
+    """Load the configured model; False if none could be loaded.
+
+    A missing export or INT8 model normally falls back to the eager fp32 model. With
+    ``strict`` (for benchmarking and comparison tools) it makes the load fail instead, so
+    fp32 numbers are never reported under another backend's name.
+    """
+    global model, transform, class_names, device, _model_version
+    _model_version = None
     try:
         # In production on small instances, default to mock predictions to avoid timeouts
         if os.environ.get('SMARTPEST_USE_MOCK', '1') == '1':
@@ -21,128 +357,611 @@ def load_model():
 
         # Lazy import heavy deps only if we really need them
         import torch
-        import torch.nn.functional as F  # noqa: F401 - used in predict when model is loaded
-        from torchvision import transforms
-        import timm
-
-        # Setup device
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        print(f"Using device: {device}")
-        # Load class names
-        class_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "models", "classes.txt")
-        with open(class_file, "r") as f:
-            class_names = [line.strip() for line in f.readlines() if line.strip()]
-        print(f"Loaded {len(class_names)} pest classes")
-        # Create model
-        model = timm.create_model("efficientnet_b5", pretrained=False, num_classes=len(class_names))
-        model.to(device)
+
+        # Another process owns the weights; only preprocessing happens here
+        paths = model_server_paths()
+        if paths:
+            device = torch.device("cpu")
+            transform = build_transform()
+            model = None
+            return _connect_model_server(paths)
+
+        # Setup device (ONNX Runtime and INT8 kernels run on the CPU)
+        backend = inference_backend()
+        quantize = quantize_mode()
+        if backend == BACKEND_ONNXRUNTIME or quantize != QUANTIZE_OFF or not torch.cuda.is_available():
+            device = torch.device("cpu")
+        else:
+            device = torch.device("cuda")
+        print(f"Using device: {device}, backend: {backend}, quantize: {quantize}")
         # Define transforms
-        transform = transforms.Compose([
-            transforms.Resize((600, 600)),
-            transforms.ToTensor(),
-            transforms.Normalize([0.485, 0.456, 0.406],
-                               [0.229, 0.224, 0.225])
-        ])
-        # Try to load model weights
-        model_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "models", "best_model_b5.pth")
-        pretrained_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "models", "pretrained_efficientnet_b0.pth")
-        # Try the actual model first
-        if os.path.exists(model_path):
-            try:
-                # Check if it's a Git LFS pointer
-                with open(model_path, 'rb') as f:
-                    first_line = f.readline()
-                    if first_line.startswith(b'version https://git-lfs.github.com/spec/v1'):
-                        print("\u26a0\ufe0f  Model file is a Git LFS pointer. Trying pre-trained model...")
-                        raise Exception("Git LFS pointer")
-                # Try to load the actual model
-                state = torch.load(model_path, map_location=device)
-                missing, unexpected = model.load_state_dict(state, strict=False)
-                model.eval()
-                if missing or unexpected:
-                    print(f"⚠️  Loaded with non-strict mode. Missing keys: {len(missing)}, Unexpected keys: {len(unexpected)}")
-                print("✅ Actual ML model loaded successfully!")
-                return True
-            except Exception as e:
-                print(f"❌ Failed to load actual model: {e}")
-        # Try pre-trained model as fallback
-        if os.path.exists(pretrained_path):
-            try:
-                pretrained_model = timm.create_model("efficientnet_b0", pretrained=False, num_classes=len(class_names))
-                pretrained_model.load_state_dict(torch.load(pretrained_path, map_location=device))
-                pretrained_model.eval()
-                model = pretrained_model
-                print("✅ Pre-trained model loaded successfully!")
-                print("📝 Note: This is a pre-trained model, not specifically trained on pest data")
-                return True
-            except Exception as e:
-                print(f"❌ Failed to load pre-trained model: {e}")
-        print("❌ No model files found")
-        return False
+        transform = build_transform()
+        model = None
+        loaded = False
+        if quantize == QUANTIZE_STATIC:
+            loaded = _load_exported_model(BACKEND_ONNXRUNTIME, quantized_model_path())
+            if not loaded and strict:
+                return False
+            if not loaded:
+                print("⚠️  No usable INT8 model (run `python manage.py quantize_model`), serving fp32")
+        elif backend != BACKEND_EAGER:
+            loaded = _load_exported_model(backend)
+            if not loaded and strict:
+                return False
+            if not loaded:
+                print(f"⚠️  Falling back to {BACKEND_EAGER} backend")
+        if not loaded:
+            loaded = _load_eager_model()
+        if not loaded:
+            model = None
+            return False
+        if cascade_enabled():
+            _load_fast_model()
+        return True
     except Exception as e:
         print(f"❌ Error loading model: {e}")
+        model = None
         return False
 
-def predict_image(image_path):
+def _file_fingerprint(path):
+    if not path:
+        return "-"
+    try:
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+    except OSError:
+        return path
+
+
+def model_version():
+    """Short identifier of the loaded weights and serving settings, used to key cached predictions."""
+    global _model_version
+    if _model_version is None:
+        parts = [
+            _file_fingerprint(model_source),
+            inference_backend(),
+            quantize_mode(),
+            str(INPUT_SIZE),
+        ]
+        if fast_model is not None:
+            parts += [_file_fingerprint(fast_model_source), repr(sorted(cascade_settings().items()))]
+        _model_version = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+    return _model_version
+
+
+def get_cache():
+    """Return the process-wide prediction cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = cache_from_env()
+    return _cache
+
+
+def top_k_limit():
+    """Most classes a prediction can list; this many are kept with every (cached) result."""
+    return max(1, int(os.environ.get('SMARTPEST_TOP_K_MAX', '5')))
+
+
+def _format_predictions(probs, stages):
+    """Response bodies for an (images, classes) probability tensor, with one top-k pass for the whole batch."""
+    import torch
+    k = min(top_k_limit(), probs.shape[1])
+    values, indices = torch.topk(probs, k, dim=1)
+    results = []
+    for row_values, row_indices, stage in zip(values.tolist(), indices.tolist(), stages):
+        predictions = [
+            {"class": class_names[index], "confidence": round(value, 4)}
+            for value, index in zip(row_values, row_indices)
+        ]
+        print(f"ML Model Prediction: {predictions[0]['class']} (Confidence: {row_values[0]:.4f})")
+        result = {**predictions[0], "predictions": predictions}
+        if stage:
+            result["stage"] = stage
+        results.append(result)
+    return results
+
+
+def _format_prediction(probs, stage=None):
+    """Response body for one image's class probabilities."""
+    return _format_predictions(probs.unsqueeze(0), [stage])[0]
+
+
+def with_top_k(result, top_k=None):
+    """Copy of a prediction listing its ``top_k`` best classes under ``predictions`` (dropped when top_k is None)."""
+    result = dict(result)
+    predictions = result.pop("predictions", None)
+    if top_k is not None and "error" not in result:
+        if not predictions:  # Cached before top-k results existed
+            predictions = [{"class": result["class"], "confidence": result["confidence"]}]
+        result["predictions"] = predictions[:top_k]
+    return result
+
+
+def _mock_prediction():
+    print("Using mock predictions (ML model not loaded)")
+    if class_names:
+        names = class_names
+    else:
+        names = [
+            "Aphids", "Spider Mites", "Whiteflies", "Mealybugs", 
+            "Scale Insects", "Thrips", "Leaf Miners", "Caterpillars",
+            "Termite", "Grasshopper", "Whitefly", "aphids", "Thrips",
+            "army_worm", "corn_borer", "rice_leafhopper", "beetle"
+        ]
+    names = list(dict.fromkeys(names))
+    picked = random.sample(names, min(top_k_limit(), len(names)))
+    confidence = round(random.uniform(0.7, 0.95), 4)
+    # Spread the remaining probability over the runners-up in decreasing order
+    shares = sorted((random.random() for _ in picked[1:]), reverse=True)
+    scale = (1.0 - confidence) / (sum(shares) or 1.0)
+    predictions = [{"class": picked[0], "confidence": confidence}] + [
+        {"class": name, "confidence": round(share * scale, 4)} for name, share in zip(picked[1:], shares)
+    ]
+    return {
+        "class": picked[0],
+        "confidence": confidence,
+        "predictions": predictions,
+    }
+
+
+def _predict_real(data):
+    """Run the loaded model on raw image bytes."""
+    with metrics.stage("decode"):
+        image = load_image(data, INPUT_SIZE)
+    probs, stage = _predict_probs(image)
+    with metrics.stage("postprocess"):
+        return _format_prediction(probs, stage)
+
+
+def read_image_bytes(source):
+    """Raw bytes of an image given as bytes, a filesystem path or a file-like object (e.g. an upload)."""
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    # InMemoryUploadedFile wraps a BytesIO: take its contents without another read loop
+    inner = getattr(source, "file", source)
+    if isinstance(inner, io.BytesIO):
+        return inner.getvalue()
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source.read()
+
+
+def predict_image(image_source, top_k=None):
+    """Classify an image given as bytes, a path or a file-like object (uploads are read from memory).
+
+    With ``top_k``, the result also lists the best ``top_k`` classes under ``predictions``.
+    """
     global model, transform, class_names, device
     try:
         # Ensure model is loaded before prediction
         ensure_model_loaded()
-        
-        # Verify the image can be opened
-        image = Image.open(image_path).convert("RGB")
+
+        with metrics.stage("read"):
+            data = read_image_bytes(image_source)
         # If model is loaded, use it
         if model is not None and transform is not None:
-            import torch
-            import torch.nn.functional as F
-            image_tensor = transform(image).unsqueeze(0).to(device)
-            with torch.no_grad():
-                outputs = model(image_tensor)
-                probs = F.softmax(outputs, dim=1)
-                pred_idx = torch.argmax(probs, dim=1).item()
-                confidence = probs[0][pred_idx].item()
-            predicted_pest = class_names[pred_idx]
-            print(f"ML Model Prediction: {predicted_pest} (Confidence: {confidence:.4f})")
-            return {
-                "class": predicted_pest,
-                "confidence": round(confidence, 4)
-            }
+            if not cache_enabled():
+                result = _predict_real(data)
+                metrics.inc("smartpest_predictions_total", mode="real")
+                return with_top_k(result, top_k)
+            computed = []
+
+            def compute():
+                computed.append(True)
+                return _predict_real(data)
+            with metrics.stage("cache_lookup"):
+                key = cache_key(data, model_version())
+            result = get_cache().get_or_compute(key, compute)
+            metrics.inc("smartpest_predictions_total", mode="real" if computed else "cached")
+            return with_top_k(result, top_k)
         else:
-            print("Using mock predictions (ML model not loaded)")
-            if class_names:
-                predicted_pest = random.choice(class_names)
-            else:
-                pest_types = [
-                    "Aphids", "Spider Mites", "Whiteflies", "Mealybugs", 
-                    "Scale Insects", "Thrips", "Leaf Miners", "Caterpillars",
-                    "Termite", "Grasshopper", "Whitefly", "aphids", "Thrips",
-                    "army_worm", "corn_borer", "rice_leafhopper", "beetle"
-                ]
-                predicted_pest = random.choice(pest_types)
-            confidence = round(random.uniform(0.7, 0.95), 4)
-            return {
-                "class": predicted_pest,
-                "confidence": confidence
-            }
+            # Verify the image can be opened
+            with metrics.stage("decode"):
+                load_image(data, INPUT_SIZE)
+            metrics.inc("smartpest_predictions_total", mode="mock")
+            return with_top_k(_mock_prediction(), top_k)
     except Exception as e:
+        metrics.inc("smartpest_predictions_total", mode="error")
         return {"error": f"Failed to process image: {e}"}
 
-# Lazy loading - only load model when first prediction is made
-model_loaded = False
-model = None
-class_names = None
 
-def ensure_model_loaded():
-    """Load model only when needed to avoid startup crashes"""
-    global model_loaded, model, class_names
-    if not model_loaded:
-        print("🔄 Initializing SmartPest ML Model...")
+def batch_limits():
+    """Per-request limits of the multi-image endpoint."""
+    return {
+        "max_images": int(os.environ.get('SMARTPEST_MULTI_MAX_IMAGES', '100')),
+        "max_pixels": int(os.environ.get('SMARTPEST_MULTI_MAX_PIXELS', str(400 * 1000 * 1000))),
+        "chunk_size": int(os.environ.get('SMARTPEST_MULTI_CHUNK_SIZE', '8')),
+        "max_file_bytes": int(os.environ.get('SMARTPEST_MULTI_MAX_FILE_BYTES', str(25 * 1024 * 1024))),
+    }
+
+
+def predict_images(items, max_pixels=None, chunk_size=None, top_k=None):
+    """Classify many ``(filename, source)`` images, yielding one result dict per image as soon as it is ready.
+
+    Images are decoded and run through the model in chunks of ``chunk_size``. A bad image
+    yields an ``error`` entry without affecting the rest, and once the original pixel count of
+    the request would exceed ``max_pixels`` further images are refused instead of decoded.
+    """
+    limits = batch_limits()
+    max_pixels = limits["max_pixels"] if max_pixels is None else max_pixels
+    chunk_size = max(1, chunk_size or limits["chunk_size"])
+    ensure_model_loaded()
+    real = model is not None and transform is not None
+    use_cache = real and cache_enabled()
+    pixels_used = 0
+    pending = []
+    for index, (filename, source) in enumerate(items):
+        entry = {"index": index, "filename": filename}
+        try:
+            with metrics.stage("read"):
+                data = read_image_bytes(source)
+            image = open_image(data)
+            pixels = image.size[0] * image.size[1]
+            if pixels_used + pixels > max_pixels:
+                entry["error"] = f"Pixel budget of {max_pixels} pixels per request exceeded"
+                yield entry
+                continue
+            pixels_used += pixels
+            if not real:
+                with metrics.stage("decode"):
+                    load_image(image, INPUT_SIZE)
+                entry.update(with_top_k(_mock_prediction(), top_k))
+                metrics.inc("smartpest_predictions_total", mode="mock")
+                yield entry
+                continue
+            key = cache_key(data, model_version()) if use_cache else None
+            cached = get_cache().get(key) if use_cache else None
+            if cached is not None:
+                entry.update(with_top_k(cached, top_k))
+                metrics.inc("smartpest_predictions_total", mode="cached")
+                yield entry
+                continue
+            with metrics.stage("decode"):
+                pending.append((entry, key, load_image(image, INPUT_SIZE)))
+        except Exception as e:
+            entry["error"] = f"Failed to process image: {e}"
+            metrics.inc("smartpest_predictions_total", mode="error")
+            yield entry
+            continue
+        if len(pending) >= chunk_size:
+            yield from _flush_pending(pending, use_cache, top_k)
+            pending = []
+    if pending:
+        yield from _flush_pending(pending, use_cache, top_k)
+
+
+def _flush_pending(pending, use_cache, top_k=None):
+    """Run one batched forward pass over decoded images and yield their results."""
+    try:
+        results = _predict_batch_probs([image for _entry, _key, image in pending])
+    except Exception as e:
+        for entry, _key, _image in pending:
+            entry["error"] = f"Prediction failed: {e}"
+            metrics.inc("smartpest_predictions_total", mode="error")
+            yield entry
+        return
+    import torch
+    with metrics.stage("postprocess"):
+        formatted = _format_predictions(
+            torch.stack([probs for probs, _stage in results]), [stage for _probs, stage in results],
+        )
+    for (entry, key, _image), result in zip(pending, formatted):
+        metrics.inc("smartpest_predictions_total", mode="real")
+        if use_cache:
+            get_cache().put(key, result)
+        entry.update(with_top_k(result, top_k))
+        yield entry
+
+def _logits(batch, stage=STAGE_FULL):
+    """Raw network output for an NCHW batch tensor."""
+    import torch
+    network = fast_model if stage == STAGE_FAST else model
+    with torch.no_grad():
+        return network(batch.to(device))
+
+
+def _forward(batch, stage=STAGE_FULL):
+    """Class probabilities for an NCHW batch tensor."""
+    import torch.nn.functional as F
+    return F.softmax(_logits(batch, stage), dim=1).cpu()
+
+
+def _run_batch(tensors, stage=STAGE_FULL):
+    """Run one forward pass over a list of preprocessed image tensors."""
+    import torch
+    return list(_forward(torch.stack(tensors), stage))
+
+
+def _preprocess_batch(images, preprocessor):
+    """Preprocess decoded images straight into one NCHW batch buffer."""
+    import numpy as np
+    import torch
+    batch = np.empty((len(images), 3, preprocessor.size, preprocessor.size), dtype=np.float32)
+    for i, image in enumerate(images):
+        preprocessor.to_array(image, out=batch[i])
+    return torch.from_numpy(batch)
+
+
+def get_engine(stage=STAGE_FULL):
+    """Return the process-wide batching engine for a cascade stage, creating it on first use."""
+    engine = _engines.get(stage)
+    if engine is None:
+        with _engine_lock:
+            engine = _engines.get(stage)
+            if engine is None:
+                engine = BatchingEngine(
+                    lambda tensors: _run_batch(tensors, stage), name=stage, **engine_settings()
+                )
+                _engines[stage] = engine
+    return engine
+
+
+def _classify(image_tensor, stage=STAGE_FULL):
+    """Class probabilities for one image, batched with concurrent requests when enabled."""
+    if batching_enabled():
+        return get_engine(stage).predict(image_tensor)
+    return _run_batch([image_tensor], stage)[0]
+
+
+def _should_escalate(probs):
+    """True when the B0 answer is not confident enough to return without asking B5."""
+    import torch
+    settings = cascade_settings()
+    top = torch.topk(probs, k=min(2, probs.shape[0])).values.tolist()
+    if top[0] < settings["min_confidence"]:
+        return True
+    return len(top) > 1 and top[0] - top[1] < settings["min_margin"]
+
+
+def _stage_name(name, stage):
+    """Metrics stage label: ``forward`` for the full model, ``forward_b0`` for the cascade's first stage."""
+    return f"{name}_{STAGE_FAST}" if stage == STAGE_FAST else name
+
+
+def _timed_classify(image, preprocessor, stage):
+    with metrics.stage(_stage_name("preprocess", stage)):
+        tensor = preprocessor(image)
+    # Includes the wait for a micro-batch slot when batching is enabled
+    with metrics.stage(_stage_name("forward", stage)):
+        return _classify(tensor, stage)
+
+
+def _predict_probs(image):
+    """Class probabilities for a decoded image and the cascade stage that produced them (or None)."""
+    if fast_model is None:
+        return _timed_classify(image, transform, STAGE_FULL), None
+    started = time.perf_counter()
+    probs = _timed_classify(image, fast_transform, STAGE_FAST)
+    fast_seconds = time.perf_counter() - started
+    escalate = _should_escalate(probs)
+    full_seconds = 0.0
+    if escalate:
+        started = time.perf_counter()
+        probs = _timed_classify(image, transform, STAGE_FULL)
+        full_seconds = time.perf_counter() - started
+    _record_cascade(1, int(escalate), fast_seconds, full_seconds)
+    return probs, STAGE_FULL if escalate else STAGE_FAST
+
+
+def _timed_forward_batch(images, preprocessor, stage):
+    with metrics.stage(_stage_name("preprocess", stage)):
+        batch = _preprocess_batch(images, preprocessor)
+    with metrics.stage(_stage_name("forward", stage)):
+        return _forward(batch, stage)
+
+
+def _predict_batch_probs(images):
+    """(probabilities, stage) for each decoded image, running each cascade stage as one batch."""
+    if fast_model is None:
+        return [(probs, None) for probs in _timed_forward_batch(images, transform, STAGE_FULL)]
+    started = time.perf_counter()
+    fast_probs = _timed_forward_batch(images, fast_transform, STAGE_FAST)
+    fast_seconds = time.perf_counter() - started
+    results = [(probs, STAGE_FAST) for probs in fast_probs]
+    escalate = [i for i, probs in enumerate(fast_probs) if _should_escalate(probs)]
+    full_seconds = 0.0
+    if escalate:
+        started = time.perf_counter()
+        full_probs = _timed_forward_batch([images[i] for i in escalate], transform, STAGE_FULL)
+        full_seconds = time.perf_counter() - started
+        for i, probs in zip(escalate, full_probs):
+            results[i] = (probs, STAGE_FULL)
+    _record_cascade(len(images), len(escalate), fast_seconds, full_seconds)
+    return results
+
+
+def _record_cascade(images, escalated, fast_seconds, full_seconds):
+    with _cascade_lock:
+        _cascade_counts["images"] += images
+        _cascade_counts["escalated"] += escalated
+        _cascade_counts["fast_seconds"] += fast_seconds
+        _cascade_counts["full_seconds"] += full_seconds
+
+
+def cascade_stats():
+    """Escalation rate and per-stage time of the cascade."""
+    with _cascade_lock:
+        counts = dict(_cascade_counts)
+    images = counts["images"]
+    return {
+        "enabled": fast_model is not None,
+        **cascade_settings(),
+        "images": images,
+        "escalated": counts["escalated"],
+        "escalation_rate": round(counts["escalated"] / images, 4) if images else 0.0,
+        "mean_ms_per_image": round((counts["fast_seconds"] + counts["full_seconds"]) * 1000.0 / images, 3) if images else 0.0,
+        "fast_seconds_total": round(counts["fast_seconds"], 3),
+        "full_seconds_total": round(counts["full_seconds"], 3),
+    }
+
+
+def inference_stats():
+    """Batching and cascade statistics for tuning under load."""
+    return {
+        "batching_enabled": batching_enabled(),
+        "model_loaded": model is not None,
+        "engines": {stage: engine.stats() for stage, engine in list(_engines.items())},
+        "cascade": cascade_stats(),
+        "cache": get_cache().stats() if cache_enabled() else None,
+        "model_version": model_version() if model is not None else None,
+        "model_server": _model_server_stats(),
+    }
+
+
+def _model_server_stats():
+    if model_server is None:
+        return None
+    try:
+        return {"paths": model_server.paths, **model_server.stats()}
+    except Exception as e:
+        return {"paths": model_server.paths, "error": str(e)}
+
+
+def _metric_samples():
+    """Batching, cache, cascade and model state of this process as /metrics samples."""
+    C, G, H = metrics.COUNTER, metrics.GAUGE, metrics.HISTOGRAM
+    samples = []
+    for stage, engine in list(_engines.items()):
+        stats = engine.stats()
+        labels = {"engine": stage}
+        samples += [
+            ("smartpest_batch_items_total", C, "Images run through the micro-batcher.", labels, stats["items"]),
+            ("smartpest_batches_total", C, "Forward passes run by the micro-batcher.", labels, stats["batches"]),
+            ("smartpest_batch_errors_total", C, "Micro-batches whose forward pass failed.", labels, stats["errors"]),
+            ("smartpest_batch_queue_wait_seconds_total", C, "Time images spent queued for a micro-batch.", labels,
+             stats["queue_wait_seconds_total"]),
+            ("smartpest_batch_run_seconds_total", C, "Time spent in micro-batch forward passes.", labels,
+             stats["batch_run_seconds_total"]),
+            ("smartpest_batch_queue_depth", G, "Images currently waiting for a micro-batch.", labels, stats["queue_depth"]),
+            ("smartpest_batch_size", H, "Images per micro-batch forward pass.", labels,
+             metrics.histogram_from_counts(stats["batch_size_histogram"], metrics.BATCH_SIZE_BUCKETS)),
+        ]
+    if cache_enabled() and _cache is not None:
+        stats = _cache.stats()
+        for event in ("hits", "disk_hits", "misses", "coalesced", "evictions", "expirations", "disk_errors"):
+            samples.append(("smartpest_cache_events_total", C, "Prediction cache lookups and maintenance, by event.",
+                            {"event": event}, stats[event]))
+        samples.append(("smartpest_cache_entries", G, "Predictions held in the in-memory cache.", {}, stats["entries"]))
+    if fast_model is not None:
+        with _cascade_lock:
+            counts = dict(_cascade_counts)
+        samples += [
+            ("smartpest_cascade_images_total", C, "Images classified by the B0 -> B5 cascade.", {}, counts["images"]),
+            ("smartpest_cascade_escalated_total", C, "Cascade images escalated to B5.", {}, counts["escalated"]),
+            ("smartpest_cascade_seconds_total", C, "Time spent in each cascade stage.", {"stage": STAGE_FAST},
+             counts["fast_seconds"]),
+            ("smartpest_cascade_seconds_total", C, "Time spent in each cascade stage.", {"stage": STAGE_FULL},
+             counts["full_seconds"]),
+        ]
+    samples.append(("smartpest_model_state", G, "Model loading state of this process (1 for the current state).",
+                    {"state": _load_state}, 1))
+    return samples
+
+
+metrics.register_collector(_metric_samples)
+
+
+def _mock_requested():
+    return os.environ.get('SMARTPEST_USE_MOCK', '1') == '1'
+
+
+def _warm_up():
+    """Run a few forward passes so the first real request doesn't pay for lazy init."""
+    global _warmup_runs
+    import torch
+    runs = int(os.environ.get('SMARTPEST_WARMUP_RUNS', '2'))
+    dummy = torch.zeros(3, INPUT_SIZE, INPUT_SIZE)
+    fast_size = cascade_settings()["fast_size"]
+    for _ in range(runs):
+        _run_batch([dummy])
+        if fast_model is not None:
+            _run_batch([torch.zeros(3, fast_size, fast_size)], STAGE_FAST)
+        _warmup_runs += 1
+    if runs:
+        print(f"🔥 Model warmed up with {runs} forward pass(es)")
+
+
+def _load_and_warm_up():
+    """Load the model and warm it up. Must be called with _load_lock held."""
+    global model_loaded, class_names, _load_state, _load_error, _load_seconds
+    _load_state = STATE_LOADING
+    started = time.perf_counter()
+    print("🔄 Initializing SmartPest ML Model...")
+    try:
         model_loaded = load_model()
         if model_loaded:
-            print("🎉 Full ML model loaded with all 131 pest classes!")
+            _warm_up()
+            _load_state = STATE_READY
+            print(f"🎉 Full ML model loaded with all {len(class_names)} pest classes!")
         else:
+            _load_state = STATE_MOCK if _mock_requested() else STATE_FAILED
+            if _load_state == STATE_FAILED:
+                _load_error = "Model weights could not be loaded"
             print("⚠️  Using mock predictions (ML model not available)")
             print("📋 To load the full model, you need the actual model weights file")
+    except Exception as e:
+        model_loaded = False
+        _load_state = STATE_FAILED
+        _load_error = str(e)
+        print(f"❌ Model initialization failed: {e}")
+    finally:
+        if not class_names:
+            class_names = _load_class_names_safe()
+        # Indexed now rather than by the first prediction that embeds pest details
+        pest_data.name_index()
+        _load_seconds = round(time.perf_counter() - started, 3)
+        metrics.set_gauge("smartpest_model_load_seconds", _load_seconds)
+        _load_done.set()
+
+
+# Set once loading has finished, whatever its outcome
+model_loaded = False
+
+def ensure_model_loaded():
+    """Load the model exactly once; concurrent callers wait for the first load to finish"""
+    if _load_done.is_set():
+        return model_loaded
+    with _load_lock:
+        if not _load_done.is_set():
+            _load_and_warm_up()
+    return model_loaded
+
+
+def start_background_loading(on_demand=False):
+    """Start loading and warming up the model in a background thread.
+
+    Called at process start, where SMARTPEST_PRELOAD_MODEL=0 turns it off, and ``on_demand``
+    by readiness checks so an instance without preloading still becomes ready.
+    """
+    global _load_state
+    if not on_demand and os.environ.get('SMARTPEST_PRELOAD_MODEL', '1') != '1':
+        return None
+    with _load_lock:
+        if _load_state != STATE_NOT_STARTED:
+            return None
+        _load_state = STATE_LOADING
+    thread = threading.Thread(target=ensure_model_loaded, name="model-loader", daemon=True)
+    thread.start()
+    return thread
+
+
+def model_status():
+    """Loading state for readiness checks: not_started, loading, ready, mock or failed."""
+    return {
+        "state": _load_state,
+        "ready": _load_state in (STATE_READY, STATE_MOCK),
+        "error": _load_error,
+        "load_seconds": _load_seconds,
+        "warmup_runs": _warmup_runs,
+        "num_classes": len(class_names or []),
+    }
 
 
 def _load_class_names_safe():
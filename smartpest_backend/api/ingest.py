@@ -0,0 +1,196 @@
+"""
+Bulk report ingestion for field devices that sync many detections at once.
+
+The body is a JSON array of report objects or NDJSON (one object per line, read line by
+line). Records are validated in batches of SMARTPEST_INGEST_BATCH_SIZE (default 200),
+with one query per batch to find idempotency keys that were already saved; the valid
+records are then inserted with ``bulk_create`` in a single transaction that also updates
+the detection rollups and the search index (``bulk_create`` sends no signals). Reports
+are stamped with the record's ``detected_at`` (the device's capture time) when given, so
+they land in the right place in the report list and the day/hour rollups.
+
+Each record gets a status: ``created`` (with the new id), ``duplicate`` (its
+``idempotency_key`` was saved before, possibly earlier in the same upload; with that
+report's id) or ``error`` (with the validation errors), so a device can safely retry a
+whole sync after a timeout.
+"""
+import json
+import os
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import rollups, search
+from .models import Report, SearchDocument
+from .serializers import ReportIngestSerializer
+
+CREATED = 'created'
+DUPLICATE = 'duplicate'
+ERROR = 'error'
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+class IngestError(ValueError):
+    """The upload as a whole can't be read (as opposed to one invalid record)."""
+
+
+def ingest_limits():
+    return {
+        "max_records": int(os.environ.get('SMARTPEST_INGEST_MAX_RECORDS', '1000')),
+        "batch_size": int(os.environ.get('SMARTPEST_INGEST_BATCH_SIZE', '200')),
+    }
+
+
+def parse_json_array(body, max_records):
+    """``(record, None)`` items of a JSON array body."""
+    try:
+        data = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        raise IngestError("Body is not valid JSON.")
+    if not isinstance(data, list):
+        raise IngestError("Expected a JSON array of reports.")
+    if len(data) > max_records:
+        raise IngestError(f"At most {max_records} reports per request.")
+    return [(record, None) for record in data]
+
+
+def read_ndjson(readline, max_records):
+    """``(record, None)`` or ``(None, errors)`` items, one per non-blank NDJSON line."""
+    items = []
+    for line in iter(readline, b''):
+        if not line.strip():
+            continue
+        if len(items) == max_records:
+            raise IngestError(f"At most {max_records} reports per request.")
+        try:
+            items.append((json.loads(line), None))
+        except (ValueError, UnicodeDecodeError):
+            items.append((None, {"non_field_errors": ["Line is not valid JSON."]}))
+    return items
+
+
+def _validate(items, batch_size):
+    """Per-item results for invalid records and stored duplicates, and ``(index, data)`` of the rest."""
+    results = {}
+    valid = []
+    for start in range(0, len(items), batch_size):
+        pending = []
+        for index, (record, errors) in enumerate(items[start:start + batch_size], start):
+            if errors is None:
+                serializer = ReportIngestSerializer(data=record)
+                if serializer.is_valid():
+                    data = dict(serializer.validated_data)
+                    data['idempotency_key'] = data.get('idempotency_key') or None
+                    pending.append((index, data))
+                    continue
+                errors = serializer.errors
+            results[index] = {"index": index, "status": ERROR, "errors": errors}
+
+        keys = [data['idempotency_key'] for _, data in pending if data['idempotency_key']]
+        stored = dict(Report.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', 'id')) if keys else {}
+        for index, data in pending:
+            if data['idempotency_key'] in stored:
+                results[index] = {"index": index, "status": DUPLICATE, "id": stored[data['idempotency_key']]}
+            else:
+                valid.append((index, data))
+    return results, valid
+
+
+# Whole-batch inserts tried before falling back to one savepoint per record
+INSERT_ATTEMPTS = 3
+
+
+def _report(data, now):
+    fields = {name: value for name, value in data.items() if name != 'detected_at'}
+    return Report(**fields, timestamp=data.get('detected_at') or now)
+
+
+def _insert(records):
+    with transaction.atomic():
+        now = timezone.now()
+        reports = Report.objects.bulk_create([_report(data, now) for _, data in records])
+        rollups.record(reports)
+        search.index_objects(SearchDocument.KIND_REPORT, reports)
+    return reports
+
+
+def _drop_stored(records, results, ids_by_key):
+    """Mark records whose key has been saved meanwhile as duplicates; returns the others."""
+    keys = [data['idempotency_key'] for _, data in records if data['idempotency_key']]
+    stored = dict(Report.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', 'id'))
+    ids_by_key.update(stored)
+    for index, data in records:
+        if data['idempotency_key'] in stored:
+            results[index] = {"index": index, "status": DUPLICATE, "id": stored[data['idempotency_key']]}
+    return [(index, data) for index, data in records if data['idempotency_key'] not in stored]
+
+
+def _insert_each(records, results, ids_by_key):
+    """Insert record by record, each in a savepoint, mapping key conflicts to duplicates."""
+    inserted, reports = [], []
+    with transaction.atomic():
+        now = timezone.now()
+        for index, data in records:
+            try:
+                with transaction.atomic():
+                    report, = Report.objects.bulk_create([_report(data, now)])
+            except IntegrityError:
+                key = data['idempotency_key']
+                stored = Report.objects.filter(idempotency_key=key).values_list('id', flat=True).first() if key else None
+                if stored is None:
+                    raise
+                ids_by_key[key] = stored
+                results[index] = {"index": index, "status": DUPLICATE, "id": stored}
+                continue
+            inserted.append((index, data))
+            reports.append(report)
+        rollups.record(reports)
+        search.index_objects(SearchDocument.KIND_REPORT, reports)
+    return inserted, reports
+
+
+def ingest(items, batch_size=200):
+    """Validate and save ``items`` (from ``parse_json_array`` or ``read_ndjson``); returns the summary."""
+    results, valid = _validate(items, batch_size)
+
+    # A key repeated within the upload is saved once; later copies are duplicates of it
+    first_by_key = {}
+    records = []
+    for index, data in valid:
+        key = data['idempotency_key']
+        if key and key in first_by_key:
+            results[index] = {"index": index, "status": DUPLICATE, "key": key}
+            continue
+        if key:
+            first_by_key[key] = index
+        records.append((index, data))
+
+    ids_by_key = {}
+    for _attempt in range(INSERT_ATTEMPTS):
+        try:
+            reports = _insert(records)
+            break
+        except IntegrityError:
+            # Another upload saved some of the same keys since we looked: those are duplicates too
+            records = _drop_stored(records, results, ids_by_key)
+    else:
+        # Still racing other uploads: settle each record on its own
+        records, reports = _insert_each(records, results, ids_by_key)
+
+    for (index, data), report in zip(records, reports):
+        results[index] = {"index": index, "status": CREATED, "id": report.id}
+        if data['idempotency_key']:
+            ids_by_key[data['idempotency_key']] = report.id
+    for result in results.values():
+        if 'key' in result:
+            key = result.pop('key')
+            result['id'] = ids_by_key[key]
+
+    ordered = [results[index] for index in range(len(items))]
+    return {
+        "created": sum(result['status'] == CREATED for result in ordered),
+        "duplicates": sum(result['status'] == DUPLICATE for result in ordered),
+        "errors": sum(result['status'] == ERROR for result in ordered),
+        "results": ordered,
+    }
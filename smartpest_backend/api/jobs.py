@@ -0,0 +1,209 @@
+"""
+Asynchronous prediction jobs on a durable queue stored in the regular database.
+
+``enqueue`` writes a ``PredictionJob`` row and returns immediately; worker threads
+(started in-process via SMARTPEST_JOB_WORKERS or by ``manage.py run_prediction_workers``)
+claim queued rows with a conditional UPDATE, so any number of workers in any number
+of processes can share one queue without Redis or Celery. A claimed job holds a lease;
+if its worker dies the lease expires and the job is requeued (up to
+SMARTPEST_JOB_MAX_ATTEMPTS times).
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.db import OperationalError, close_old_connections
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import PredictionJob
+
+TERMINAL_STATUSES = (PredictionJob.STATUS_DONE, PredictionJob.STATUS_FAILED)
+
+# Wakes this process's workers as soon as a job is enqueued here; workers in other
+# processes fall back to polling
+_wakeup = threading.Condition()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def job_settings():
+    return {
+        "workers": int(os.environ.get('SMARTPEST_JOB_WORKERS', '0')),
+        "poll_seconds": float(os.environ.get('SMARTPEST_JOB_POLL_SECONDS', '1.0')),
+        "lease_seconds": float(os.environ.get('SMARTPEST_JOB_LEASE_SECONDS', '120')),
+        "max_attempts": int(os.environ.get('SMARTPEST_JOB_MAX_ATTEMPTS', '3')),
+        "retention_hours": float(os.environ.get('SMARTPEST_JOB_RETENTION_HOURS', '24')),
+        "max_image_bytes": int(os.environ.get('SMARTPEST_JOB_MAX_IMAGE_BYTES', str(25 * 1024 * 1024))),
+    }
+
+
+def enqueue(data, filename='', user_id='anonymous'):
+    """Store an image as a queued job and wake a local worker."""
+    job = PredictionJob.objects.create(image=data, filename=filename[:255], user_id=user_id)
+    with _wakeup:
+        _wakeup.notify()
+    return job
+
+
+def claim_next(worker_id, lease_seconds):
+    """Atomically move the oldest queued job to running for ``worker_id``; None if the queue is empty."""
+    while True:
+        candidate = (
+            PredictionJob.objects.filter(status=PredictionJob.STATUS_QUEUED)
+            .order_by('created_at').values_list('id', flat=True).first()
+        )
+        if candidate is None:
+            return None
+        now = timezone.now()
+        # Only one worker's UPDATE can still see the row as queued; losers try the next one
+        claimed = PredictionJob.objects.filter(pk=candidate, status=PredictionJob.STATUS_QUEUED).update(
+            status=PredictionJob.STATUS_RUNNING,
+            worker_id=worker_id,
+            started_at=now,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return PredictionJob.objects.get(pk=candidate)
+
+
+def _finish(job, worker_id, **fields):
+    """Record a job's outcome, unless its lease was lost to another worker in the meantime."""
+    return PredictionJob.objects.filter(
+        pk=job.pk, status=PredictionJob.STATUS_RUNNING, worker_id=worker_id,
+    ).update(finished_at=timezone.now(), lease_expires_at=None, image=b'', **fields)
+
+
+def run_job(job, worker_id):
+    """Classify one claimed job and store its result."""
+    from .inference import predict_image
+
+    try:
+        result = predict_image(bytes(job.image))
+    except Exception as e:
+        result = {"error": f"Prediction failed: {str(e)}"}
+    if 'error' in result:
+        return _finish(job, worker_id, status=PredictionJob.STATUS_FAILED, error=result['error'])
+    return _finish(job, worker_id, status=PredictionJob.STATUS_DONE, result=result)
+
+
+def requeue_expired(max_attempts):
+    """Put running jobs whose lease ran out (their worker died) back on the queue, or fail them after max_attempts."""
+    now = timezone.now()
+    expired = PredictionJob.objects.filter(status=PredictionJob.STATUS_RUNNING, lease_expires_at__lt=now)
+    failed = expired.filter(attempts__gte=max_attempts).update(
+        status=PredictionJob.STATUS_FAILED, finished_at=now, lease_expires_at=None, image=b'',
+        error=f"Gave up after {max_attempts} attempts",
+    )
+    requeued = expired.filter(attempts__lt=max_attempts).update(
+        status=PredictionJob.STATUS_QUEUED, worker_id='', lease_expires_at=None,
+    )
+    return requeued, failed
+
+
+def purge_finished(retention_hours):
+    """Delete finished jobs older than the retention window."""
+    cutoff = timezone.now() - timedelta(hours=retention_hours)
+    deleted, _ = PredictionJob.objects.filter(status__in=TERMINAL_STATUSES, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+class JobWorker(threading.Thread):
+    """Claims and runs jobs until ``stop()``; sleeps on the wakeup condition when the queue is empty."""
+
+    def __init__(self, index=0, settings=None):
+        self.settings = settings or job_settings()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}:{uuid.uuid4().hex[:6]}"
+        self._stop_event = threading.Event()
+        self.processed = 0
+        super().__init__(name=f"prediction-worker-{index}", daemon=True)
+
+    def stop(self):
+        self._stop_event.set()
+        with _wakeup:
+            _wakeup.notify_all()
+
+    def run(self):
+        poll = self.settings["poll_seconds"]
+        last_maintenance = 0.0
+        while not self._stop_event.is_set():
+            close_old_connections()
+            try:
+                if time.monotonic() - last_maintenance > poll * 10:
+                    requeue_expired(self.settings["max_attempts"])
+                    purge_finished(self.settings["retention_hours"])
+                    last_maintenance = time.monotonic()
+                job = claim_next(self.worker_id, self.settings["lease_seconds"])
+                if job is not None:
+                    run_job(job, self.worker_id)
+                    self.processed += 1
+                    continue
+            except OperationalError as e:
+                # e.g. SQLite "database is locked" under write contention; back off and retry
+                print(f"⚠️ Prediction worker {self.worker_id}: {e}")
+            with _wakeup:
+                _wakeup.wait(poll)
+        close_old_connections()
+
+
+def start_workers(count=None):
+    """Start ``count`` (default SMARTPEST_JOB_WORKERS) worker threads in this process, once."""
+    settings = job_settings()
+    count = settings["workers"] if count is None else count
+    with _workers_lock:
+        if _workers or count <= 0:
+            return list(_workers)
+        for index in range(count):
+            worker = JobWorker(index, settings)
+            worker.start()
+            _workers.append(worker)
+    print(f"✅ Started {count} prediction job worker(s)")
+    return list(_workers)
+
+
+def stop_workers(timeout=None):
+    with _workers_lock:
+        workers = list(_workers)
+        _workers.clear()
+    for worker in workers:
+        worker.stop()
+    for worker in workers:
+        worker.join(timeout)
+
+
+def get_job(job_id):
+    """The job without its (possibly large) image payload; raises PredictionJob.DoesNotExist."""
+    return PredictionJob.objects.defer('image').get(pk=job_id)
+
+
+def job_payload(job):
+    """Public representation of a job for the status and events endpoints."""
+    payload = {
+        "job_id": str(job.id),
+        "status": job.status,
+        "filename": job.filename,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == PredictionJob.STATUS_DONE:
+        payload["result"] = job.result
+    elif job.status == PredictionJob.STATUS_FAILED:
+        payload["error"] = job.error
+    elif job.status == PredictionJob.STATUS_QUEUED:
+        payload["queue_position"] = PredictionJob.objects.filter(
+            status=PredictionJob.STATUS_QUEUED, created_at__lt=job.created_at,
+        ).count()
+    return payload
+
+
+def job_stats():
+    counts = {status: 0 for status, _ in PredictionJob.STATUS_CHOICES}
+    for row in PredictionJob.objects.values('status').annotate(n=Count('id')).order_by():
+        counts[row['status']] = row['n']
+    return {"jobs": counts, "local_workers": len(_workers)}
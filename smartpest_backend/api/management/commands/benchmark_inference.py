@@ -0,0 +1,295 @@
+import hashlib
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import inference
+from api.benchmarking import (
+    RssSampler, apply_env, latency_summary, list_images, rss_mb, run_isolated, synthetic_jpeg,
+)
+
+RESULT_KEY = ("backend", "quantize", "threads", "input_size", "batch_size")
+
+
+def _corpus(images_dir, count, seed):
+    """(name, bytes) of the benchmark images: a folder's first ``count`` files or seeded synthetic photos."""
+    if images_dir:
+        paths = list_images(images_dir, count)
+        if not paths:
+            raise CommandError(f"No images found under {images_dir}")
+        corpus = []
+        for path in paths:
+            with open(path, "rb") as f:
+                corpus.append((os.path.relpath(path, images_dir), f.read()))
+        return corpus
+    return [(f"synthetic_{i:03d}.jpg", synthetic_jpeg(1600, 1200, seed=seed + i)) for i in range(count)]
+
+
+def _expected_source():
+    """The file the configured backend must be served from: the export, the INT8 model or the B5 weights."""
+    if inference.quantize_mode() == inference.QUANTIZE_STATIC:
+        return inference.quantized_model_path()
+    backend = inference.inference_backend()
+    if backend != inference.BACKEND_EAGER:
+        return inference.exported_model_path(backend)
+    return inference.weights_path(os.path.join(inference.MODELS_DIR, "best_model_b5.pth"))
+
+
+def _run_config(env, threads, input_size, batch_sizes, corpus, warmup, iterations, end_to_end):
+    """Load one backend in this (fresh) process and time every batch size at one resolution and thread count."""
+    apply_env(env)
+    import torch
+    from api.preprocessing import Preprocessor, load_image
+
+    torch.set_num_threads(threads)
+    baseline_rss = rss_mb()
+    started = time.perf_counter()
+    # Strict, so a missing export is an error rather than eager numbers under the export's name
+    if not inference.load_model(strict=True):
+        return {"error": "model failed to load"}
+    expected = _expected_source()
+    if os.path.abspath(inference.model_source or "") != os.path.abspath(expected):
+        return {"error": f"loaded {inference.model_source} instead of {expected}"}
+    load_seconds = time.perf_counter() - started
+    loaded_rss = rss_mb()
+
+    preprocess = Preprocessor(input_size)
+    # Decoded once up front unless decode + preprocessing are part of what is being measured
+    images = [load_image(data, input_size) for _name, data in corpus]
+
+    def make_batch(offset, batch_size):
+        selected = [images[(offset + i) % len(images)] for i in range(batch_size)]
+        return inference._preprocess_batch(selected, preprocess)
+
+    def run(index, batch_size, prepared):
+        if end_to_end:
+            offset = index * batch_size
+            selected = [corpus[(offset + i) % len(corpus)][1] for i in range(batch_size)]
+            batch = inference._preprocess_batch([load_image(data, input_size) for data in selected], preprocess)
+        else:
+            batch = prepared[index % len(prepared)]
+        return inference._forward(batch)
+
+    results = []
+    for batch_size in batch_sizes:
+        entry = {"batch_size": batch_size}
+        prepared = [] if end_to_end else [
+            make_batch(i * batch_size, batch_size) for i in range(max(1, len(images) // batch_size))
+        ]
+        try:
+            for i in range(warmup):
+                run(i, batch_size, prepared)
+            latencies = []
+            with RssSampler() as sampler:
+                for i in range(iterations):
+                    t0 = time.perf_counter()
+                    run(i, batch_size, prepared)
+                    latencies.append(time.perf_counter() - t0)
+        except Exception as e:
+            entry["error"] = str(e).splitlines()[0][:300]
+            results.append(entry)
+            continue
+        summary = latency_summary(latencies)
+        total = sum(latencies)
+        entry.update({
+            "throughput_ips": round(batch_size * iterations / total, 3) if total else None,
+            "latency": summary,
+            "per_image_p50_ms": round(summary["p50_ms"] / batch_size, 3),
+            "peak_rss_mb": round(sampler.peak_mb, 1),
+        })
+        results.append(entry)
+    return {
+        "load_seconds": round(load_seconds, 3),
+        "model_rss_mb": round(loaded_rss - baseline_rss, 1),
+        "model_source": os.path.basename(inference.model_source or ""),
+        "batches": results,
+    }
+
+
+def _environment():
+    info = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    for module in ("torch", "onnxruntime", "timm", "numpy", "PIL"):
+        try:
+            info[module] = __import__(module).__version__
+        except Exception:
+            info[module] = None
+    try:
+        info["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        info["git_commit"] = None
+    return info
+
+
+def _key(result):
+    return tuple(result.get(field) for field in RESULT_KEY)
+
+
+def compare_reports(baseline, current, tolerance):
+    """Rows of (key, metric, baseline, current, relative change, regressed) for configurations in both reports."""
+    previous = {_key(r): r for r in baseline.get("results", []) if "error" not in r}
+    rows = []
+    for result in current.get("results", []):
+        old = previous.get(_key(result))
+        if old is None or "error" in result:
+            continue
+        metrics = [
+            # (name, old, new, higher is better)
+            ("throughput_ips", old["throughput_ips"], result["throughput_ips"], True),
+            ("p95_ms", old["latency"]["p95_ms"], result["latency"]["p95_ms"], False),
+            ("peak_rss_mb", old["peak_rss_mb"], result["peak_rss_mb"], False),
+        ]
+        for name, before, after, higher_is_better in metrics:
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            regressed = change < -tolerance if higher_is_better else change > tolerance
+            rows.append((_key(result), name, before, after, change, regressed))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the classifier in-process on a fixed image corpus, sweeping backend, quantization, "
+        "thread count, input resolution and batch size. Reports throughput, p50/p95/p99 latency and "
+        "peak RSS as JSON; --compare diffs against an earlier report to catch regressions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", help="Folder of benchmark images (default: seeded synthetic photos).")
+        parser.add_argument("--corpus-size", type=int, default=16, help="Images in the corpus.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpus.")
+        parser.add_argument(
+            "--backends", nargs="+", choices=inference.BACKENDS, default=[inference.BACKEND_EAGER],
+        )
+        parser.add_argument(
+            "--quantize", nargs="+", choices=inference.QUANTIZE_MODES, default=[inference.QUANTIZE_OFF],
+            help="Quantization modes to sweep (static replaces the backend as at serving time).",
+        )
+        parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 4, 8])
+        parser.add_argument("--threads", nargs="+", type=int, default=[os.cpu_count() or 1])
+        parser.add_argument("--sizes", nargs="+", type=int, default=[inference.INPUT_SIZE], help="Input resolutions.")
+        parser.add_argument("--warmup", type=int, default=2, help="Untimed batches per configuration.")
+        parser.add_argument("--iterations", type=int, default=10, help="Timed batches per configuration.")
+        parser.add_argument(
+            "--end-to-end", action="store_true",
+            help="Include JPEG decode and preprocessing in every timed batch, not just the forward pass.",
+        )
+        parser.add_argument("--output", help="Write the JSON report here (default: print it).")
+        parser.add_argument("--compare", help="Earlier JSON report to diff against.")
+        parser.add_argument(
+            "--tolerance", type=float, default=0.10,
+            help="Relative change counted as a regression in --compare (default 0.10 = 10%%).",
+        )
+        parser.add_argument(
+            "--fail-on-regression", action="store_true", help="Exit non-zero if --compare finds a regression.",
+        )
+
+    def handle(self, *args, **options):
+        corpus = _corpus(options["images"], options["corpus_size"], options["seed"])
+        digest = hashlib.sha1()
+        for name, data in corpus:
+            digest.update(name.encode("utf-8"))
+            digest.update(data)
+        report = {
+            "environment": _environment(),
+            "settings": {
+                "corpus": {
+                    "source": options["images"] or f"synthetic(seed={options['seed']})",
+                    "images": len(corpus),
+                    "sha1": digest.hexdigest(),
+                },
+                "warmup": options["warmup"],
+                "iterations": options["iterations"],
+                "end_to_end": options["end_to_end"],
+            },
+            "results": [],
+        }
+
+        combos = itertools.product(options["backends"], options["quantize"], options["threads"], options["sizes"])
+        for backend, quantize, threads, size in combos:
+            if quantize != inference.QUANTIZE_OFF and backend != inference.BACKEND_EAGER:
+                continue  # quantized modes pick their own runtime, one run per mode is enough
+            env = {
+                "SMARTPEST_USE_MOCK": "0",
+                "SMARTPEST_INFERENCE_BACKEND": backend,
+                "SMARTPEST_QUANTIZE": quantize,
+                "SMARTPEST_CASCADE": "0",
+                "SMARTPEST_BATCHING": "0",
+                "SMARTPEST_CACHE": "0",
+                "SMARTPEST_MODEL_SERVER": None,
+                "SMARTPEST_ORT_THREADS": str(threads),
+                "SMARTPEST_METRICS": "0",
+            }
+            label = f"{backend}/{quantize} threads={threads} size={size}"
+            self.stdout.write(f"Running {label}...")
+            outcome = run_isolated(
+                _run_config, env, threads, size, options["batch_sizes"], corpus,
+                options["warmup"], options["iterations"], options["end_to_end"],
+            )
+            common = {"backend": backend, "quantize": quantize, "threads": threads, "input_size": size}
+            if "error" in outcome:
+                self.stderr.write(f"  ❌ {outcome['error']}")
+                report["results"].append({**common, "batch_size": None, "error": outcome["error"]})
+                continue
+            for batch in outcome["batches"]:
+                result = {
+                    **common, **batch,
+                    "load_seconds": outcome["load_seconds"],
+                    "model_rss_mb": outcome["model_rss_mb"],
+                    "model_source": outcome["model_source"],
+                }
+                report["results"].append(result)
+                if "error" in batch:
+                    self.stderr.write(f"  batch {batch['batch_size']:>3}: ❌ {batch['error']}")
+                else:
+                    self.stdout.write(
+                        f"  batch {batch['batch_size']:>3}: {batch['throughput_ips']:8.2f} img/s, "
+                        f"p50 {batch['latency']['p50_ms']:8.1f} ms, p95 {batch['latency']['p95_ms']:8.1f} ms, "
+                        f"p99 {batch['latency']['p99_ms']:8.1f} ms, peak RSS {batch['peak_rss_mb']:.0f} MiB"
+                    )
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+            self.stdout.write(self.style.SUCCESS(f"✅ Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if options["compare"]:
+            self._compare(report, options)
+
+    def _compare(self, report, options):
+        with open(options["compare"]) as f:
+            baseline = json.load(f)
+        if baseline.get("settings", {}).get("corpus", {}).get("sha1") != report["settings"]["corpus"]["sha1"]:
+            self.stdout.write("⚠️  The baseline was measured on a different image corpus")
+        rows = compare_reports(baseline, report, options["tolerance"])
+        if not rows:
+            self.stdout.write("No configurations in common with the baseline")
+            return
+        commit = baseline.get("environment", {}).get("git_commit")
+        self.stdout.write(f"Compared with {options['compare']} (commit {commit}):")
+        regressions = 0
+        for key, name, before, after, change, regressed in rows:
+            regressions += regressed
+            marker = "❌ REGRESSION" if regressed else ""
+            config = "/".join(str(part) for part in key)
+            self.stdout.write(f"  {config:<40} {name:<15} {before:>10} -> {after:>10} ({change:+.1%}) {marker}")
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(f"{regressions} metric(s) regressed by more than {options['tolerance']:.0%}")
+        self.stdout.write(f"{regressions} regression(s) beyond {options['tolerance']:.0%}")
@@ -0,0 +1,131 @@
+import importlib
+import io
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarking import RssSampler, latency_summary, run_isolated, synthetic_jpeg
+
+# Typical phone camera resolutions (width, height)
+PHONE_SIZES = {
+    "12mp_4x3": (4032, 3024),
+    "12mp_16x9": (4000, 2250),
+    "8mp_4x3": (3264, 2448),
+    "2mp_4x3": (1600, 1200),
+}
+
+
+def _legacy_pipeline(size):
+    """The original path: full decode, then torchvision Resize/ToTensor/Normalize."""
+    from PIL import Image
+    from torchvision import transforms
+
+    transform = transforms.Compose([
+        transforms.Resize((size, size)),
+        transforms.ToTensor(),
+        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
+    ])
+
+    def run(data):
+        return transform(Image.open(io.BytesIO(data)).convert("RGB"))
+    return run
+
+
+def _fast_pipeline(size):
+    """Draft-mode decode plus vectorized normalization into a reused buffer."""
+    from api.preprocessing import Preprocessor, load_image
+
+    preprocess = Preprocessor(size)
+
+    def run(data):
+        return preprocess(load_image(data, size))
+    return run
+
+
+PIPELINES = {"legacy": _legacy_pipeline, "fast": _fast_pipeline}
+
+
+def _measure(pipeline, data, size, repeat):
+    """Time one pipeline in a fresh process; memory is the peak RSS growth while it runs."""
+    # Imported before measuring so torch itself isn't counted as preprocessing memory
+    importlib.import_module("torch")
+    run = PIPELINES[pipeline](size)
+    with RssSampler() as sampler:
+        run(data)
+    decode, total = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        if pipeline == "legacy":
+            from PIL import Image
+            image = Image.open(io.BytesIO(data)).convert("RGB")
+        else:
+            from api.preprocessing import load_image
+            image = load_image(data, size)
+        decode.append(time.perf_counter() - started)
+        del image
+        started = time.perf_counter()
+        run(data)
+        total.append(time.perf_counter() - started)
+    return {
+        "decode": latency_summary(decode),
+        "decode_and_preprocess": latency_summary(total),
+        "peak_rss_growth_mb": round(sampler.peak_growth_mb, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark image decode + preprocessing, original (full decode, torchvision) vs "
+        "draft-mode decode with vectorized normalization, on typical phone photo sizes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=600, help="Model input size.")
+        parser.add_argument("--repeat", type=int, default=10, help="Timed runs per image and pipeline.")
+        parser.add_argument(
+            "--images", nargs="*", choices=sorted(PHONE_SIZES), default=sorted(PHONE_SIZES),
+            help="Synthetic phone image sizes to test.",
+        )
+        parser.add_argument("--json", dest="json_path", help="Also write the results to this file.")
+
+    def handle(self, *args, **options):
+        import numpy as np
+
+        size = options["size"]
+        report = {"input_size": size, "repeat": options["repeat"], "images": {}}
+        for name in options["images"]:
+            width, height = PHONE_SIZES[name]
+            data = synthetic_jpeg(width, height)
+            self.stdout.write(f"{name} ({width}x{height}, {len(data) / 1e6:.1f} MB JPEG)")
+            entry = {"width": width, "height": height, "jpeg_bytes": len(data)}
+            for pipeline in PIPELINES:
+                try:
+                    entry[pipeline] = run_isolated(_measure, pipeline, data, size, options["repeat"])
+                except ImportError as e:
+                    entry[pipeline] = {"error": str(e)}
+                    continue
+                stats = entry[pipeline]
+                self.stdout.write(
+                    f"  {pipeline:>6}: decode p50 {stats['decode']['p50_ms']:8.2f} ms, "
+                    f"decode+preprocess p50 {stats['decode_and_preprocess']['p50_ms']:8.2f} ms, "
+                    f"peak RSS +{stats['peak_rss_growth_mb']:.1f} MiB"
+                )
+            if "error" not in entry.get("legacy", {}) and "error" not in entry.get("fast", {}):
+                legacy = _legacy_pipeline(size)(data).numpy()
+                fast = np.array(_fast_pipeline(size)(data))
+                entry["max_abs_diff"] = round(float(np.abs(legacy - fast).max()), 4)
+                entry["mean_abs_diff"] = round(float(np.abs(legacy - fast).mean()), 4)
+                entry["speedup"] = round(
+                    entry["legacy"]["decode_and_preprocess"]["p50_ms"]
+                    / entry["fast"]["decode_and_preprocess"]["p50_ms"], 2
+                )
+                self.stdout.write(
+                    f"  speedup x{entry['speedup']}, mean |Δ| {entry['mean_abs_diff']} (normalized units)"
+                )
+            report["images"][name] = entry
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as f:
+                json.dump(report, f, indent=2)
+                f.write("\n")
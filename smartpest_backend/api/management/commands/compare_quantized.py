@@ -0,0 +1,115 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import inference
+from api.benchmarking import apply_env, latency_summary, list_images, peak_rss_mb, rss_mb, run_isolated
+from api.preprocessing import load_image
+
+
+def _run_variant(env, paths, expected_source=None):
+    """Load one model variant in this (fresh) process and classify ``paths`` one by one."""
+    apply_env(env)
+    import torch
+
+    baseline_rss = rss_mb()
+    started = time.perf_counter()
+    if not inference.load_model(strict=True):
+        return {"error": "model failed to load"}
+    if expected_source and os.path.abspath(inference.model_source or "") != os.path.abspath(expected_source):
+        return {"error": f"loaded {inference.model_source} instead of {expected_source}"}
+    load_seconds = time.perf_counter() - started
+    loaded_rss = rss_mb()
+
+    top1, latencies = [], []
+    for path in paths:
+        try:
+            tensor = inference.transform(load_image(path, inference.INPUT_SIZE))
+        except Exception:
+            top1.append(None)
+            continue
+        started = time.perf_counter()
+        probs = inference._run_batch([tensor])[0]
+        latencies.append(time.perf_counter() - started)
+        top1.append(int(torch.argmax(probs).item()))
+    return {
+        "top1": top1,
+        "latency": latency_summary(latencies),
+        "load_seconds": round(load_seconds, 3),
+        "model_rss_mb": round(loaded_rss - baseline_rss, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Accuracy-regression harness: compare an INT8 classifier against fp32 on the same images "
+        "(top-1 agreement, latency and resident memory)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", required=True, help="Folder of evaluation images.")
+        parser.add_argument("--limit", type=int, default=None, help="Max images to evaluate.")
+        parser.add_argument(
+            "--baseline-backend", choices=inference.BACKENDS, default=inference.BACKEND_EAGER,
+            help="Backend used for the fp32 reference.",
+        )
+        parser.add_argument(
+            "--min-agreement", type=float, default=None,
+            help="Fail if top-1 agreement drops below this fraction (e.g. 0.98).",
+        )
+        parser.add_argument("--json", dest="json_path", help="Also write the report to this file.")
+
+    def handle(self, *args, **options):
+        paths = list_images(options["images"], options["limit"])
+        if not paths:
+            raise CommandError(f"No images found under {options['images']}")
+        int8_path = inference.quantized_model_path()
+        if not os.path.exists(int8_path):
+            raise CommandError(f"No INT8 model at {int8_path} (run `python manage.py quantize_model` first)")
+
+        common = {"SMARTPEST_USE_MOCK": "0", "SMARTPEST_BATCHING": "0"}
+        variants = {
+            "fp32": {**common, "SMARTPEST_QUANTIZE": inference.QUANTIZE_OFF,
+                     "SMARTPEST_INFERENCE_BACKEND": options["baseline_backend"]},
+            "int8": {**common, "SMARTPEST_QUANTIZE": inference.QUANTIZE_STATIC,
+                     "SMARTPEST_INFERENCE_BACKEND": inference.BACKEND_EAGER},
+        }
+        expected = {"int8": int8_path}
+        results = {}
+        for name, env in variants.items():
+            self.stdout.write(f"Running {name} on {len(paths)} images...")
+            results[name] = run_isolated(_run_variant, env, paths, expected.get(name))
+            if "error" in results[name]:
+                raise CommandError(f"{name}: {results[name]['error']}")
+
+        pairs = [
+            (a, b) for a, b in zip(results["fp32"]["top1"], results["int8"]["top1"])
+            if a is not None and b is not None
+        ]
+        agreement = sum(a == b for a, b in pairs) / len(pairs) if pairs else 0.0
+        report = {
+            "images": len(paths),
+            "compared": len(pairs),
+            "mode": inference.QUANTIZE_STATIC,
+            "top1_agreement": round(agreement, 4),
+        }
+        for name in variants:
+            report[name] = {k: v for k, v in results[name].items() if k != "top1"}
+        fp32_ms = report["fp32"]["latency"].get("mean_ms")
+        int8_ms = report["int8"]["latency"].get("mean_ms")
+        if fp32_ms and int8_ms:
+            report["speedup"] = round(fp32_ms / int8_ms, 3)
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options["json_path"]:
+            with open(options["json_path"], "w") as f:
+                f.write(output + "\n")
+
+        if options["min_agreement"] is not None and agreement < options["min_agreement"]:
+            raise CommandError(
+                f"Top-1 agreement {agreement:.2%} is below the required {options['min_agreement']:.2%}"
+            )
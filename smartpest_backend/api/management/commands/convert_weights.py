@@ -0,0 +1,78 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import inference
+
+DEFAULT_CHECKPOINTS = ("best_model_b5.pth", "best_efficientnet_b0.pth", "pretrained_efficientnet_b0.pth")
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert .pth checkpoints to .safetensors next to them. The server then memory-maps the "
+        "weights, so they load in milliseconds and their pages are shared by all worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "checkpoints", nargs="*",
+            help="Checkpoints to convert (default: the B5 and B0 weights found in models/).",
+        )
+        parser.add_argument("--force", action="store_true", help="Overwrite existing .safetensors files.")
+
+    def handle(self, *args, **options):
+        try:
+            import torch
+            from safetensors.torch import load_file, save_file
+        except ImportError:
+            raise CommandError("Converting weights needs the `torch` and `safetensors` packages.")
+
+        paths = options["checkpoints"] or [
+            os.path.join(inference.MODELS_DIR, name) for name in DEFAULT_CHECKPOINTS
+            if os.path.exists(os.path.join(inference.MODELS_DIR, name))
+        ]
+        if not paths:
+            raise CommandError(f"No checkpoints found in {inference.MODELS_DIR}")
+
+        failures = 0
+        for path in paths:
+            output = os.path.splitext(path)[0] + ".safetensors"
+            if not os.path.exists(path):
+                self.stderr.write(f"❌ {path}: no such file")
+                failures += 1
+                continue
+            if inference.is_lfs_pointer(path):
+                self.stderr.write(f"❌ {path} is a Git LFS pointer, run `git lfs pull` first")
+                failures += 1
+                continue
+            if os.path.exists(output) and not options["force"]:
+                self.stdout.write(f"Skipping {path}: {os.path.basename(output)} exists (use --force)")
+                continue
+
+            state = torch.load(path, map_location="cpu")
+            tensors = {key: value for key, value in state.items() if isinstance(value, torch.Tensor)}
+            dropped = sorted(set(state) - set(tensors))
+            if dropped:
+                self.stdout.write(f"  Dropping {len(dropped)} non-tensor entries: {', '.join(dropped[:5])}")
+            # safetensors refuses tensors sharing storage; cloning gives each its own contiguous buffer
+            tensors = {key: value.detach().contiguous().clone() for key, value in tensors.items()}
+            save_file(tensors, output, metadata={"format": "pt", "source": os.path.basename(path)})
+
+            started = time.perf_counter()
+            reloaded = load_file(output)
+            load_ms = (time.perf_counter() - started) * 1000
+            mismatched = [key for key, value in tensors.items() if not torch.equal(value, reloaded[key])]
+            if mismatched or set(reloaded) != set(tensors):
+                os.unlink(output)
+                self.stderr.write(f"❌ {path}: round trip mismatch on {len(mismatched)} tensors, removed {output}")
+                failures += 1
+                continue
+            size_mb = os.path.getsize(output) / (1024 * 1024)
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {os.path.basename(path)} -> {os.path.basename(output)} "
+                f"({len(tensors)} tensors, {size_mb:.1f} MiB, verified, loads in {load_ms:.1f} ms)"
+            ))
+
+        if failures:
+            raise CommandError(f"{failures} checkpoint(s) could not be converted")
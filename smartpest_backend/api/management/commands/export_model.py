@@ -0,0 +1,126 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import inference
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the pest classifier to TorchScript and ONNX with classes.txt baked in, "
+        "and check each export against eager PyTorch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backend", action="append", choices=[inference.BACKEND_TORCHSCRIPT, inference.BACKEND_ONNXRUNTIME],
+            help="Backend to export (repeatable). Defaults to all exportable backends.",
+        )
+        parser.add_argument("--output-dir", default=inference.EXPORT_DIR, help="Where to write the exported files.")
+        parser.add_argument("--opset", type=int, default=17, help="ONNX opset version.")
+        parser.add_argument("--atol", type=float, default=1e-3, help="Max absolute difference in class probabilities.")
+        parser.add_argument("--verify-batches", type=int, default=2, help="Random batches used for verification.")
+        parser.add_argument("--verify-batch-size", type=int, default=2, help="Images per verification batch.")
+
+    def handle(self, *args, **options):
+        import torch
+
+        backends = options["backend"] or [inference.BACKEND_TORCHSCRIPT, inference.BACKEND_ONNXRUNTIME]
+        output_dir = options["output_dir"]
+        os.makedirs(output_dir, exist_ok=True)
+
+        eager = self._load_eager()
+        classes_txt = "\n".join(inference.class_names) + "\n"
+        example = torch.randn(1, 3, inference.INPUT_SIZE, inference.INPUT_SIZE)
+
+        for backend in backends:
+            path = os.path.join(output_dir, inference.EXPORTED_FILES[backend])
+            self.stdout.write(f"Exporting {backend} → {path}")
+            if backend == inference.BACKEND_TORCHSCRIPT:
+                self._export_torchscript(eager, example, classes_txt, path)
+            else:
+                self._export_onnx(eager, example, classes_txt, path, options["opset"])
+            max_diff, agreement = self._verify(eager, backend, path, options)
+            if max_diff > options["atol"]:
+                raise CommandError(
+                    f"{backend} export differs from eager PyTorch: max |Δp| = {max_diff:.2e} > {options['atol']:.0e}"
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {backend}: max |Δp| = {max_diff:.2e}, top-1 agreement {agreement:.1%}"
+            ))
+
+    def _load_eager(self):
+        """Load the classifier with the eager backend, ignoring mock and backend settings."""
+        previous = {k: os.environ.get(k) for k in ("SMARTPEST_USE_MOCK", "SMARTPEST_INFERENCE_BACKEND")}
+        os.environ["SMARTPEST_USE_MOCK"] = "0"
+        os.environ["SMARTPEST_INFERENCE_BACKEND"] = inference.BACKEND_EAGER
+        try:
+            if not inference.load_model():
+                raise CommandError("Could not load the eager PyTorch model; see the messages above.")
+        finally:
+            for key, value in previous.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+        return inference.model.to("cpu").eval()
+
+    def _export_torchscript(self, eager, example, classes_txt, path):
+        import torch
+        with torch.no_grad():
+            traced = torch.jit.trace(eager, example)
+            frozen = torch.jit.freeze(traced.eval())
+        torch.jit.save(frozen, path, _extra_files={"classes.txt": classes_txt})
+
+    def _export_onnx(self, eager, example, classes_txt, path, opset):
+        import torch
+        try:
+            import onnx
+        except ImportError:
+            raise CommandError("ONNX export needs the `onnx` package (pip install onnx onnxruntime).")
+        with torch.no_grad():
+            torch.onnx.export(
+                eager, example, path,
+                input_names=["input"], output_names=["logits"],
+                dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+                opset_version=opset, dynamo=False,
+            )
+        exported = onnx.load(path)
+        entry = exported.metadata_props.add()
+        entry.key, entry.value = "classes", classes_txt
+        onnx.save(exported, path)
+
+    def _verify(self, eager, backend, path, options):
+        """Compare export and eager softmax outputs on random inputs."""
+        import torch
+        import torch.nn.functional as F
+
+        if backend == inference.BACKEND_TORCHSCRIPT:
+            extra_files = {"classes.txt": ""}
+            exported = torch.jit.load(path, map_location="cpu", _extra_files=extra_files)
+            baked = extra_files["classes.txt"]
+        else:
+            try:
+                import onnxruntime as ort
+            except ImportError:
+                raise CommandError("Verifying the ONNX export needs the `onnxruntime` package.")
+            session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+            exported = inference.OnnxClassifier(session)
+            baked = session.get_modelmeta().custom_metadata_map.get("classes", "")
+        baked = baked.decode("utf-8") if isinstance(baked, bytes) else baked
+        if [line for line in baked.splitlines() if line.strip()] != list(inference.class_names):
+            raise CommandError(f"{backend} export does not carry the expected class names")
+
+        generator = torch.Generator().manual_seed(0)
+        max_diff, agree, total = 0.0, 0, 0
+        with torch.no_grad():
+            for _ in range(options["verify_batches"]):
+                batch = torch.randn(
+                    options["verify_batch_size"], 3, inference.INPUT_SIZE, inference.INPUT_SIZE, generator=generator
+                )
+                expected = F.softmax(eager(batch), dim=1)
+                actual = F.softmax(exported(batch).float(), dim=1)
+                max_diff = max(max_diff, (expected - actual).abs().max().item())
+                agree += (expected.argmax(dim=1) == actual.argmax(dim=1)).sum().item()
+                total += batch.shape[0]
+        return max_diff, agree / total if total else 1.0
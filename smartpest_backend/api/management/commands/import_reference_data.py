@@ -0,0 +1,150 @@
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from api import data_version, search
+from api.models import Pest, PestPesticide, Pesticide, SearchDocument
+from api.pest_data import DESCRIPTIONS_FILE, PESTICIDES_FILE, canonical_key, load_reference_files, normalize_name
+
+
+@contextmanager
+def _count_queries():
+    counter = [0]
+
+    def wrapper(execute, sql, params, many, context):
+        counter[0] += 1
+        return execute(sql, params, many, context)
+    with connection.execute_wrapper(wrapper):
+        yield counter
+
+
+def _stored_names(model, key):
+    """``key(name)`` -> stored spelling for every existing row, the oldest row winning a tie.
+
+    Normalized names can't be matched in SQL, so this reads the (small) name column once.
+    """
+    stored = {}
+    for name in model.objects.order_by('id').values_list('name', flat=True):
+        stored.setdefault(key(name), name)
+    return stored
+
+
+def import_records(records, force=False):
+    """Upsert pests, pesticides and their links from reference records in a handful of set-based queries.
+
+    Pests and pesticides already stored under another spelling ("Army worm" for ``army-worm``,
+    trailing spaces; see ``pest_data.normalize_name``) are updated rather than duplicated. By default only what is missing is filled in: new pests, empty descriptions and
+    the pesticide lists of pests that have none, so edits made on the admin page survive. With
+    ``force`` every imported pest's description and pesticide list are replaced by the ones in
+    ``records``. Pesticides' own fields and pests not in ``records`` are always left alone.
+    """
+    stored_pests = _stored_names(Pest, canonical_key)
+    pesticide_names = {}
+    for record in records:
+        for item in record['pesticides']:
+            name = str(item.get('name', '')).strip()
+            if name:
+                pesticide_names.setdefault(normalize_name(name), name)
+    stored_pesticides = _stored_names(Pesticide, normalize_name)
+
+    def pest_name(record):
+        return stored_pests.get(canonical_key(record['name']), record['name'])
+
+    with transaction.atomic():
+        described = [r for r in records if r['description'] is not None]
+        if not force:
+            # Stored pests only get a description if they have none yet
+            undescribed = set(
+                Pest.objects.filter(name__in=stored_pests.values())
+                .filter(Q(description__isnull=True) | Q(description='')).values_list('name', flat=True)
+            )
+            described = [r for r in described if pest_name(r) in undescribed or canonical_key(r['name']) not in stored_pests]
+        described = [Pest(name=pest_name(r), description=r['description']) for r in described]
+        Pest.objects.bulk_create(
+            described, update_conflicts=True, unique_fields=['name'], update_fields=['description'],
+        )
+        # Pests only the pesticide file knows keep any description entered by hand
+        Pest.objects.bulk_create(
+            [Pest(name=pest_name(r)) for r in records if r['description'] is None], ignore_conflicts=True,
+        )
+        Pesticide.objects.bulk_create(
+            [Pesticide(name=stored_pesticides.get(key, name)) for key, name in pesticide_names.items()],
+            ignore_conflicts=True,
+        )
+
+        pest_ids = dict(
+            Pest.objects.filter(name__in=[pest_name(r) for r in records]).values_list('name', 'id')
+        )
+        pesticide_ids = {
+            normalize_name(name): pk for name, pk in Pesticide.objects.filter(
+                name__in=[stored_pesticides.get(key, name) for key, name in pesticide_names.items()]
+            ).values_list('name', 'id')
+        }
+        kept = set()
+        if not force:
+            kept = set(PestPesticide.objects.filter(pest_id__in=pest_ids.values()).values_list('pest_id', flat=True))
+        links = []
+        for record in records:
+            pest_id = pest_ids[pest_name(record)]
+            if pest_id in kept:
+                continue
+            seen = set()
+            for position, item in enumerate(record['pesticides']):
+                key = normalize_name(item.get('name', ''))
+                if not key or key in seen:
+                    continue
+                seen.add(key)
+                links.append(PestPesticide(
+                    pest_id=pest_id,
+                    pesticide_id=pesticide_ids[key],
+                    dosage=item.get('dosage') or '',
+                    safety_precautions=item.get('safety_precautions') or '',
+                    position=position,
+                ))
+        if force:
+            PestPesticide.objects.filter(pest_id__in=pest_ids.values()).delete()
+        PestPesticide.objects.bulk_create(links)
+        # bulk_create sends no post_save signals, so refresh the search documents here
+        search.index_objects(SearchDocument.KIND_PEST, Pest.objects.filter(id__in=pest_ids.values()))
+        search.index_objects(SearchDocument.KIND_PESTICIDE, Pesticide.objects.filter(id__in=pesticide_ids.values()))
+        data_version.bump()
+    return {"pests": len(pest_ids), "pesticides": len(pesticide_ids), "links": len(links), "kept": len(kept)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-upsert the pest descriptions and pesticide recommendations from "
+        "api/pest_description.json and api/pesticides_info.json into the Pest, Pesticide and "
+        "PestPesticide tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--if-empty", action="store_true",
+            help="Do nothing if pesticide recommendations were already imported (for running on every deploy).",
+        )
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Overwrite stored descriptions and pesticide lists, including ones edited on the admin page.",
+        )
+
+    def handle(self, *args, **options):
+        if options["if_empty"] and PestPesticide.objects.exists():
+            self.stdout.write("Reference data already imported, skipping (drop --if-empty to re-import)")
+            return
+        records = load_reference_files()
+        self.stdout.write(f"Importing {len(records)} pests from {DESCRIPTIONS_FILE} and {PESTICIDES_FILE}")
+        started = time.perf_counter()
+        with _count_queries() as queries:
+            counts = import_records(records, force=options["force"])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {counts['pests']} pests, {counts['pesticides']} pesticides and {counts['links']} "
+            f"recommendations in {queries[0]} queries ({time.perf_counter() - started:.2f}s)"
+        ))
+        if counts["kept"]:
+            self.stdout.write(
+                f"Kept the stored recommendations of {counts['kept']} pests (use --force to overwrite them)"
+            )
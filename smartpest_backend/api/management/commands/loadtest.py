@@ -0,0 +1,386 @@
+import importlib.util
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import inference
+from api.benchmarking import latency_summary, list_images, synthetic_jpeg
+
+DEFAULT_MIX = "predict=4,pest-info=3,reports=2,save-report=1,login=1"
+ENDPOINTS = ("predict", "pest-info", "reports", "save-report", "login")
+
+
+def parse_mix(value):
+    """``"predict=4,reports=1"`` -> ``{"predict": 4.0, "reports": 1.0}``"""
+    mix = {}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise CommandError(f"Unknown endpoint {name!r} in --mix (choose from {', '.join(ENDPOINTS)})")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Bad weight {weight!r} for {name} in --mix")
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+    if not mix:
+        raise CommandError("--mix selects no endpoints")
+    return mix
+
+
+class _Scenario:
+    """Builds and sends one request of each kind; one ``requests.Session`` per load thread."""
+
+    def __init__(self, base_url, images, pest_names, credentials, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.images = images
+        self.pest_names = pest_names
+        self.credentials = credentials
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self):
+        import requests
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def send(self, endpoint, rng):
+        """Issue one request; returns the HTTP status (0 for a connection error or timeout)."""
+        import requests
+        session = self._session()
+        api = f"{self.base_url}/api"
+        try:
+            if endpoint == "predict":
+                name, data = rng.choice(self.images)
+                response = session.post(f"{api}/predict/", files={"image": (name, data, "image/jpeg")}, timeout=self.timeout)
+            elif endpoint == "pest-info":
+                response = session.get(f"{api}/pest-info/{rng.choice(self.pest_names)}/", timeout=self.timeout)
+            elif endpoint == "reports":
+                response = session.get(f"{api}/reports/", timeout=self.timeout)
+            elif endpoint == "save-report":
+                response = session.post(f"{api}/save-report/", json={
+                    "pest_name": rng.choice(self.pest_names),
+                    "confidence": round(rng.uniform(0.5, 1.0), 4),
+                    "description": "load test",
+                    "user_id": "loadtest",
+                }, timeout=self.timeout)
+            else:
+                response = session.post(f"{api}/login/", json=self.credentials, timeout=self.timeout)
+            response.content  # Read the whole body so latency includes the transfer
+            return response.status_code
+        except requests.RequestException:
+            return 0
+
+
+class _Recorder:
+    """Thread-safe (endpoint, status, latency) samples, ignoring those that finish during warm-up."""
+
+    def __init__(self, measure_from):
+        self.measure_from = measure_from
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, status, latency, finished_at):
+        if finished_at < self.measure_from:
+            return
+        with self._lock:
+            self.samples.append((endpoint, status, latency))
+
+
+def _summarize(samples, seconds, endpoints):
+    def block(rows):
+        errors = sum(1 for _endpoint, status, _latency in rows if status == 0 or status >= 400)
+        codes = {}
+        for _endpoint, status, _latency in rows:
+            codes[str(status)] = codes.get(str(status), 0) + 1
+        return {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": round(errors / len(rows), 4) if rows else 0.0,
+            "throughput_rps": round(len(rows) / seconds, 3) if seconds else None,
+            "latency": latency_summary([latency for _endpoint, _status, latency in rows]),
+            "status_codes": dict(sorted(codes.items())),
+        }
+    return {
+        "endpoints": {name: block([s for s in samples if s[0] == name]) for name in endpoints},
+        "total": block(samples),
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a weighted mix of API calls (predict, pest-info, reports, save-report, login) against a "
+        "server and report per-endpoint latency percentiles, error rates and throughput. Use "
+        "--start-server mock|real to load-test a local gunicorn on a throwaway database, with the mock "
+        "model (web-tier limits) or the real one (model limits)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="Server to test, e.g. http://127.0.0.1:8000 (or use --start-server).")
+        parser.add_argument(
+            "--start-server", choices=["mock", "real"],
+            help="Start a local gunicorn with the mock or real model and a temporary SQLite database.",
+        )
+        parser.add_argument("--server-workers", type=int, default=2, help="gunicorn workers for --start-server.")
+        parser.add_argument("--server-threads", type=int, default=4, help="gunicorn threads per worker.")
+        parser.add_argument(
+            "--server-env", action="append", default=[], metavar="NAME=VALUE",
+            help="Extra environment for the started server, e.g. SMARTPEST_CACHE=0 (repeatable).",
+        )
+        parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Endpoint weights (default: {DEFAULT_MIX}).")
+        parser.add_argument(
+            "--mode", choices=["closed", "open"], default="closed",
+            help="closed: --concurrency users back to back; open: requests arrive at --rate per second.",
+        )
+        parser.add_argument("--concurrency", type=int, default=8, help="Users (closed) or max in-flight requests (open).")
+        parser.add_argument("--rate", type=float, default=10.0, help="Open loop arrival rate in requests/second.")
+        parser.add_argument(
+            "--arrivals", choices=["poisson", "constant"], default="poisson", help="Open loop inter-arrival times.",
+        )
+        parser.add_argument("--think-ms", type=float, default=0.0, help="Closed loop pause between a user's requests.")
+        parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds.")
+        parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of load before measuring starts.")
+        parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds.")
+        parser.add_argument("--images", help="Folder of JPEGs to upload (default: synthetic photos).")
+        parser.add_argument("--image-size", default="1024x768", help="Synthetic upload size WIDTHxHEIGHT.")
+        parser.add_argument("--login-email", help="Existing account used by the login calls.")
+        parser.add_argument("--login-password", help="Password of --login-email.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Also write the JSON report to this file.")
+
+    def handle(self, *args, **options):
+        if importlib.util.find_spec("requests") is None:
+            raise CommandError("The load generator needs the `requests` package.")
+        if bool(options["url"]) == bool(options["start_server"]):
+            raise CommandError("Pass exactly one of --url or --start-server")
+        mix = parse_mix(options["mix"])
+
+        server, workdir = None, None
+        try:
+            if options["start_server"]:
+                workdir = tempfile.mkdtemp(prefix="smartpest-loadtest-")
+                server, base_url = self._start_server(options, workdir)
+            else:
+                base_url = options["url"].rstrip("/")
+            credentials = self._credentials(base_url, options, mix)
+            scenario = _Scenario(
+                base_url, self._images(options), inference._load_class_names_safe(), credentials, options["timeout"],
+            )
+            report = self._run(scenario, mix, options)
+            report["target"] = base_url
+            report["server"] = (
+                {"model": options["start_server"], "workers": options["server_workers"],
+                 "threads": options["server_threads"], "env": options["server_env"]} if server else None
+            )
+        finally:
+            if server is not None:
+                server.terminate()
+                try:
+                    server.wait(timeout=20)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+            if workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        self._print(report)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+                f.write("\n")
+            self.stdout.write(self.style.SUCCESS(f"✅ Report written to {options['output']}"))
+
+    def _images(self, options):
+        rng = random.Random(options["seed"])
+        if options["images"]:
+            paths = list_images(options["images"], 64)
+            if not paths:
+                raise CommandError(f"No images found under {options['images']}")
+            images = []
+            for path in paths:
+                with open(path, "rb") as f:
+                    images.append((os.path.basename(path), f.read()))
+            return images
+        try:
+            width, height = (int(v) for v in options["image_size"].lower().split("x"))
+        except ValueError:
+            raise CommandError("--image-size must look like 1024x768")
+        return [(f"load_{i}.jpg", synthetic_jpeg(width, height, seed=rng.randrange(1 << 30))) for i in range(8)]
+
+    def _credentials(self, base_url, options, mix):
+        if "login" not in mix:
+            return None
+        if options["login_email"] and options["login_password"]:
+            return {"email": options["login_email"], "password": options["login_password"]}
+        if not options["start_server"]:
+            raise CommandError(
+                "The login calls need --login-email/--login-password when testing an existing server "
+                "(or drop login from --mix)"
+            )
+        # Throwaway database: register a user for the login calls
+        import requests
+        credentials = {"email": f"loadtest-{uuid.uuid4().hex[:8]}@example.com", "password": uuid.uuid4().hex}
+        response = requests.post(f"{base_url}/api/register/", json={
+            **credentials, "first_name": "Load", "last_name": "Test", "phone": "0000000000",
+        }, timeout=options["timeout"])
+        if response.status_code != 201:
+            raise CommandError(f"Could not register the load test user: {response.status_code} {response.text[:200]}")
+        return credentials
+
+    def _start_server(self, options, workdir):
+        import requests
+        if importlib.util.find_spec("gunicorn") is None:
+            raise CommandError("--start-server needs gunicorn (see requirements.txt)")
+        port = _free_port()
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'db.sqlite3')}",
+            "SMARTPEST_USE_MOCK": "1" if options["start_server"] == "mock" else "0",
+            "SMARTPEST_METRICS_DIR": os.path.join(workdir, "metrics"),
+            "SMARTPEST_CACHE_DB": "",
+        }
+        env.pop("SMARTPEST_MODEL_SERVER", None)
+        for item in options["server_env"]:
+            name, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"--server-env expects NAME=VALUE, got {item!r}")
+            env[name] = value
+        # Throwaway database: migrate and seed the pest/pesticide tables so the
+        # info and search calls hit the same data as production
+        for command in (["migrate", "--noinput"], ["import_reference_data"]):
+            subprocess.run(
+                [sys.executable, "manage.py", *command, "-v", "0"],
+                cwd=settings.BASE_DIR, env=env, check=True,
+            )
+        log_path = os.path.join(workdir, "server.log")
+        self.stdout.write(
+            f"Starting gunicorn ({options['start_server']} model, {options['server_workers']} workers x "
+            f"{options['server_threads']} threads) on port {port}, log: {log_path}"
+        )
+        log = open(log_path, "w")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "smartpest_backend.wsgi",
+             "--bind", f"127.0.0.1:{port}",
+             "--workers", str(options["server_workers"]),
+             "--threads", str(options["server_threads"]),
+             "--timeout", "300"],
+            cwd=settings.BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 600
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                log.close()
+                with open(log_path) as f:
+                    tail = f.read()[-2000:]
+                raise CommandError(f"gunicorn exited with code {server.returncode}:\n{tail}")
+            try:
+                if requests.get(f"{base_url}/readyz/", timeout=2).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+        else:
+            server.kill()
+            raise CommandError("Server did not become ready within 10 minutes")
+        state = requests.get(f"{base_url}/readyz/", timeout=5).json().get("state")
+        if options["start_server"] == "real" and state != inference.STATE_READY:
+            server.kill()
+            raise CommandError(f"Real model requested but the server is in state {state!r}")
+        self.stdout.write(f"Server ready (model state: {state})")
+        return server, base_url
+
+    def _run(self, scenario, mix, options):
+        names, weights = list(mix), list(mix.values())
+        warmup, duration = options["warmup"], options["duration"]
+        started = time.monotonic()
+        recorder = _Recorder(started + warmup)
+        stop_at = started + warmup + duration
+        self.stdout.write(
+            f"Running {options['mode']} loop for {warmup:.0f}s warm-up + {duration:.0f}s "
+            + (f"at {options['rate']} req/s" if options["mode"] == "open" else f"with {options['concurrency']} users")
+        )
+
+        if options["mode"] == "closed":
+            def user(index):
+                rng = random.Random(options["seed"] * 1000 + index)
+                while time.monotonic() < stop_at:
+                    endpoint = rng.choices(names, weights)[0]
+                    t0 = time.monotonic()
+                    status = scenario.send(endpoint, rng)
+                    finished = time.monotonic()
+                    recorder.record(endpoint, status, finished - t0, finished)
+                    if options["think_ms"]:
+                        time.sleep(options["think_ms"] / 1000.0)
+            threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(options["concurrency"])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        else:
+            rng = random.Random(options["seed"])
+            lock = threading.Lock()
+
+            def fire(endpoint, scheduled, request_seed):
+                status = scenario.send(endpoint, random.Random(request_seed))
+                finished = time.monotonic()
+                # Measured from the scheduled arrival, so time spent waiting for a free slot counts
+                recorder.record(endpoint, status, finished - scheduled, finished)
+
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+                next_at = time.monotonic()
+                while next_at < stop_at:
+                    delay = next_at - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    with lock:
+                        endpoint = rng.choices(names, weights)[0]
+                        request_seed = rng.randrange(1 << 30)
+                    pool.submit(fire, endpoint, next_at, request_seed)
+                    gap = rng.expovariate(options["rate"]) if options["arrivals"] == "poisson" else 1.0 / options["rate"]
+                    next_at += gap
+
+        measured = min(time.monotonic(), stop_at) - recorder.measure_from
+        report = _summarize(recorder.samples, max(measured, 1e-9), names)
+        report["settings"] = {
+            key: options[key] for key in (
+                "mode", "concurrency", "rate", "arrivals", "think_ms", "duration", "warmup", "mix", "timeout", "seed",
+            )
+        }
+        report["settings"]["mix"] = mix
+        report["measured_seconds"] = round(measured, 3)
+        return report
+
+    def _print(self, report):
+        self.stdout.write(
+            f"\n{'endpoint':<12} {'requests':>8} {'rps':>8} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+        )
+        rows = list(report["endpoints"].items()) + [("TOTAL", report["total"])]
+        for name, block in rows:
+            latency = block["latency"]
+            self.stdout.write(
+                f"{name:<12} {block['requests']:>8} {block['throughput_rps'] or 0:>8.2f} "
+                f"{block['error_rate']:>7.1%} {latency.get('p50_ms', 0):>9.1f} "
+                f"{latency.get('p95_ms', 0):>9.1f} {latency.get('p99_ms', 0):>9.1f}"
+            )
@@ -0,0 +1,110 @@
+import os
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from api import inference
+from api.benchmarking import list_images
+from api.preprocessing import load_image
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the static INT8 classifier (models/exported/classifier_int8.onnx) with post-training "
+        "quantization calibrated on a local folder of images. Serve it with SMARTPEST_QUANTIZE=static."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calibration-dir", required=True, help="Folder of representative pest images.")
+        parser.add_argument("--num-images", type=int, default=200, help="Max calibration images to use.")
+        parser.add_argument(
+            "--method", choices=["minmax", "entropy", "percentile"], default="minmax",
+            help="Calibration method for activation ranges.",
+        )
+        parser.add_argument(
+            "--per-tensor", action="store_true",
+            help="Quantize weights per tensor instead of per channel (faster, usually less accurate).",
+        )
+        parser.add_argument("--output", default=inference.quantized_model_path(), help="Where to write the INT8 model.")
+
+    def handle(self, *args, **options):
+        try:
+            import onnx
+            from onnxruntime.quantization import (
+                CalibrationMethod, QuantFormat, QuantType, quantize_static,
+            )
+        except ImportError:
+            raise CommandError("Static quantization needs the `onnx` and `onnxruntime` packages.")
+
+        images = list_images(options["calibration_dir"], options["num_images"])
+        if not images:
+            raise CommandError(f"No images found under {options['calibration_dir']}")
+
+        fp32_path = inference.exported_model_path(inference.BACKEND_ONNXRUNTIME)
+        if not os.path.exists(fp32_path):
+            self.stdout.write("No fp32 ONNX export yet, running export_model first")
+            call_command("export_model", backend=[inference.BACKEND_ONNXRUNTIME], stdout=self.stdout)
+
+        source = fp32_path
+        try:
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+            source = fp32_path + ".pre.onnx"
+            quant_pre_process(fp32_path, source)
+        except Exception as e:
+            self.stdout.write(f"Skipping ONNX pre-processing ({e})")
+            source = fp32_path
+
+        method = {
+            "minmax": CalibrationMethod.MinMax,
+            "entropy": CalibrationMethod.Entropy,
+            "percentile": CalibrationMethod.Percentile,
+        }[options["method"]]
+        self.stdout.write(f"Calibrating on {len(images)} images ({options['method']})")
+        os.makedirs(os.path.dirname(os.path.abspath(options["output"])), exist_ok=True)
+        try:
+            quantize_static(
+                source, options["output"], _CalibrationReader(images),
+                quant_format=QuantFormat.QDQ,
+                per_channel=not options["per_tensor"],
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                calibrate_method=method,
+            )
+        finally:
+            if source != fp32_path and os.path.exists(source):
+                os.unlink(source)
+
+        # Carry the class names over from the fp32 export
+        fp32_meta = {p.key: p.value for p in onnx.load(fp32_path, load_external_data=False).metadata_props}
+        quantized = onnx.load(options["output"])
+        if not any(p.key == "classes" for p in quantized.metadata_props):
+            entry = quantized.metadata_props.add()
+            entry.key, entry.value = "classes", fp32_meta.get("classes", "")
+            onnx.save(quantized, options["output"])
+
+        size_mb = os.path.getsize(options["output"]) / (1024 * 1024)
+        fp32_mb = os.path.getsize(fp32_path) / (1024 * 1024)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ INT8 model written to {options['output']} ({size_mb:.1f} MiB, fp32 was {fp32_mb:.1f} MiB). "
+            "Check it with `python manage.py compare_quantized` before enabling it."
+        ))
+
+
+class _CalibrationReader:
+    """Feeds preprocessed calibration images to the ONNX Runtime calibrator one at a time."""
+
+    def __init__(self, paths):
+        self.paths = iter(paths)
+        self.transform = inference.build_transform()
+
+    def get_next(self):
+        for path in self.paths:
+            try:
+                image = load_image(path, inference.INPUT_SIZE)
+            except Exception:
+                continue
+            return {"input": self.transform.to_array(image)[None].copy()}
+        return None
+
+    def rewind(self):
+        pass
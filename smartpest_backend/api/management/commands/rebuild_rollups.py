@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-pest daily and global hourly detection rollups from the Report table "
+        "(or, with --check, only compare them)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Compare the rollups with the Report table and exit with an error if they differ; change nothing.",
+        )
+        parser.add_argument("--show", type=int, default=10, help="Differences to print per table with --check.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options["check"]:
+            differences = rollups.check()
+            for table, rows in differences.items():
+                for key, expected, stored in rows[:options["show"]]:
+                    self.stdout.write(
+                        f"  {table} {', '.join(str(part) for part in key)}: expected {expected[0]} "
+                        f"(confidence sum {expected[1]:.4f}), stored {stored[0]} (confidence sum {stored[1]:.4f})"
+                    )
+            total = sum(len(rows) for rows in differences.values())
+            if total:
+                raise CommandError(
+                    f"❌ {len(differences['daily'])} daily and {len(differences['hourly'])} hourly rollup rows "
+                    f"differ from the Report table (run without --check to rebuild)"
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Rollups match the Report table ({time.perf_counter() - started:.2f}s)"
+            ))
+            return
+
+        counts = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Rebuilt {counts['daily']} pest/day and {counts['hourly']} hourly rollup rows "
+            f"(last {rollups.hourly_retention_days()} days) in {time.perf_counter() - started:.2f}s"
+        ))
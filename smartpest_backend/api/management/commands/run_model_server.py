@@ -0,0 +1,46 @@
+import os
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import inference
+from api.model_server import DEFAULT_SOCKET, ModelServer, ModelServerError, model_server_paths
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the classifier once and serve it to web workers over a Unix socket with shared-memory "
+        "tensors. Start the web workers with SMARTPEST_MODEL_SERVER=<socket> so they don't load the "
+        "weights themselves; run several servers on different sockets and list them all for a pool."
+    )
+
+    def add_arguments(self, parser):
+        paths = model_server_paths()
+        parser.add_argument(
+            "--socket", default=paths[0] if paths else DEFAULT_SOCKET,
+            help="Unix socket path to listen on (default: first SMARTPEST_MODEL_SERVER entry).",
+        )
+
+    def handle(self, *args, **options):
+        # This process is the one that holds the weights
+        os.environ.pop("SMARTPEST_MODEL_SERVER", None)
+        if not inference.ensure_model_loaded():
+            raise CommandError(
+                f"Model failed to load (state: {inference.model_status()['state']}). "
+                "The model server needs the real model, check SMARTPEST_USE_MOCK=0 and the weights."
+            )
+
+        server = ModelServer(options["socket"])
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: server.stop())
+        threading.current_thread().name = "model-server"
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Model server (pid {os.getpid()}) listening on {options['socket']}, "
+            f"{len(inference.class_names)} classes, cascade {'on' if inference.fast_model is not None else 'off'}"
+        ))
+        try:
+            server.serve_forever()
+        except ModelServerError as e:
+            raise CommandError(str(e))
+        self.stdout.write("Model server stopped")
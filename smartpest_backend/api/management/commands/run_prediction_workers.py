@@ -0,0 +1,42 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from api import inference
+from api.jobs import job_settings, requeue_expired, start_workers, stop_workers
+
+
+class Command(BaseCommand):
+    help = (
+        "Run prediction job workers: claim queued /api/jobs/ submissions from the database, "
+        "classify them and store the results. Safe to run several of these side by side."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=max(job_settings()["workers"], 2),
+            help="Worker threads in this process (they share one model and its micro-batcher).",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Loading model...")
+        inference.ensure_model_loaded()
+        status = inference.model_status()
+        self.stdout.write(f"Model state: {status['state']}")
+
+        requeued, failed = requeue_expired(job_settings()["max_attempts"])
+        if requeued or failed:
+            self.stdout.write(f"Recovered expired jobs: {requeued} requeued, {failed} failed")
+
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+
+        workers = start_workers(options["workers"])
+        self.stdout.write(self.style.SUCCESS(f"✅ {len(workers)} prediction worker(s) running, Ctrl+C to stop"))
+        while not stop.wait(1.0):
+            pass
+        self.stdout.write("Stopping workers (finishing in-flight jobs)...")
+        stop_workers()
+        self.stdout.write(f"Processed {sum(w.processed for w in workers)} job(s)")
@@ -0,0 +1,341 @@
+"""
+Low-overhead counters, gauges and histograms published in the Prometheus text format.
+
+Every worker process records into its own in-memory registry and periodically writes
+a JSON snapshot to SMARTPEST_METRICS_DIR (one file per pid, replaced atomically). The
+``/metrics`` endpoint merges the snapshots of all live processes: counters and
+histograms are summed, gauges are reported per process with a ``pid`` label. Snapshots
+of processes that have exited are dropped, which Prometheus treats as a counter reset.
+"""
+import atexit
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+# Seconds; tuned for stages from sub-millisecond (render) to multi-second (B5 on a small CPU)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    "smartpest_requests_total": (COUNTER, "HTTP requests handled, by view, method and status code.", None),
+    "smartpest_request_errors_total": (COUNTER, "HTTP requests answered with a 4xx/5xx status, by view and status code.", None),
+    "smartpest_request_seconds": (HISTOGRAM, "Time from the request reaching Django to the response being returned.", LATENCY_BUCKETS),
+    "smartpest_stage_seconds": (HISTOGRAM, "Time spent in each stage of handling a prediction.", LATENCY_BUCKETS),
+    "smartpest_render_seconds": (HISTOGRAM, "Time spent rendering DRF responses (e.g. JSON encoding), by view.", LATENCY_BUCKETS),
+    "smartpest_predictions_total": (COUNTER, "Images classified, by mode (real, cached, mock or error).", None),
+    "smartpest_model_load_seconds": (GAUGE, "Time taken to load and warm up the model in this process.", None),
+}
+
+
+def metrics_enabled():
+    return os.environ.get('SMARTPEST_METRICS', '1') == '1'
+
+
+def metrics_dir():
+    """Directory shared by all worker processes for their snapshots ('' keeps metrics per process)."""
+    return os.environ.get('SMARTPEST_METRICS_DIR', os.path.join(tempfile.gettempdir(), "smartpest-metrics"))
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+
+    def to_json(self):
+        return {"bounds": list(self.bounds), "counts": list(self.counts), "sum": self.sum}
+
+
+class Registry:
+    """Thread-safe metric values of one process, plus collectors sampled at snapshot time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._collectors = []
+        self._flusher = None
+
+    def inc(self, name, amount=1.0, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        self._ensure_flusher()
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[(name, _label_key(labels))] = float(value)
+        self._ensure_flusher()
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._values.get(key)
+            if histogram is None:
+                histogram = self._values[key] = _Histogram(METRICS[name][2] or LATENCY_BUCKETS)
+            histogram.observe(value)
+        self._ensure_flusher()
+
+    def register_collector(self, collector):
+        """``collector()`` returns ``(name, type, help, labels, value)`` samples; histogram values are dicts."""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def samples(self):
+        """Every sample of this process as JSON-friendly ``[name, type, help, labels, value]`` lists."""
+        with self._lock:
+            values = [
+                (name, labels, value.to_json() if isinstance(value, _Histogram) else value)
+                for (name, labels), value in self._values.items()
+            ]
+            collectors = list(self._collectors)
+        samples = [[name, METRICS[name][0], METRICS[name][1], dict(labels), value] for name, labels, value in values]
+        for collector in collectors:
+            try:
+                samples.extend([list(sample) for sample in collector()])
+            except Exception as e:
+                print(f"⚠️ Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+        return samples
+
+    def flush(self):
+        """Write this process's snapshot for the /metrics endpoint of any worker to pick up."""
+        directory = metrics_dir()
+        if not directory:
+            return None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{os.getpid()}.json")
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"pid": os.getpid(), "written_at": time.time(), "samples": self.samples()}, f)
+            os.replace(tmp_path, path)
+            return path
+        except OSError as e:
+            print(f"⚠️ Could not write metrics snapshot to {directory}: {e}")
+            return None
+
+    def _ensure_flusher(self):
+        if self._flusher is not None or not metrics_dir():
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flusher", daemon=True)
+            self._flusher.start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        interval = float(os.environ.get('SMARTPEST_METRICS_FLUSH_SECONDS', '5'))
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+
+registry = Registry()
+
+
+def inc(name, amount=1.0, **labels):
+    if metrics_enabled():
+        registry.inc(name, amount, **labels)
+
+
+def set_gauge(name, value, **labels):
+    if metrics_enabled():
+        registry.set(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    if metrics_enabled():
+        registry.observe(name, value, **labels)
+
+
+@contextmanager
+def stage(name):
+    """Time a block into ``smartpest_stage_seconds{stage=name}``."""
+    if not metrics_enabled():
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe("smartpest_stage_seconds", time.perf_counter() - started, stage=name)
+
+
+def register_collector(collector):
+    registry.register_collector(collector)
+
+
+def histogram_from_counts(counts, bounds):
+    """Histogram sample value from a ``{observed value: occurrences}`` dict (e.g. batch sizes)."""
+    buckets = [0] * (len(bounds) + 1)
+    total = 0.0
+    for value, occurrences in counts.items():
+        value = float(value)
+        total += value * occurrences
+        for i, bound in enumerate(bounds):
+            if value <= bound:
+                buckets[i] += occurrences
+                break
+        else:
+            buckets[-1] += occurrences
+    return {"bounds": list(bounds), "counts": buckets, "sum": total}
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _snapshots():
+    """This process's live samples plus the latest snapshot of every other live worker."""
+    own = {"pid": os.getpid(), "samples": registry.samples()}
+    directory = metrics_dir()
+    if not directory or not os.path.isdir(directory):
+        return [own]
+    snapshots = [own]
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            pid = int(name[:-5])
+        except ValueError:
+            continue
+        if pid == os.getpid():
+            continue
+        if not _process_alive(pid):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), chr(92) + "n")}"'
+        for k, v in sorted(labels.items())
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render():
+    """All metrics of all live worker processes in the Prometheus text exposition format."""
+    families = {}
+    for snapshot in _snapshots():
+        pid = snapshot.get("pid")
+        for name, kind, help_text, labels, value in snapshot.get("samples", []):
+            family = families.setdefault(name, {"type": kind, "help": help_text, "samples": {}})
+            if kind == GAUGE:
+                labels = {**labels, "pid": pid}
+            key = _label_key(labels)
+            existing = family["samples"].get(key)
+            if kind == HISTOGRAM:
+                if existing is None or existing["bounds"] != value["bounds"]:
+                    family["samples"][key] = {
+                        "bounds": value["bounds"], "counts": list(value["counts"]), "sum": value["sum"],
+                    }
+                else:
+                    existing["counts"] = [a + b for a, b in zip(existing["counts"], value["counts"])]
+                    existing["sum"] += value["sum"]
+            else:
+                family["samples"][key] = (existing or 0.0) + value
+
+    lines = []
+    for name in sorted(families):
+        family = families[name]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for key, value in sorted(family["samples"].items()):
+            labels = dict(key)
+            if family["type"] != HISTOGRAM:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(value["bounds"]) + [math.inf], value["counts"]):
+                cumulative += count
+                bucket_labels = {**labels, "le": _format_value(bound)}
+                lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Counts requests and errors per view and times them, including DRF response rendering."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metrics_enabled():
+            return self.get_response(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, "resolver_match", None)
+        view = (match.url_name or match.view_name) if match else "unmatched"
+        if view == "metrics":
+            return response
+        labels = {"view": view, "method": request.method, "status": response.status_code}
+        registry.inc("smartpest_requests_total", **labels)
+        if response.status_code >= 400:
+            registry.inc("smartpest_request_errors_total", view=view, status=response.status_code)
+        registry.observe("smartpest_request_seconds", time.perf_counter() - started, view=view)
+        return response
+
+    def process_template_response(self, request, response):
+        """DRF responses are rendered after the view returns; time that separately."""
+        if metrics_enabled() and hasattr(response, "add_post_render_callback"):
+            match = getattr(request, "resolver_match", None)
+            view = (match.url_name or match.view_name) if match else "unmatched"
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda r: registry.observe("smartpest_render_seconds", time.perf_counter() - started, view=view)
+            )
+        return response
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.7 on 2026-10-18 20:27
+
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_predictionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PestPesticide',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dosage', models.CharField(blank=True, default='', max_length=255)),
+                ('safety_precautions', models.TextField(blank=True, default='')),
+                ('position', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='pesticide',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='pesticide_name_lower'),
+        ),
+        migrations.AddField(
+            model_name='pestpesticide',
+            name='pest',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pesticide_links', to='api.pest'),
+        ),
+        migrations.AddField(
+            model_name='pestpesticide',
+            name='pesticide',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pest_links', to='api.pesticide'),
+        ),
+        migrations.AddField(
+            model_name='pest',
+            name='pesticides',
+            field=models.ManyToManyField(blank=True, related_name='pests', through='api.PestPesticide', to='api.pesticide'),
+        ),
+        migrations.AddIndex(
+            model_name='pest',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='pest_name_lower'),
+        ),
+        migrations.AddConstraint(
+            model_name='pestpesticide',
+            constraint=models.UniqueConstraint(fields=('pest', 'pesticide'), name='pestpesticide_unique'),
+        ),
+    ]
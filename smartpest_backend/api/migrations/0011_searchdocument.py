@@ -0,0 +1,103 @@
+# Generated by Django 5.1.7 on 2026-10-18 20:31
+
+from django.db import migrations, models
+
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE api_searchdocument_fts USING fts5(
+        title, body, content='api_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER api_searchdocument_fts_insert AFTER INSERT ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER api_searchdocument_fts_delete AFTER DELETE ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(api_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER api_searchdocument_fts_update AFTER UPDATE ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(api_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO api_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS api_searchdocument_fts_update",
+    "DROP TRIGGER IF EXISTS api_searchdocument_fts_delete",
+    "DROP TRIGGER IF EXISTS api_searchdocument_fts_insert",
+    "DROP TABLE IF EXISTS api_searchdocument_fts",
+]
+POSTGRES_FORWARD = [
+    """ALTER TABLE api_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(body, '')), 'B')
+    ) STORED""",
+    "CREATE INDEX api_searchdocument_vector ON api_searchdocument USING GIN (search_vector)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS api_searchdocument_vector",
+    "ALTER TABLE api_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def create_text_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD})
+
+
+def drop_text_index(apps, schema_editor):
+    _run(schema_editor, {'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE})
+
+
+BACKFILL_CHUNK = 2000
+
+
+def index_existing_rows(apps, schema_editor):
+    """Same documents as api.search.DOCUMENTS builds, for the rows that exist before the signals do."""
+    SearchDocument = apps.get_model('api', 'SearchDocument')
+    sources = [
+        ('pest', 'Pest', lambda o: (o.name, o.description or '')),
+        ('pesticide', 'Pesticide', lambda o: (o.name, o.chemical_name or '')),
+        ('report', 'Report', lambda o: (o.pest_name, '')),
+        ('feedback', 'Feedback', lambda o: (o.subject, o.message or '')),
+    ]
+    for kind, model_name, build in sources:
+        # Flushed every BACKFILL_CHUNK rows so memory stays flat however large the table is
+        documents = []
+        for obj in apps.get_model('api', model_name).objects.order_by('pk').iterator(chunk_size=BACKFILL_CHUNK):
+            title, body = build(obj)
+            documents.append(SearchDocument(kind=kind, object_id=obj.pk, title=title[:255], body=body))
+            if len(documents) >= BACKFILL_CHUNK:
+                SearchDocument.objects.bulk_create(documents, batch_size=500)
+                documents = []
+        if documents:
+            SearchDocument.objects.bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('pest', 'Pest'), ('pesticide', 'Pesticide'), ('report', 'Report'), ('feedback', 'Feedback')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='searchdocument_kind_object')],
+            },
+        ),
+        migrations.RunPython(create_text_index, drop_text_index),
+        migrations.RunPython(index_existing_rows, migrations.RunPython.noop),
+    ]
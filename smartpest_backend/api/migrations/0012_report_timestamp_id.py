@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_searchdocument'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['-timestamp', '-id'], name='report_timestamp_id'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-18 20:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_report_timestamp_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['pest_name', '-timestamp', '-id'], name='report_pest_timestamp_id'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['user_id', '-timestamp', '-id'], name='report_user_timestamp_id'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['confidence', 'timestamp'], name='report_confidence_timestamp'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.7 on 2026-10-18 20:36
+
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+
+def rollup_existing_reports(apps, schema_editor):
+    """What ``manage.py rebuild_rollups`` computes, for the reports saved before the rollups existed."""
+    Report = apps.get_model('api', 'Report')
+    PestDailyRollup = apps.get_model('api', 'PestDailyRollup')
+    HourlyRollup = apps.get_model('api', 'HourlyRollup')
+    PestDailyRollup.objects.bulk_create([
+        PestDailyRollup(pest_name=row['pest_name'], day=row['day'], count=row['count'], confidence_sum=row['confidence_sum'])
+        for row in Report.objects.annotate(day=TruncDate('timestamp')).values('pest_name', 'day')
+        .annotate(count=Count('id'), confidence_sum=Sum('confidence')).order_by()
+    ], batch_size=1000)
+    cutoff = timezone.now().replace(minute=0, second=0, microsecond=0) - datetime.timedelta(days=14)
+    HourlyRollup.objects.bulk_create([
+        HourlyRollup(hour=row['hour'], count=row['count'], confidence_sum=row['confidence_sum'])
+        for row in Report.objects.filter(timestamp__gte=cutoff).annotate(hour=TruncHour('timestamp')).values('hour')
+        .annotate(count=Count('id'), confidence_sum=Sum('confidence')).order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_report_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(unique=True)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('confidence_sum', models.FloatField(default=0.0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PestDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pest_name', models.CharField(max_length=255)),
+                ('day', models.DateField()),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('confidence_sum', models.FloatField(default=0.0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='pestdailyrollup_day')],
+                'constraints': [models.UniqueConstraint(fields=('pest_name', 'day'), name='pestdailyrollup_pest_day')],
+            },
+        ),
+        migrations.RunPython(rollup_existing_reports, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_detection_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-18 20:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_report_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 20:46
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_report_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(django.db.models.functions.text.Lower('pest_name'), name='report_pest_lower'),
+        ),
+    ]
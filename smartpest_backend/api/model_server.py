@@ -0,0 +1,396 @@
+"""
+Local model server: one process owns the classifier, web workers borrow it.
+
+``manage.py run_model_server`` loads the model once and listens on a Unix socket.
+Web workers started with ``SMARTPEST_MODEL_SERVER=<socket>[,<socket>...]`` don't load
+any weights; each of their threads keeps one connection plus one shared-memory
+segment. A forward request writes the preprocessed NCHW float32 batch into that
+segment and sends a small header over the socket; the server reads the batch in
+place (no copy, no pickling), coalesces it with other workers' requests through its
+own micro-batcher, writes the logits back after the input in the same segment and
+replies with another header.
+
+Wire format: every message is a 4-byte big-endian length followed by a JSON object.
+"""
+import json
+import os
+import socket
+import struct
+import threading
+import time
+import weakref
+
+DEFAULT_SOCKET = "/tmp/smartpest-model.sock"
+
+_HEADER = struct.Struct(">I")
+_FLOAT_BYTES = 4
+
+
+def model_server_paths():
+    """Sockets listed in SMARTPEST_MODEL_SERVER (comma separated); empty when serving locally."""
+    value = os.environ.get('SMARTPEST_MODEL_SERVER', '')
+    return [path.strip() for path in value.split(',') if path.strip()]
+
+
+class ModelServerError(RuntimeError):
+    """The model server is unreachable or reported an error."""
+
+
+def _send(sock, message):
+    payload = json.dumps(message).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    chunks, remaining = [], size
+    while remaining:
+        chunk = sock.recv(remaining)
+        if not chunk:
+            raise ConnectionError("model server connection closed")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv(sock):
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+def _attach(name):
+    """Open a segment created by a client without letting this process's resource tracker unlink it."""
+    from multiprocessing import resource_tracker, shared_memory
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        resource_tracker.unregister(segment._name, "shared_memory")
+    except Exception:
+        pass
+    return segment
+
+
+def _release(segment, unlink):
+    try:
+        segment.close()
+        if unlink:
+            segment.unlink()
+    except (FileNotFoundError, BufferError):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Server side
+# ---------------------------------------------------------------------------
+
+class ModelServer:
+    """Serves the model loaded in this process (see ``api.inference``) over a Unix socket."""
+
+    def __init__(self, path=DEFAULT_SOCKET):
+        self.path = path
+        self._sock = None
+        self._stopped = threading.Event()
+        self._engines = {}
+        self._engine_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._connections = 0
+        self._requests = 0
+        self._images = 0
+
+    def info(self):
+        from . import inference
+        return {
+            "classes": list(inference.class_names),
+            "input_size": inference.INPUT_SIZE,
+            "cascade": inference.fast_model is not None,
+            "fast_size": inference.cascade_settings()["fast_size"],
+            "model_version": inference.model_version(),
+            "pid": os.getpid(),
+        }
+
+    def stats(self):
+        from . import inference
+        with self._lock:
+            counters = {"connections": self._connections, "requests": self._requests, "images": self._images}
+        return {
+            **counters,
+            "pid": os.getpid(),
+            "engines": {stage: engine.stats() for stage, engine in list(self._engines.items())},
+            "cascade": inference.cascade_stats(),
+        }
+
+    def _engine(self, stage):
+        """Server-wide micro-batcher per stage, so images from different web workers share forward passes."""
+        from . import inference
+        from .batching import BatchingEngine, engine_settings
+        engine = self._engines.get(stage)
+        if engine is None:
+            with self._engine_lock:
+                engine = self._engines.get(stage)
+                if engine is None:
+                    import torch
+
+                    def run(rows):
+                        return list(inference._logits(torch.stack(rows), stage))
+                    engine = BatchingEngine(run, name=f"server-{stage}", **engine_settings())
+                    self._engines[stage] = engine
+        return engine
+
+    def _logits(self, batch, stage):
+        from . import inference
+        from .batching import batching_enabled
+        if not batching_enabled():
+            return inference._logits(batch, stage)
+        import torch
+        futures = [self._engine(stage).submit(row) for row in batch]
+        return torch.stack([future.result() for future in futures])
+
+    def _forward(self, request, segments):
+        import numpy as np
+        import torch
+        from . import inference
+
+        stage = request.get("stage", inference.STAGE_FULL)
+        if stage == inference.STAGE_FAST and inference.fast_model is None:
+            raise ValueError("this server has no cascade B0 stage")
+        name = request["shm"]
+        segment = segments.get(name)
+        if segment is None:
+            for old in segments.values():
+                _release(old, unlink=False)
+            segments.clear()
+            segment = segments[name] = _attach(name)
+        shape = (int(request["count"]), 3, int(request["size"]), int(request["size"]))
+        batch = np.ndarray(shape, dtype=np.float32, buffer=segment.buf)
+        logits = self._logits(torch.from_numpy(batch), stage)
+        logits = logits.detach().to(torch.float32).cpu().numpy()
+        out = np.ndarray(logits.shape, dtype=np.float32, buffer=segment.buf, offset=batch.nbytes)
+        out[...] = logits
+        del batch, out
+        with self._lock:
+            self._requests += 1
+            self._images += shape[0]
+        return {"ok": True, "shape": list(logits.shape)}
+
+    def _handle(self, conn):
+        segments = {}
+        with self._lock:
+            self._connections += 1
+        try:
+            while not self._stopped.is_set():
+                try:
+                    request = _recv(conn)
+                except (ConnectionError, OSError):
+                    return
+                op = request.get("op")
+                try:
+                    if op == "forward":
+                        reply = self._forward(request, segments)
+                    elif op == "hello":
+                        reply = {"ok": True, **self.info()}
+                    elif op == "stats":
+                        reply = {"ok": True, "stats": self.stats()}
+                    else:
+                        reply = {"ok": False, "error": f"unknown op {op!r}"}
+                except Exception as e:
+                    reply = {"ok": False, "error": str(e)}
+                try:
+                    _send(conn, reply)
+                except OSError:
+                    return
+        finally:
+            for segment in segments.values():
+                _release(segment, unlink=False)
+            conn.close()
+            with self._lock:
+                self._connections -= 1
+
+    def serve_forever(self):
+        """Accept connections until ``stop()``; one thread per connection (i.e. per web worker thread)."""
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.unlink(self.path)  # Left behind by a server that died
+            else:
+                raise ModelServerError(f"another model server is already listening on {self.path}")
+            finally:
+                probe.close()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        os.chmod(self.path, 0o660)
+        inode = os.stat(self.path).st_ino
+        self._sock.listen(128)
+        self._sock.settimeout(0.5)
+        try:
+            while not self._stopped.is_set():
+                try:
+                    conn, _ = self._sock.accept()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    if self._stopped.is_set():
+                        break
+                    raise
+                conn.settimeout(None)
+                threading.Thread(target=self._handle, args=(conn,), name="model-server-conn", daemon=True).start()
+        finally:
+            self._sock.close()
+            # Only remove the socket file if it is still ours
+            try:
+                if os.stat(self.path).st_ino == inode:
+                    os.unlink(self.path)
+            except OSError:
+                pass
+            for engine in list(self._engines.values()):
+                engine.shutdown(wait=False)
+
+    def stop(self):
+        self._stopped.set()
+
+
+# ---------------------------------------------------------------------------
+# Client side
+# ---------------------------------------------------------------------------
+
+class _Connection:
+    """One socket and one growable shared-memory segment, owned by a single thread."""
+
+    def __init__(self, path, timeout):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.segment = None
+        # [socket, segment]: released when the connection is closed or its thread's local storage goes away
+        self._resources = [self.sock, None]
+        self._finalizer = weakref.finalize(self, _Connection._cleanup, self._resources)
+
+    @staticmethod
+    def _cleanup(resources):
+        sock, segment = resources
+        sock.close()
+        if segment is not None:
+            _release(segment, unlink=True)
+
+    def request(self, message):
+        _send(self.sock, message)
+        reply = _recv(self.sock)
+        if not reply.get("ok"):
+            raise ModelServerError(reply.get("error", "model server error"))
+        return reply
+
+    def buffer(self, nbytes):
+        """Shared segment of at least ``nbytes``, replaced by a bigger one when a batch outgrows it."""
+        from multiprocessing import shared_memory
+        if self.segment is None or self.segment.size < nbytes:
+            if self.segment is not None:
+                _release(self.segment, unlink=True)
+            # Over-allocate so growing batch sizes don't reallocate on every step
+            self.segment = shared_memory.SharedMemory(create=True, size=max(nbytes * 2, 1 << 20))
+            self._resources[1] = self.segment
+        return self.segment
+
+    def close(self):
+        self._finalizer()
+
+
+class ModelServerClient:
+    """Forward passes on a remote model server, one connection per calling thread.
+
+    With several sockets, threads are spread over them round robin and fail over to the
+    next server if theirs goes away.
+    """
+
+    def __init__(self, paths, timeout=None):
+        if isinstance(paths, str):
+            paths = [paths]
+        self.paths = list(paths)
+        self.timeout = timeout if timeout is not None else float(
+            os.environ.get('SMARTPEST_MODEL_SERVER_TIMEOUT', '60')
+        )
+        self.info = None
+        self._local = threading.local()
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        with self._lock:
+            start = self._next
+            self._next += 1
+        errors = []
+        for offset in range(len(self.paths)):
+            path = self.paths[(start + offset) % len(self.paths)]
+            try:
+                return _Connection(path, self.timeout)
+            except OSError as e:
+                errors.append(f"{path}: {e}")
+        raise ModelServerError("no model server reachable (" + "; ".join(errors) + ")")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _call(self, build):
+        """Run ``build(conn)`` on this thread's connection, reconnecting once if the server restarted."""
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                return build(conn)
+            except (ConnectionError, OSError) as e:
+                conn.close()
+                self._local.conn = None
+                if attempt == 2:
+                    raise ModelServerError(f"model server connection failed: {e}")
+
+    def hello(self, wait_seconds=0.0):
+        """Server metadata (class names, cascade, model version), retrying while the server starts."""
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            try:
+                self.info = self._call(lambda conn: conn.request({"op": "hello"}))
+                return self.info
+            except ModelServerError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+
+    def stats(self):
+        return self._call(lambda conn: conn.request({"op": "stats"}))["stats"]
+
+    def forward(self, batch, stage):
+        """Logits for an NCHW float32 batch tensor."""
+        import numpy as np
+        import torch
+
+        if self.info is None:
+            self.hello()
+        batch = batch.detach().to("cpu", torch.float32).contiguous()
+        count, _, size, _ = batch.shape
+        num_classes = len(self.info["classes"])
+
+        def run(conn):
+            # Input batch first, logits written back right after it
+            segment = conn.buffer((batch.numel() + count * num_classes) * _FLOAT_BYTES)
+            view = np.ndarray(tuple(batch.shape), dtype=np.float32, buffer=segment.buf)
+            view[...] = batch.numpy()
+            reply = conn.request({
+                "op": "forward", "shm": segment.name, "count": count, "size": size, "stage": stage,
+            })
+            shape = tuple(reply["shape"])
+            logits = np.ndarray(shape, dtype=np.float32, buffer=segment.buf, offset=view.nbytes).copy()
+            del view
+            return torch.from_numpy(logits)
+        return self._call(run)
+
+
+class RemoteStage:
+    """Callable standing in for a torch module: ``stage(batch)`` returns logits computed by the server."""
+
+    def __init__(self, client, stage):
+        self.client = client
+        self.stage = stage
+
+    def __call__(self, batch):
+        return self.client.forward(batch, self.stage)
@@ -1,4 +1,8 @@
+import uuid
+
 from django.db import models
+from django.db.models.functions import Lower
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, BaseUserManager # Import BaseUserManager
 
 # Create your managers here.
@@ -45,8 +49,23 @@ class Report(models.Model):
     pest_name = models.CharField(max_length=255)
     confidence = models.FloatField()
     description = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # When the detection was made; bulk uploads from offline devices set their own capture time
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     user_id = models.CharField(max_length=255, default='anonymous')
+    # Chosen by the client so a retried upload doesn't save the report twice
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Newest-first cursor pagination of /api/reports/, unfiltered or by pest or user
+            models.Index(fields=['-timestamp', '-id'], name='report_timestamp_id'),
+            models.Index(fields=['pest_name', '-timestamp', '-id'], name='report_pest_timestamp_id'),
+            # Case-insensitive pest name prefixes
+            models.Index(Lower('pest_name'), name='report_pest_lower'),
+            models.Index(fields=['user_id', '-timestamp', '-id'], name='report_user_timestamp_id'),
+            # Confidence bands
+            models.Index(fields=['confidence', 'timestamp'], name='report_confidence_timestamp'),
+        ]
 
     def __str__(self):
         return f"{self.pest_name} - {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
@@ -71,12 +90,150 @@ class Pesticide(models.Model):
     application_methods = models.TextField(blank=True, null=True)
     safety_precautions = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(Lower('name'), name='pesticide_name_lower'),
+        ]
+
     def __str__(self):
         return self.name
 
 class Pest(models.Model):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField(blank=True, null=True)
+    pesticides = models.ManyToManyField(Pesticide, through='PestPesticide', related_name='pests', blank=True)
+
+    class Meta:
+        indexes = [
+            # Case-insensitive lookups by /pest-info/ and the reference data importer
+            models.Index(Lower('name'), name='pest_name_lower'),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class PestPesticide(models.Model):
+    """A pesticide recommended against a pest, with its dosage and precautions for that pest."""
+    pest = models.ForeignKey(Pest, on_delete=models.CASCADE, related_name='pesticide_links')
+    pesticide = models.ForeignKey(Pesticide, on_delete=models.CASCADE, related_name='pest_links')
+    dosage = models.CharField(max_length=255, blank=True, default='')
+    safety_precautions = models.TextField(blank=True, default='')
+    position = models.PositiveIntegerField(default=0) # Order in which pesticides are recommended
+
+    class Meta:
+        ordering = ['position', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['pest', 'pesticide'], name='pestpesticide_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.pest} - {self.pesticide}"
+
+
+class DataVersion(models.Model):
+    """Counter bumped on every change to a set of data, for ETag/Last-Modified headers (see api/data_version.py)."""
+    key = models.CharField(max_length=64, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+
+class SearchDocument(models.Model):
+    """Searchable text of one pest, pesticide, report or feedback row (see api/search.py).
+
+    The full-text index itself lives outside the ORM: an FTS5 table kept in sync by
+    triggers on SQLite, a generated tsvector column with a GIN index on PostgreSQL.
+    """
+    KIND_PEST = 'pest'
+    KIND_PESTICIDE = 'pesticide'
+    KIND_REPORT = 'report'
+    KIND_FEEDBACK = 'feedback'
+    KIND_CHOICES = [
+        (KIND_PEST, 'Pest'),
+        (KIND_PESTICIDE, 'Pesticide'),
+        (KIND_REPORT, 'Report'),
+        (KIND_FEEDBACK, 'Feedback'),
+    ]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='searchdocument_kind_object'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.title}"
+
+
+class PestDailyRollup(models.Model):
+    """Detections of one pest on one day (see api/rollups.py)."""
+    pest_name = models.CharField(max_length=255)
+    day = models.DateField()
+    count = models.PositiveBigIntegerField(default=0)
+    confidence_sum = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['pest_name', 'day'], name='pestdailyrollup_pest_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='pestdailyrollup_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.pest_name} {self.day}: {self.count}"
+
+
+class HourlyRollup(models.Model):
+    """Detections of all pests in one hour, kept for recent hours only (see api/rollups.py)."""
+    hour = models.DateTimeField(unique=True)
+    count = models.PositiveBigIntegerField(default=0)
+    confidence_sum = models.FloatField(default=0.0)
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00}: {self.count}"
+
+
+class PredictionJob(models.Model):
+    """An image queued for asynchronous classification (see api/jobs.py)."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    image = models.BinaryField() # Cleared once the job finishes
+    filename = models.CharField(max_length=255, blank=True, default='')
+    user_id = models.CharField(max_length=255, default='anonymous')
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    worker_id = models.CharField(max_length=255, blank=True, default='')
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='predictionjob_status_created'),
+            models.Index(fields=['status', 'lease_expires_at'], name='predictionjob_status_lease'),
+        ]
+
+    def __str__(self):
+        return f"{self.id} ({self.status})"
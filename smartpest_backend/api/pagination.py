@@ -0,0 +1,136 @@
+"""
+Keyset (cursor) pagination for the report list.
+
+The opaque ``cursor`` encodes the (``timestamp``, ``id``) of the last row shown, and the
+next page is the rows strictly after it in ``-timestamp, -id`` order. The
+``report_timestamp_id`` index serves that as a range scan, so a deep page costs the same
+as the first one, and rows inserted meanwhile never shift or repeat results the way
+OFFSET pagination does.
+
+Each page also reports how many rows match the request's filters, counting at most
+SMARTPEST_REPORTS_COUNT_CAP (default 1000) of them: ``count_is_exact`` is false when
+there are more, so the count never costs more than a bounded index scan.
+
+DRF's ``CursorPagination`` is not used because it keys on the first ordering field only
+(ties are skipped with an OFFSET) and adds ``OR timestamp IS NULL``, which turns the
+range scan into a scan of the whole index.
+"""
+import base64
+import binascii
+import os
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ReportCursorPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.page_size = int(os.environ.get('SMARTPEST_REPORTS_PAGE_SIZE', '50'))
+        self.max_page_size = int(os.environ.get('SMARTPEST_REPORTS_MAX_PAGE_SIZE', '500'))
+        self.count_cap = int(os.environ.get('SMARTPEST_REPORTS_COUNT_CAP', '1000'))
+
+    def get_count(self, queryset):
+        """``(count, is_exact)`` with the count cut off at ``count_cap``."""
+        # COUNT(*) over a LIMITed subquery stops after count_cap + 1 rows
+        count = queryset.order_by()[:self.count_cap + 1].count()
+        return min(count, self.count_cap), count <= self.count_cap
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def encode_cursor(self, report, before=False):
+        raw = f"{'p' if before else 'n'}|{report.timestamp.isoformat()}|{report.pk}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        """``(before, timestamp, id)`` from the query string, or None on the first page."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            direction, timestamp, pk = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8').split('|')
+            if direction not in ('n', 'p'):
+                raise ValueError(direction)
+            return direction == 'p', datetime.fromisoformat(timestamp), int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        self.count, self.count_is_exact = self.get_count(queryset)
+
+        if cursor is None:
+            rows = list(queryset.order_by('-timestamp', '-id')[:page_size + 1])
+            self.has_previous = False
+        elif cursor[0]:
+            # Rows before the cursor: walk the index the other way, then flip the page back
+            _, timestamp, pk = cursor
+            rows = list(
+                queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk), timestamp__gte=timestamp)
+                .order_by('timestamp', 'id')[:page_size + 1]
+            )
+            self.has_previous = len(rows) > page_size
+            self.page = list(reversed(rows[:page_size]))
+            self.has_next = True
+            return self.page
+        else:
+            _, timestamp, pk = cursor
+            # The plain range on timestamp is what lets the index bound the scan
+            rows = list(
+                queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk), timestamp__lte=timestamp)
+                .order_by('-timestamp', '-id')[:page_size + 1]
+            )
+            self.has_previous = True
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if not self.page:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[0], before=True))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'count_is_exact': self.count_is_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['count', 'count_is_exact', 'results'],
+            'properties': {
+                'count': {'type': 'integer'},
+                'count_is_exact': {'type': 'boolean'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,213 @@
+"""
+Pest descriptions and recommended pesticides.
+
+The ``Pest``, ``Pesticide`` and ``PestPesticide`` tables are the source of truth, filled
+from ``pest_description.json`` and ``pesticides_info.json`` by
+``manage.py import_reference_data`` and edited through the admin pages. Lookups use the
+case-insensitive ``Lower(name)`` index and prefetch the pesticides, so any number of
+pests costs two queries.
+
+Names are matched regardless of case, underscores, hyphens and spaces ("army_worm",
+"Army Worm" and "armyworm" are the same pest). Spellings that differ from the stored
+name are resolved through an in-memory index of the reference files and
+``models/classes.txt``, re-checked at most every SMARTPEST_PEST_DATA_CHECK_SECONDS and
+rebuilt when their mtime or size changes.
+"""
+import json
+import os
+import re
+import threading
+import time
+from types import MappingProxyType
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DESCRIPTIONS_FILE = os.path.join(BASE_DIR, 'pest_description.json')
+PESTICIDES_FILE = os.path.join(BASE_DIR, 'pesticides_info.json')
+CLASSES_FILE = os.path.join(os.path.dirname(BASE_DIR), 'models', 'classes.txt')
+
+DEFAULT_DESCRIPTION = 'No detailed description available.'
+NO_PESTICIDES = ({'name': 'No pesticide data available', 'dosage': '', 'safety_precautions': ''},)
+
+# Spellings that normalization alone can't reconcile -> the name used in classes.txt
+ALIASES = {
+    'oides_decellantata': 'oides_decempunctata',
+}
+
+_SEPARATORS = re.compile(r'[\s_\-]+')
+
+
+def normalize_name(name):
+    """Lookup key that ignores case, underscores, hyphens and repeated spaces."""
+    return _SEPARATORS.sub(' ', str(name).lower()).strip()
+
+
+_ALIAS_KEYS = {normalize_name(alias): normalize_name(name) for alias, name in ALIASES.items()}
+
+
+def canonical_key(name):
+    """``normalize_name`` with known misspellings mapped to their classes.txt name."""
+    key = normalize_name(name)
+    return _ALIAS_KEYS.get(key, key)
+
+
+def _compact(key):
+    return key.replace(' ', '')
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def _read_classes():
+    try:
+        with open(CLASSES_FILE, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def load_reference_files():
+    """Merged ``{'name', 'description', 'pesticides'}`` records of the reference JSON files.
+
+    Spellings of the same pest are merged under its classes.txt name; ``description`` is
+    None when only the pesticide file knows the pest.
+    """
+    records = {}
+
+    def record(pest_name):
+        key = canonical_key(pest_name)
+        if key not in records:
+            records[key] = {'name': str(pest_name).strip(), 'description': None, 'pesticides': []}
+        return records[key]
+
+    for item in _read_json(DESCRIPTIONS_FILE):
+        record(item.get('pest_name', ''))['description'] = item.get('description', '')
+    for item in _read_json(PESTICIDES_FILE):
+        record(item.get('pest_name', ''))['pesticides'] = item.get('pesticides', [])
+    records.pop('', None)
+
+    # Class names are the canonical spelling; point out classes the reference data doesn't cover
+    missing = []
+    for class_name in _read_classes():
+        key = canonical_key(class_name)
+        if key in records:
+            records[key]['name'] = class_name
+        else:
+            missing.append(class_name)
+    if missing:
+        print(f"⚠️ No description or pesticides for {len(missing)} class(es): {', '.join(missing[:10])}")
+    return list(records.values())
+
+
+class NameIndex:
+    """Read-only map from normalized (and compact) spellings to the canonical pest name."""
+
+    def __init__(self, names, version):
+        self.version = version
+        keys = {}
+        for name in names:
+            keys.setdefault(_compact(canonical_key(name)), name)
+        for name in names:
+            keys[canonical_key(name)] = name  # An exact normalized name wins over a compact one
+        self._keys = MappingProxyType(keys)
+
+    def canonical(self, pest_name):
+        """The reference spelling of a pest name, or None if the reference files don't know it."""
+        key = canonical_key(pest_name)
+        return self._keys.get(key) or self._keys.get(_compact(key))
+
+    def __len__(self):
+        return len(set(self._keys.values()))
+
+
+def _files_version():
+    version = []
+    for path in (DESCRIPTIONS_FILE, PESTICIDES_FILE, CLASSES_FILE):
+        try:
+            stat = os.stat(path)
+            version.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            version.append(None)
+    return tuple(version)
+
+
+_lock = threading.Lock()
+_index = None
+_checked_at = 0.0
+
+
+def name_index():
+    """The current name index, rebuilt first if a reference file changed since the last check."""
+    global _index, _checked_at
+    interval = float(os.environ.get('SMARTPEST_PEST_DATA_CHECK_SECONDS', '1'))
+    index = _index
+    if index is not None and time.monotonic() - _checked_at < interval:
+        return index
+    with _lock:
+        if _index is None or time.monotonic() - _checked_at >= interval:
+            version = _files_version()
+            if _index is None or version != _index.version:
+                try:
+                    names = [record['name'] for record in load_reference_files()] + _read_classes()
+                    _index = NameIndex(names, version)
+                except (OSError, ValueError) as e:
+                    # e.g. a file caught half-written: keep the previous index and retry later
+                    print(f"⚠️ Could not index pest names: {e}")
+                    if _index is None:
+                        _index = NameIndex([], None)
+            _checked_at = time.monotonic()
+        return _index
+
+
+def _details(pest):
+    pesticides = [
+        {'name': link.pesticide.name, 'dosage': link.dosage, 'safety_precautions': link.safety_precautions}
+        for link in pest.pesticide_links.all()
+    ]
+    return {
+        'description': pest.description if pest.description is not None else DEFAULT_DESCRIPTION,
+        'pesticides': pesticides or list(NO_PESTICIDES),
+    }
+
+
+def pest_details_many(pest_names):
+    """``{requested name: {'description', 'pesticides'}}`` in two queries; placeholders for unknown pests."""
+    from django.db.models import Prefetch
+    from django.db.models.functions import Lower
+    from .models import Pest, PestPesticide
+
+    index = name_index()
+    candidates = {}
+    for pest_name in pest_names:
+        # The name as requested first, then its reference spelling
+        spellings = [str(pest_name).strip().lower()]
+        canonical = index.canonical(pest_name)
+        if canonical and canonical.lower() not in spellings:
+            spellings.append(canonical.lower())
+        candidates[pest_name] = spellings
+
+    lowered = set().union(*candidates.values()) if candidates else set()
+    pests = (
+        Pest.objects.alias(name_lower=Lower('name')).filter(name_lower__in=lowered)
+        .prefetch_related(Prefetch(
+            'pesticide_links', queryset=PestPesticide.objects.select_related('pesticide').order_by('position', 'id'),
+        ))
+    ) if lowered else []
+    by_lower = {pest.name.lower(): pest for pest in pests}
+
+    result = {}
+    for pest_name, spellings in candidates.items():
+        pest = next((by_lower[s] for s in spellings if s in by_lower), None)
+        result[pest_name] = _details(pest) if pest is not None else {
+            'description': DEFAULT_DESCRIPTION, 'pesticides': list(NO_PESTICIDES),
+        }
+    return result
+
+
+def pest_details(pest_name):
+    """``{'description', 'pesticides'}`` for one pest name, with placeholders if unknown."""
+    return pest_details_many([pest_name])[pest_name]
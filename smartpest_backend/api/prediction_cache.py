@@ -0,0 +1,217 @@
+"""
+Content-addressed cache for prediction results.
+
+Results are keyed by a hash of the uploaded image bytes plus the model version,
+so re-uploads and client retries of the same photo skip the forward pass. The
+first tier is a bounded in-process LRU with a TTL; the optional second tier is a
+SQLite file shared by every worker process on the host. Concurrent requests for
+the same key are coalesced so only one of them runs the model.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Prune the on-disk tier every this many writes
+DISK_PRUNE_INTERVAL = 200
+
+
+def cache_key(data, model_version):
+    """Key for an image's raw bytes under a given model version."""
+    return f"{model_version}:{hashlib.sha256(data).hexdigest()}"
+
+
+class PredictionCache:
+    def __init__(self, max_entries=1024, ttl_seconds=3600.0, disk_path=None, disk_max_entries=100000):
+        self.max_entries = max(int(max_entries), 1)
+        self.ttl = float(ttl_seconds)
+        self.disk_path = disk_path or None
+        self.disk_max_entries = int(disk_max_entries)
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._disk_writes = 0
+        self._counts = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "disk_errors": 0,
+        }
+        if self.disk_path:
+            self._init_disk()
+
+    # In-process tier
+
+    def _get_memory(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._entries[key]
+            self._counts["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_memory(self, key, value, expires_at):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counts["evictions"] += 1
+
+    # Shared on-disk tier
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_disk(self):
+        directory = os.path.dirname(os.path.abspath(self.disk_path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _get_disk(self, key, now):
+        if not self.disk_path:
+            return None
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM predictions WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        except sqlite3.Error:
+            with self._lock:
+                self._counts["disk_errors"] += 1
+            return None
+        return json.loads(row[0]) if row else None
+
+    def _put_disk(self, key, value, expires_at):
+        if not self.disk_path:
+            return
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO predictions (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            with self._lock:
+                self._disk_writes += 1
+                prune = self._disk_writes % DISK_PRUNE_INTERVAL == 0
+            if prune:
+                self._prune_disk(conn)
+        except sqlite3.Error:
+            with self._lock:
+                self._counts["disk_errors"] += 1
+
+    def _prune_disk(self, conn):
+        conn.execute("DELETE FROM predictions WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM predictions WHERE key IN ("
+            " SELECT key FROM predictions ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_entries,),
+        )
+
+    # Public API
+
+    def get(self, key):
+        """The cached value for ``key``, or None (counted as a miss)."""
+        now = time.time()
+        with self._lock:
+            value = self._get_memory(key, now)
+            if value is not None:
+                self._counts["hits"] += 1
+                return value
+        value = self._get_disk(key, now)
+        with self._lock:
+            if value is None:
+                self._counts["misses"] += 1
+            else:
+                self._counts["disk_hits"] += 1
+                self._put_memory(key, value, now + self.ttl)
+        return value
+
+    def put(self, key, value):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._put_memory(key, value, expires_at)
+        self._put_disk(key, value, expires_at)
+
+    def get_or_compute(self, key, compute, cacheable=lambda value: True):
+        """Return the cached value for ``key`` or compute it once, however many callers ask at the same time."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                # Still a miss, but answered by another caller's computation
+                self._counts["coalesced"] += 1
+        if not owner:
+            return future.result()
+        try:
+            value = compute()
+            if cacheable(value):
+                self.put(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk_path:
+            self._connection().execute("DELETE FROM predictions")
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            entries = len(self._entries)
+            inflight = len(self._inflight)
+        lookups = counts["hits"] + counts["disk_hits"] + counts["misses"]
+        return {
+            **counts,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "disk_tier": self.disk_path,
+            "inflight": inflight,
+            "hit_rate": round((counts["hits"] + counts["disk_hits"]) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def cache_enabled():
+    return os.environ.get('SMARTPEST_CACHE', '1') == '1'
+
+
+def cache_from_env():
+    return PredictionCache(
+        max_entries=int(os.environ.get('SMARTPEST_CACHE_MAX_ENTRIES', '1024')),
+        ttl_seconds=float(os.environ.get('SMARTPEST_CACHE_TTL_SECONDS', '3600')),
+        disk_path=os.environ.get('SMARTPEST_CACHE_DB', ''),
+        disk_max_entries=int(os.environ.get('SMARTPEST_CACHE_DB_MAX_ENTRIES', '100000')),
+    )
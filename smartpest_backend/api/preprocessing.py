@@ -0,0 +1,76 @@
+"""
+Image decode and preprocessing for the classifier.
+
+JPEGs are decoded with the decoder's DCT scaling (``Image.draft``), so a 12 MP
+phone photo comes out of libjpeg at 1/2, 1/4 or 1/8 scale, just above the model
+input size, instead of being fully decoded and then mostly thrown away by the
+resize. Normalization is a single vectorized NumPy pass into a per-thread
+preallocated CHW float32 buffer.
+"""
+import io
+import threading
+
+import numpy as np
+from PIL import Image
+
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+# (x / 255 - mean) / std == x * SCALE - SHIFT, folded into one multiply and one subtract
+SCALE = (1.0 / (255.0 * STD)).reshape(3, 1, 1)
+SHIFT = (MEAN / STD).reshape(3, 1, 1)
+
+_buffers = threading.local()
+
+
+def open_image(data):
+    """Open image bytes (or a path / file object) lazily: only the header is read, so ``size`` is cheap."""
+    return Image.open(io.BytesIO(data) if isinstance(data, (bytes, bytearray, memoryview)) else data)
+
+
+def load_image(data, min_size=None):
+    """Decode an image to RGB, letting JPEG decode at reduced scale when ``min_size`` allows it.
+
+    ``data`` may be bytes, a path, a file object or an image returned by ``open_image``.
+    """
+    image = data if isinstance(data, Image.Image) else open_image(data)
+    if min_size and image.format == "JPEG":
+        # Picks the smallest DCT scale that keeps both sides >= min_size
+        image.draft("RGB", (min_size, min_size))
+    return image.convert("RGB")
+
+
+def _thread_buffer(size):
+    buffers = getattr(_buffers, "by_size", None)
+    if buffers is None:
+        buffers = _buffers.by_size = {}
+    buffer = buffers.get(size)
+    if buffer is None:
+        buffer = buffers[size] = np.empty((3, size, size), dtype=np.float32)
+    return buffer
+
+
+class Preprocessor:
+    """Resize + normalize an RGB image into a CHW float32 tensor for a square model input.
+
+    Without ``out`` the result lives in a buffer owned by the calling thread that is
+    overwritten by that thread's next call, so consume (or copy) it before then.
+    """
+
+    def __init__(self, size):
+        self.size = int(size)
+
+    def to_array(self, image, out=None):
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if image.size != (self.size, self.size):
+            image = image.resize((self.size, self.size), Image.Resampling.BILINEAR)
+        if out is None:
+            out = _thread_buffer(self.size)
+        pixels = np.asarray(image, dtype=np.uint8).transpose(2, 0, 1)
+        np.multiply(pixels, SCALE, out=out)
+        np.subtract(out, SHIFT, out=out)
+        return out
+
+    def __call__(self, image, out=None):
+        import torch
+        return torch.from_numpy(self.to_array(image, out))
@@ -0,0 +1,290 @@
+"""
+Detection rollups: reports counted per pest per day, and per hour across all pests.
+
+``record`` adds new reports to ``PestDailyRollup`` and ``HourlyRollup`` with one
+``INSERT ... ON CONFLICT DO UPDATE SET count = count + excluded.count`` per table, in
+the caller's transaction, so concurrent writers never lose an increment and a rolled
+back report never shows up. Analytics then read at most one row per pest and day (or
+per hour), however many reports there are.
+
+Signals keep the rollups in step with every ``Report`` saved or deleted through the ORM,
+whatever wrote it (API, admin, shell, fixtures): ``post_save`` records new reports, moves
+an edited report from its old pest/day/hour to the new one, and ``post_delete`` takes
+deleted reports back out (``forget``), dropping rows that reach zero. ``bulk_create``,
+``QuerySet.update`` and raw SQL bypass the signals, so bulk writers call ``record``
+themselves; ``manage.py rebuild_rollups`` recomputes both tables from ``Report``, and
+with ``--check`` reports drift without changing anything.
+
+Days and hours are in TIME_ZONE. Hourly rows are only kept for the last
+SMARTPEST_HOURLY_ROLLUP_DAYS days (default 14); ``record`` prunes older ones as it goes.
+"""
+import datetime
+import math
+import os
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+from .models import HourlyRollup, PestDailyRollup, Report
+
+BUCKETS = ('hour', 'day', 'week')
+
+_UPSERT_BATCH = 500
+
+
+def hourly_retention_days():
+    return int(os.environ.get('SMARTPEST_HOURLY_ROLLUP_DAYS', '14'))
+
+
+def _day(moment):
+    return timezone.localtime(moment).date()
+
+
+def _hour(moment):
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def _bucket(reports):
+    daily, hourly = {}, {}
+    for report in reports:
+        for buckets, key in ((daily, (report.pest_name, _day(report.timestamp))), (hourly, (_hour(report.timestamp),))):
+            count, total = buckets.get(key, (0, 0.0))
+            buckets[key] = (count + 1, total + report.confidence)
+    return daily, hourly
+
+
+def _upsert(model, key_fields, rows):
+    """Add ``{key tuple: (count, confidence_sum)}`` to ``model``'s rows, creating missing ones."""
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in key_fields]
+    columns = ', '.join(quote(name) for name in [*key_fields, 'count', 'confidence_sum'])
+    increments = ', '.join(
+        f'{quote(name)} = {table}.{quote(name)} + excluded.{quote(name)}' for name in ('count', 'confidence_sum')
+    )
+    items = list(rows.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), _UPSERT_BATCH):
+            batch = items[start:start + _UPSERT_BATCH]
+            values = ', '.join(['(' + ', '.join(['%s'] * (len(fields) + 2)) + ')'] * len(batch))
+            params = []
+            for key, (count, total) in batch:
+                params.extend(field.get_db_prep_save(value, connection) for field, value in zip(fields, key))
+                params.extend([count, total])
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES {values} "
+                f"ON CONFLICT ({', '.join(quote(name) for name in key_fields)}) DO UPDATE SET {increments}",
+                params,
+            )
+
+
+def _hourly_cutoff():
+    return _hour(timezone.now()) - datetime.timedelta(days=hourly_retention_days())
+
+
+def record(reports):
+    """Count newly saved ``reports`` in the rollups (call inside the transaction that saved them).
+
+    Only needed for writes that send no signals, such as ``bulk_create``.
+    """
+    daily, hourly = _bucket(reports)
+    cutoff = _hourly_cutoff()
+    hourly = {key: value for key, value in hourly.items() if key[0] >= cutoff}
+    with transaction.atomic():
+        if daily:
+            _upsert(PestDailyRollup, ['pest_name', 'day'], daily)
+        if hourly:
+            _upsert(HourlyRollup, ['hour'], hourly)
+        # A range delete on the unique hour index; usually matches nothing
+        HourlyRollup.objects.filter(hour__lt=cutoff).delete()
+
+
+def _decrement(model, key_fields, rows):
+    for key, (count, total) in rows.items():
+        matching = model.objects.filter(**dict(zip(key_fields, key)))
+        matching.update(count=F('count') - count, confidence_sum=F('confidence_sum') - total)
+        matching.filter(count__lte=0).delete()
+
+
+def forget(reports):
+    """Take deleted ``reports`` back out of the rollups, dropping rows that reach zero."""
+    daily, hourly = _bucket(reports)
+    with transaction.atomic():
+        _decrement(PestDailyRollup, ['pest_name', 'day'], daily)
+        _decrement(HourlyRollup, ['hour'], hourly)
+
+
+_COUNTED_FIELDS = ('pest_name', 'timestamp', 'confidence')
+
+
+def _before_save(sender, instance, **kwargs):
+    # New reports have no pk yet; an existing one is looked up to see what the rollups hold for it
+    instance._rollup_previous = None
+    if instance.pk is not None:
+        instance._rollup_previous = Report.objects.filter(pk=instance.pk).values(*_COUNTED_FIELDS).first()
+
+
+def _on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    instance._rollup_previous = None
+    if created or previous is None:
+        record([instance])
+    elif any(previous[name] != getattr(instance, name) for name in _COUNTED_FIELDS):
+        with transaction.atomic():
+            forget([Report(**previous)])
+            record([instance])
+
+
+def _on_delete(sender, instance, **kwargs):
+    forget([instance])
+
+
+def connect_signals():
+    pre_save.connect(_before_save, sender=Report, dispatch_uid='rollups-before-save-report')
+    post_save.connect(_on_save, sender=Report, dispatch_uid='rollups-save-report')
+    post_delete.connect(_on_delete, sender=Report, dispatch_uid='rollups-delete-report')
+
+
+def _expected():
+    """Both rollups as computed from ``Report`` by the database."""
+    cutoff = _hourly_cutoff()
+    daily = {
+        (row['pest_name'], row['day']): (row['count'], row['confidence_sum'])
+        for row in Report.objects.annotate(day=TruncDate('timestamp')).values('pest_name', 'day')
+        .annotate(count=Count('id'), confidence_sum=Sum('confidence')).order_by()
+    }
+    hourly = {
+        (row['hour'],): (row['count'], row['confidence_sum'])
+        for row in Report.objects.filter(timestamp__gte=cutoff).annotate(hour=TruncHour('timestamp')).values('hour')
+        .annotate(count=Count('id'), confidence_sum=Sum('confidence')).order_by()
+    }
+    return daily, hourly
+
+
+def _stored():
+    daily = {
+        (row.pest_name, row.day): (row.count, row.confidence_sum) for row in PestDailyRollup.objects.all()
+    }
+    hourly = {(row.hour,): (row.count, row.confidence_sum) for row in HourlyRollup.objects.all()}
+    return daily, hourly
+
+
+def _differences(expected, stored):
+    differences = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        want, have = expected.get(key, (0, 0.0)), stored.get(key, (0, 0.0))
+        if want[0] != have[0] or not math.isclose(want[1], have[1], rel_tol=1e-9, abs_tol=1e-6):
+            differences.append((key, want, have))
+    return differences
+
+
+def check():
+    """``{'daily': [...], 'hourly': [...]}`` of ``(key, expected, stored)`` for every row that drifted."""
+    expected, stored = _expected(), _stored()
+    return {
+        'daily': _differences(expected[0], stored[0]),
+        'hourly': _differences(expected[1], stored[1]),
+    }
+
+
+def rebuild():
+    """Replace both rollups with fresh aggregates of ``Report``; returns the row counts."""
+    with transaction.atomic():
+        daily, hourly = _expected()
+        PestDailyRollup.objects.all().delete()
+        HourlyRollup.objects.all().delete()
+        PestDailyRollup.objects.bulk_create(
+            [PestDailyRollup(pest_name=name, day=day, count=count, confidence_sum=total)
+             for (name, day), (count, total) in daily.items()],
+            batch_size=1000,
+        )
+        HourlyRollup.objects.bulk_create(
+            [HourlyRollup(hour=hour, count=count, confidence_sum=total) for (hour,), (count, total) in hourly.items()],
+            batch_size=1000,
+        )
+    return {'daily': len(daily), 'hourly': len(hourly)}
+
+
+def _point(period, count, total):
+    return {'period': period.isoformat(), 'count': count, 'avg_confidence': round(total / count, 4) if count else None}
+
+
+def detection_series(bucket='day', days=30, pest_name=None):
+    """Zero-filled detections per ``bucket`` over the last ``days`` days, optionally for one pest.
+
+    Hourly series cover all pests and at most the hourly retention window.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    today = timezone.localdate()
+    first_day = today - datetime.timedelta(days=days - 1)
+
+    if bucket == 'hour':
+        if pest_name:
+            raise ValueError("hourly series are not broken down by pest")
+        now_hour = _hour(timezone.now())
+        start = max(
+            timezone.make_aware(datetime.datetime.combine(first_day, datetime.time.min)),
+            now_hour - datetime.timedelta(days=hourly_retention_days()),
+        )
+        rows = {
+            timezone.localtime(row.hour): (row.count, row.confidence_sum)
+            for row in HourlyRollup.objects.filter(hour__gte=start)
+        }
+        series, hour = [], start
+        while hour <= now_hour:
+            series.append(_point(hour, *rows.get(hour, (0, 0.0))))
+            hour += datetime.timedelta(hours=1)
+        return series
+
+    daily = PestDailyRollup.objects.filter(day__gte=first_day)
+    if pest_name:
+        daily = daily.filter(pest_name=pest_name)
+    by_day = {
+        row['day']: (row['count'], row['confidence_sum'])
+        for row in daily.values('day').annotate(count=Sum('count'), confidence_sum=Sum('confidence_sum')).order_by()
+    }
+    if bucket == 'day':
+        return [
+            _point(day, *by_day.get(day, (0, 0.0)))
+            for day in (first_day + datetime.timedelta(days=n) for n in range(days))
+        ]
+
+    # Weeks start on Monday; the first one may begin before first_day
+    weeks = {}
+    for day, (count, total) in by_day.items():
+        monday = day - datetime.timedelta(days=day.weekday())
+        week_count, week_total = weeks.get(monday, (0, 0.0))
+        weeks[monday] = (week_count + count, week_total + total)
+    monday = first_day - datetime.timedelta(days=first_day.weekday())
+    series = []
+    while monday <= today:
+        series.append(_point(monday, *weeks.get(monday, (0, 0.0))))
+        monday += datetime.timedelta(weeks=1)
+    return series
+
+
+def pest_totals(limit=20, since=None):
+    """Pests by detections (all time, or from the ``since`` date): ``[{'pest_name', 'count', 'avg_confidence'}]``."""
+    rows = PestDailyRollup.objects.all()
+    if since is not None:
+        rows = rows.filter(day__gte=since)
+    return [
+        {
+            'pest_name': row['pest_name'],
+            'count': row['count'],
+            'avg_confidence': round(row['confidence_sum'] / row['count'], 4) if row['count'] else None,
+        }
+        for row in rows.values('pest_name')
+        .annotate(count=Sum('count'), confidence_sum=Sum('confidence_sum')).order_by('-count', 'pest_name')[:limit]
+    ]
+
+
+def totals():
+    """``(reports, average confidence)`` over all time."""
+    row = PestDailyRollup.objects.aggregate(count=Sum('count'), confidence_sum=Sum('confidence_sum'))
+    count = row['count'] or 0
+    return count, (round(row['confidence_sum'] / count, 4) if count else None)
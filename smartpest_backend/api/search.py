@@ -0,0 +1,194 @@
+"""
+Full-text search over pests, pesticides, reports and feedback.
+
+Each searchable row has a ``SearchDocument`` (title + body) that is upserted or deleted
+by ``post_save``/``post_delete`` signals, so the index is maintained incrementally on
+every write; bulk writes that bypass signals call ``index_objects``. The text index
+depends on the database (see migration 0011):
+
+* SQLite: an external-content FTS5 table kept in sync by triggers, ranked with bm25()
+  and highlighted with highlight()/snippet().
+* PostgreSQL: a generated, weighted tsvector column with a GIN index, ranked with
+  ts_rank_cd() and highlighted with ts_headline().
+* Anything else: a case-insensitive substring match without ranking.
+
+Equally ranked matches (e.g. reports of the same pest) come newest first. Highlights
+mark matches with ``<mark>``; everything else in them is HTML-escaped.
+"""
+import html
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+
+from .models import Feedback, Pest, Pesticide, Report, SearchDocument
+
+# kind -> (model, fn(instance) -> (title, body))
+DOCUMENTS = {
+    SearchDocument.KIND_PEST: (Pest, lambda o: (o.name, o.description or '')),
+    SearchDocument.KIND_PESTICIDE: (Pesticide, lambda o: (o.name, o.chemical_name or '')),
+    SearchDocument.KIND_REPORT: (Report, lambda o: (o.pest_name, '')),
+    SearchDocument.KIND_FEEDBACK: (Feedback, lambda o: (o.subject, o.message or '')),
+}
+KINDS = tuple(DOCUMENTS)
+
+MAX_TERMS = 8
+MAX_PAGE_SIZE = 50
+SNIPPET_WORDS = 16
+
+# Private-use characters stand in for <mark> until the text has been escaped
+_MARK_START, _MARK_END = '\ue000', '\ue001'
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+def _document(kind, obj):
+    title, body = DOCUMENTS[kind][1](obj)
+    return SearchDocument(kind=kind, object_id=obj.pk, title=str(title)[:255], body=str(body or ''))
+
+
+def index_objects(kind, objects):
+    """Insert or refresh the documents of ``objects`` (model instances of ``kind``) in one upsert per batch."""
+    documents = [_document(kind, obj) for obj in objects]
+    SearchDocument.objects.bulk_create(
+        documents, batch_size=500, update_conflicts=True,
+        unique_fields=['kind', 'object_id'], update_fields=['title', 'body', 'updated_at'],
+    )
+    return len(documents)
+
+
+def _on_save(sender, instance, **kwargs):
+    kind = _KIND_BY_MODEL[sender]
+    title, body = DOCUMENTS[kind][1](instance)
+    SearchDocument.objects.update_or_create(
+        kind=kind, object_id=instance.pk, defaults={'title': str(title)[:255], 'body': str(body or '')},
+    )
+
+
+def _on_delete(sender, instance, **kwargs):
+    SearchDocument.objects.filter(kind=_KIND_BY_MODEL[sender], object_id=instance.pk).delete()
+
+
+_KIND_BY_MODEL = {model: kind for kind, (model, _build) in DOCUMENTS.items()}
+
+
+def connect_signals():
+    for model in _KIND_BY_MODEL:
+        post_save.connect(_on_save, sender=model, dispatch_uid=f'search-save-{model.__name__}')
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=f'search-delete-{model.__name__}')
+
+
+def query_terms(query):
+    """Word tokens of a user query (operators and punctuation are dropped, never interpreted)."""
+    return _TERM.findall(str(query))[:MAX_TERMS]
+
+
+def _render(text):
+    return html.escape(text or '').replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def _mark_terms(text, terms):
+    """Python-side highlighting for databases without a highlighter."""
+    if not terms:
+        return text
+    pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE)
+    return pattern.sub(lambda m: f'{_MARK_START}{m.group(0)}{_MARK_END}', text)
+
+
+def _search_sqlite(terms, kinds, limit, offset):
+    table = SearchDocument._meta.db_table
+    # Every term must match, each as a prefix ("aphi" finds "aphids")
+    match = ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+    kind_sql = ', '.join(['%s'] * len(kinds))
+    where = f"{table}_fts MATCH %s AND d.kind IN ({kind_sql})"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT count(*) FROM {table}_fts JOIN {table} d ON d.id = {table}_fts.rowid WHERE {where}",
+            [match, *kinds],
+        )
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f"""SELECT d.kind, d.object_id, d.title, -bm25({table}_fts, 10.0, 1.0) AS score,
+                       highlight({table}_fts, 0, %s, %s),
+                       snippet({table}_fts, 1, %s, %s, '…', {SNIPPET_WORDS})
+                FROM {table}_fts JOIN {table} d ON d.id = {table}_fts.rowid
+                WHERE {where}
+                ORDER BY bm25({table}_fts, 10.0, 1.0), d.updated_at DESC, d.id DESC
+                LIMIT %s OFFSET %s""",
+            [_MARK_START, _MARK_END, _MARK_START, _MARK_END, match, *kinds, limit, offset],
+        )
+        return total, cursor.fetchall()
+
+
+def _search_postgres(terms, kinds, limit, offset):
+    table = SearchDocument._meta.db_table
+    tsquery = ' & '.join(f'{term}:*' for term in terms)
+    kind_sql = ', '.join(['%s'] * len(kinds))
+    headline = f"StartSel={_MARK_START}, StopSel={_MARK_END}"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""SELECT count(*) FROM {table}
+                WHERE search_vector @@ to_tsquery('english', %s) AND kind IN ({kind_sql})""",
+            [tsquery, *kinds],
+        )
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f"""SELECT kind, object_id, title, ts_rank_cd(search_vector, q) AS score,
+                       ts_headline('english', title, q, %s),
+                       ts_headline('english', body, q, %s)
+                FROM {table}, to_tsquery('english', %s) q
+                WHERE search_vector @@ q AND kind IN ({kind_sql})
+                ORDER BY score DESC, updated_at DESC, id DESC
+                LIMIT %s OFFSET %s""",
+            [
+                f"{headline}, HighlightAll=true",
+                f"{headline}, MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}",
+                tsquery, *kinds, limit, offset,
+            ],
+        )
+        return total, cursor.fetchall()
+
+
+def _search_fallback(terms, kinds, limit, offset):
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(body__icontains=term)
+    matches = SearchDocument.objects.filter(condition, kind__in=kinds).order_by('-updated_at', '-id')
+    rows = [
+        (doc.kind, doc.object_id, doc.title, 0.0, _mark_terms(doc.title, terms), _mark_terms(doc.body[:200], terms))
+        for doc in matches[offset:offset + limit]
+    ]
+    return matches.count(), rows
+
+
+def search(query, kinds=KINDS, page=1, page_size=20):
+    """One page of ranked, highlighted matches for ``query`` among documents of ``kinds``."""
+    terms = query_terms(query)
+    kinds = [kind for kind in kinds if kind in DOCUMENTS] or list(KINDS)
+    offset = (page - 1) * page_size
+    if not terms:
+        total, rows = 0, []
+    elif connection.vendor == 'sqlite':
+        total, rows = _search_sqlite(terms, kinds, page_size, offset)
+    elif connection.vendor == 'postgresql':
+        total, rows = _search_postgres(terms, kinds, page_size, offset)
+    else:
+        total, rows = _search_fallback(terms, kinds, page_size, offset)
+    return {
+        "query": query,
+        "count": total,
+        "page": page,
+        "page_size": page_size,
+        "has_next": offset + len(rows) < total,
+        "results": [
+            {
+                "type": kind,
+                "id": object_id,
+                "title": title,
+                "score": round(float(score), 4),
+                "title_highlight": _render(title_highlight),
+                "snippet": _render(snippet),
+            }
+            for kind, object_id, title, score, title_highlight, snippet in rows
+        ],
+    }
@@ -1,3 +1,8 @@
+import datetime
+import os
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import serializers
 from .models import Report, User, Feedback, Pesticide, Pest  # Import Pest model
 
@@ -30,6 +35,40 @@ class ReportSerializer(serializers.ModelSerializer):
     class Meta:
         model = Report
         fields = '__all__'
+        # Accepted from save_report but never listed; a repeated key is answered by the view, and
+        # a concurrent duplicate is caught by the unique constraint rather than a per-save query
+        extra_kwargs = {'idempotency_key': {'write_only': True, 'validators': []}}
+
+
+class ReportIngestSerializer(serializers.ModelSerializer):
+    """One record of a bulk upload (see api/ingest.py).
+
+    ``detected_at`` is the device's capture time: an ISO 8601 date-time with a UTC offset,
+    not in the future and at most SMARTPEST_INGEST_MAX_AGE_DAYS (default 365) old. Records
+    without it are stamped with the time they are saved.
+    """
+    detected_at = serializers.CharField(required=False)
+
+    class Meta:
+        model = Report
+        fields = ['pest_name', 'confidence', 'description', 'user_id', 'idempotency_key', 'detected_at']
+        # Existing keys are looked up for a whole batch at once instead of one query per record
+        extra_kwargs = {'idempotency_key': {'validators': []}}
+
+    def validate_detected_at(self, value):
+        moment = parse_datetime(value)
+        if moment is None:
+            raise serializers.ValidationError("Expected an ISO 8601 date-time.")
+        if timezone.is_naive(moment):
+            raise serializers.ValidationError("Include a UTC offset (e.g. 2025-08-20T09:30:00+05:30 or ...Z).")
+        now = timezone.now()
+        # Allow for device clocks running a little fast
+        if moment > now + datetime.timedelta(minutes=5):
+            raise serializers.ValidationError("Cannot be in the future.")
+        max_age = int(os.environ.get('SMARTPEST_INGEST_MAX_AGE_DAYS', '365'))
+        if moment < now - datetime.timedelta(days=max_age):
+            raise serializers.ValidationError(f"Cannot be more than {max_age} days ago.")
+        return moment
 
 
 # New serializer for nested user data in Feedback
@@ -54,4 +93,4 @@ class PesticideSerializer(serializers.ModelSerializer):
 class PestSerializer(serializers.ModelSerializer):
     class Meta:
         model = Pest
-        fields = '__all__'
+        fields = ('id', 'name', 'description') # Pesticide links are managed by import_reference_data
@@ -0,0 +1,78 @@
+"""
+Aggregated statistics for the admin dashboard.
+
+``admin_stats`` computes table totals, the latest detections, per-pest detection counts
+and a per-day series in five queries. Detection figures come from the rollup tables
+(api/rollups.py), so they cost the same however many reports there are. The result is
+kept in Django's cache for SMARTPEST_ADMIN_STATS_TTL seconds (default 15), so every
+dashboard polling within that window shares one computation; within a process,
+concurrent misses wait for the first one instead of repeating it.
+"""
+import os
+import threading
+
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from . import rollups
+from .models import Feedback, Pest, Pesticide, Report, User
+
+MAX_LATEST = 50
+MAX_DAYS = 366
+MAX_PESTS = 100
+
+_lock = threading.Lock()
+
+
+def _table_totals():
+    """Row counts of the admin-managed tables in a single query."""
+    tables = {
+        'users': User._meta.db_table,
+        'feedback': Feedback._meta.db_table,
+        'pests': Pest._meta.db_table,
+        'pesticides': Pesticide._meta.db_table,
+    }
+    counts = ', '.join(f'(SELECT COUNT(*) FROM {connection.ops.quote_name(table)})' for table in tables.values())
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {counts}')
+        return dict(zip(tables, cursor.fetchone()))
+
+
+def compute_admin_stats(latest=5, days=30, pests=20):
+    totals = _table_totals()
+    totals['reports'], avg_confidence = rollups.totals()
+
+    latest_reports = [
+        {**row, 'timestamp': row['timestamp'].isoformat()}
+        for row in Report.objects.order_by('-timestamp', '-id')
+        .values('id', 'pest_name', 'confidence', 'user_id', 'timestamp')[:latest]
+    ]
+    per_day = [
+        {'date': point['period'], 'count': point['count'], 'avg_confidence': point['avg_confidence']}
+        for point in rollups.detection_series('day', days)
+    ]
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'totals': totals,
+        'avg_confidence': avg_confidence,
+        'latest_detections': latest_reports,
+        'per_pest': rollups.pest_totals(pests),
+        'per_day': per_day,
+    }
+
+
+def admin_stats(latest=5, days=30, pests=20):
+    """``compute_admin_stats`` through the cache (SMARTPEST_ADMIN_STATS_TTL seconds, 0 disables it)."""
+    ttl = int(os.environ.get('SMARTPEST_ADMIN_STATS_TTL', '15'))
+    if ttl <= 0:
+        return compute_admin_stats(latest, days, pests)
+    key = f'smartpest:admin-stats:{latest}:{days}:{pests}'
+    stats = cache.get(key)
+    if stats is None:
+        with _lock:
+            stats = cache.get(key)
+            if stats is None:
+                stats = compute_admin_stats(latest, days, pests)
+                cache.set(key, stats, ttl)
+    return stats
@@ -1,3 +1,914 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import Client, SimpleTestCase, TestCase
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from . import data_version, inference, jobs, pest_data, rollups
+from .batching import BatchingEngine
+from .management.commands import (
+    benchmark_inference, benchmark_preprocessing, compare_quantized, import_reference_data,
+)
+from .models import (
+    HourlyRollup, Pest, PestDailyRollup, PestPesticide, Pesticide, PredictionJob, Report, SearchDocument, User,
+)
+from .prediction_cache import PredictionCache
+from .preprocessing import Preprocessor, load_image
+
+
+def jpeg_bytes(color="green", size=(64, 48), fmt="JPEG"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+class BatchingEngineTests(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+
+    def run_batch(self, items):
+        self.batches.append(list(items))
+        return [item * 2 for item in items]
+
+    def test_flushes_when_the_batch_is_full(self):
+        engine = BatchingEngine(self.run_batch, max_batch_size=3, max_wait_ms=10000)
+        self.addCleanup(engine.shutdown)
+        started = time.perf_counter()
+        futures = [engine.submit(n) for n in range(3)]
+        self.assertEqual([future.result(timeout=5) for future in futures], [0, 2, 4])
+        # Full batches don't wait out the 10 s window
+        self.assertLess(time.perf_counter() - started, 5)
+        self.assertEqual(self.batches, [[0, 1, 2]])
+
+    def test_flushes_a_partial_batch_after_the_wait(self):
+        engine = BatchingEngine(self.run_batch, max_batch_size=8, max_wait_ms=50)
+        self.addCleanup(engine.shutdown)
+        started = time.perf_counter()
+        self.assertEqual(engine.predict(21, timeout=5), 42)
+        self.assertGreaterEqual(time.perf_counter() - started, 0.05)
+        self.assertEqual(self.batches, [[21]])
+        self.assertEqual(engine.stats()["batch_size_histogram"], {"1": 1})
+
+
+class ReadinessTests(SimpleTestCase):
+    def test_ready_once_loaded(self):
+        with mock.patch.object(inference, "_load_state", inference.STATE_READY):
+            response = self.client.get("/readyz/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["ready"])
+
+    def test_probe_starts_the_load_when_preloading_is_off(self):
+        with mock.patch.dict(os.environ, {"SMARTPEST_PRELOAD_MODEL": "0"}), \
+                mock.patch.object(inference, "_load_state", inference.STATE_NOT_STARTED), \
+                mock.patch.object(inference, "ensure_model_loaded") as load:
+            self.assertIsNone(inference.start_background_loading())
+            response = self.client.get("/readyz/")
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.json()["state"], inference.STATE_LOADING)
+            deadline = time.monotonic() + 5
+            while not load.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+            load.assert_called_once_with()
+
+
+class QuantizedComparisonTests(SimpleTestCase):
+    def test_missing_int8_model_is_an_error(self):
+        with tempfile.TemporaryDirectory() as images, tempfile.TemporaryDirectory() as exports:
+            with open(os.path.join(images, "leaf.jpg"), "wb") as f:
+                f.write(jpeg_bytes())
+            with mock.patch.object(inference, "EXPORT_DIR", exports), \
+                    mock.patch.object(compare_quantized, "run_isolated") as run:
+                with self.assertRaisesMessage(CommandError, "No INT8 model"):
+                    call_command("compare_quantized", "--images", images, stdout=io.StringIO())
+        run.assert_not_called()
+
+    def test_variant_that_loaded_another_model_is_an_error(self):
+        with mock.patch.object(inference, "load_model", return_value=True) as load, \
+                mock.patch.object(inference, "model_source", "/models/best_model_b5.pth"):
+            result = compare_quantized._run_variant({}, [], "/models/exported/classifier_int8.onnx")
+        load.assert_called_once_with(strict=True)
+        self.assertIn("instead of /models/exported/classifier_int8.onnx", result["error"])
+
+    def test_strict_load_does_not_fall_back_to_fp32(self):
+        env = {"SMARTPEST_USE_MOCK": "0", "SMARTPEST_QUANTIZE": inference.QUANTIZE_STATIC, "SMARTPEST_MODEL_SERVER": ""}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch.multiple(inference, model=None, transform=None, device=None), \
+                mock.patch.object(inference, "_load_exported_model", return_value=False), \
+                mock.patch.object(inference, "_load_eager_model") as eager:
+            self.assertFalse(inference.load_model(strict=True))
+            eager.assert_not_called()
+            eager.return_value = True
+            self.assertTrue(inference.load_model())
+            eager.assert_called_once_with()
+
+
+class CascadeTests(SimpleTestCase):
+    def setUp(self):
+        import torch
+        self.torch = torch
+        self.calls = []
+        patches = [
+            mock.patch.dict(os.environ, {"SMARTPEST_BATCHING": "0", "SMARTPEST_CASCADE_MIN_CONFIDENCE": "0.85"}),
+            mock.patch.dict(inference._cascade_counts, {"images": 0, "escalated": 0, "fast_seconds": 0.0, "full_seconds": 0.0}),
+            mock.patch.multiple(
+                inference, device=torch.device("cpu"), model=self.network("b5", [0.0, 8.0, 0.0]),
+                transform=inference.build_transform(4), fast_transform=inference.build_transform(2),
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def network(self, name, logits):
+        def forward(batch):
+            self.calls.append(name)
+            return self.torch.tensor([logits] * batch.shape[0])
+        return forward
+
+    def test_confident_b0_answer_is_returned(self):
+        with mock.patch.object(inference, "fast_model", self.network("b0", [9.0, 0.0, 0.0])):
+            probs, stage = inference._predict_probs(Image.new("RGB", (8, 8)))
+        self.assertEqual((stage, int(probs.argmax())), (inference.STAGE_FAST, 0))
+        self.assertEqual(self.calls, ["b0"])
+        self.assertEqual(inference.cascade_stats()["escalated"], 0)
+
+    def test_unsure_b0_answer_escalates_to_b5(self):
+        with mock.patch.object(inference, "fast_model", self.network("b0", [0.0, 0.0, 0.0])):
+            probs, stage = inference._predict_probs(Image.new("RGB", (8, 8)))
+        self.assertEqual((stage, int(probs.argmax())), (inference.STAGE_FULL, 1))
+        self.assertEqual(self.calls, ["b0", "b5"])
+        self.assertEqual(inference.cascade_stats()["escalation_rate"], 1.0)
+
+    def test_batch_escalates_only_unsure_images(self):
+        def fast(batch):
+            self.calls.append("b0")
+            return self.torch.tensor([[9.0, 0.0, 0.0], [0.0, 0.0, 0.0]])
+        with mock.patch.object(inference, "fast_model", fast):
+            results = inference._predict_batch_probs([Image.new("RGB", (8, 8))] * 2)
+        self.assertEqual([stage for _probs, stage in results], [inference.STAGE_FAST, inference.STAGE_FULL])
+        self.assertEqual(self.calls, ["b0", "b5"])
+
+    def test_imagenet_b0_does_not_enable_the_cascade(self):
+        with tempfile.TemporaryDirectory() as models:
+            open(os.path.join(models, "pretrained_efficientnet_b0.pth"), "wb").close()
+            with mock.patch.object(inference, "MODELS_DIR", models), \
+                    mock.patch.object(inference, "fast_model", None), \
+                    mock.patch.object(inference, "_load_network") as load:
+                self.assertFalse(inference._load_fast_model())
+                self.assertIsNone(inference.fast_model)
+        load.assert_not_called()
+
+
+class PredictionCacheTests(SimpleTestCase):
+    def test_concurrent_misses_compute_once(self):
+        cache = PredictionCache()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return {"pest": "aphid"}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        # Let the other three join the running computation before it finishes
+        deadline = time.monotonic() + 5
+        while cache.stats()["coalesced"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"pest": "aphid"}] * 4)
+        stats = cache.stats()
+        self.assertEqual((stats["misses"], stats["coalesced"]), (4, 3))
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = PredictionCache(ttl_seconds=60)
+        with mock.patch("api.prediction_cache.time.time", return_value=1000.0):
+            cache.put("k", "v")
+            self.assertEqual(cache.get("k"), "v")
+        with mock.patch("api.prediction_cache.time.time", return_value=1061.0):
+            self.assertIsNone(cache.get("k"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["expirations"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = PredictionCache(max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+
+class PredictUploadTests(SimpleTestCase):
+    def test_image_bytes_from_every_kind_of_source(self):
+        data = jpeg_bytes()
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as f:
+            f.write(data)
+            f.flush()
+            self.assertEqual(inference.read_image_bytes(f.name), data)
+            self.assertEqual(inference.read_image_bytes(f), data)  # Read from the start again
+        self.assertEqual(inference.read_image_bytes(SimpleUploadedFile("leaf.jpg", data)), data)
+        self.assertEqual(inference.read_image_bytes(memoryview(data)), data)
+
+    def test_upload_is_classified_without_a_temp_file(self):
+        upload = SimpleUploadedFile("leaf.jpg", jpeg_bytes(), content_type="image/jpeg")
+        with mock.patch("tempfile.NamedTemporaryFile", side_effect=AssertionError("temp file")), \
+                mock.patch("tempfile.mkstemp", side_effect=AssertionError("temp file")):
+            response = self.client.post("/api/predict/", {"image": upload})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertIn(body["class"], inference.class_names)
+        self.assertNotIn("predictions", body)
+
+    def test_undecodable_upload_reports_an_error(self):
+        upload = SimpleUploadedFile("leaf.jpg", b"not an image", content_type="image/jpeg")
+        response = self.client.post("/api/predict/", {"image": upload})
+        self.assertIn("Failed to process image", response.json()["error"])
+
+    def test_missing_upload_is_rejected(self):
+        response = self.client.post("/api/predict/", {})
+        self.assertEqual(response.status_code, 400)
+
+
+class PreprocessingTests(SimpleTestCase):
+    def gradient(self, fmt):
+        import numpy as np
+        ramp = np.linspace(0, 255, 90 * 120, dtype=np.uint8).reshape(90, 120)
+        buffer = io.BytesIO()
+        Image.fromarray(np.stack([ramp, ramp[::-1], np.full_like(ramp, 80)], axis=2)).save(buffer, fmt)
+        return buffer.getvalue()
+
+    def test_matches_the_torchvision_transform(self):
+        import numpy as np
+        data = self.gradient("PNG")
+        legacy = benchmark_preprocessing._legacy_pipeline(32)(data).numpy()
+        fast = np.array(benchmark_preprocessing._fast_pipeline(32)(data))
+        self.assertEqual(fast.shape, (3, 32, 32))
+        self.assertLess(float(np.abs(legacy - fast).max()), 1e-4)
+
+    def test_jpeg_is_decoded_at_reduced_scale(self):
+        data = jpeg_bytes(size=(2400, 1800))
+        image = load_image(data, 600)
+        self.assertEqual(image.size, (1200, 900))
+        self.assertEqual(load_image(data).size, (2400, 1800))
+        self.assertEqual(load_image(self.gradient("PNG"), 16).size, (120, 90))
+
+    def test_writes_into_the_given_batch_buffer(self):
+        import numpy as np
+        out = np.zeros((3, 16, 16), dtype=np.float32)
+        tensor = Preprocessor(16)(load_image(self.gradient("JPEG"), 16), out=out)
+        self.assertTrue(np.shares_memory(tensor.numpy(), out))
+        self.assertTrue(out.any())
+
+
+class BatchPredictTests(SimpleTestCase):
+    def post(self, data):
+        response = self.client.post("/api/predict/batch/", data)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        return [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+    def upload(self, name, data):
+        return SimpleUploadedFile(name, data, content_type="image/jpeg")
+
+    def test_one_line_per_image_then_a_summary(self):
+        lines = self.post({"images": [self.upload("a.jpg", jpeg_bytes()), self.upload("b.jpg", b"broken")]})
+        self.assertEqual([line.get("filename") for line in lines[:2]], ["a.jpg", "b.jpg"])
+        self.assertIn("class", lines[0])
+        self.assertIn("error", lines[1])
+        self.assertEqual(lines[2], {"summary": {"images": 2, "errors": 1}})
+
+    def test_zip_archive_images_are_classified(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("field/leaf.jpg", jpeg_bytes())
+            zf.writestr("notes.txt", "not an image")
+        lines = self.post({"archive": SimpleUploadedFile("photos.zip", archive.getvalue())})
+        self.assertEqual(lines[0]["filename"], "field/leaf.jpg")
+        self.assertEqual(lines[-1], {"summary": {"images": 1, "errors": 0}})
+
+    def test_oversized_file_is_refused_without_decoding(self):
+        with mock.patch.dict(os.environ, {"SMARTPEST_MULTI_MAX_FILE_BYTES": "2000"}), \
+                mock.patch.object(inference, "open_image", wraps=inference.open_image) as opened:
+            lines = self.post({"images": [
+                self.upload("big.jpg", jpeg_bytes(size=(400, 300), color="red") + b"\0" * 4000),
+                self.upload("small.jpg", jpeg_bytes()),
+            ]})
+        self.assertEqual(lines[0]["error"], "Failed to process image: File is larger than 2000 bytes")
+        self.assertIn("class", lines[1])
+        self.assertEqual(opened.call_count, 1)
+
+    def test_too_many_images_is_rejected(self):
+        with mock.patch.dict(os.environ, {"SMARTPEST_MULTI_MAX_IMAGES": "1"}):
+            response = self.client.post("/api/predict/batch/", {"images": [
+                self.upload("a.jpg", jpeg_bytes()), self.upload("b.jpg", jpeg_bytes()),
+            ]})
+        self.assertEqual(response.status_code, 400)
+
+
+class PredictionJobTests(TestCase):
+    def test_submitted_job_is_queued(self):
+        upload = SimpleUploadedFile("leaf.jpg", jpeg_bytes(), content_type="image/jpeg")
+        response = self.client.post("/api/jobs/", {"image": upload})
+        self.assertEqual(response.status_code, 202)
+        status = self.client.get(f"/api/jobs/{response.json()['job_id']}/").json()
+        self.assertEqual((status["status"], status["queue_position"]), ("queued", 0))
+
+    def test_oldest_job_is_claimed_once(self):
+        first, second = jobs.enqueue(b"1"), jobs.enqueue(b"2")
+        PredictionJob.objects.filter(pk=second.pk).update(created_at=first.created_at + timedelta(seconds=1))
+        self.assertEqual(jobs.claim_next("w1", 60).pk, first.pk)
+        self.assertEqual(jobs.claim_next("w2", 60).pk, second.pk)
+        self.assertIsNone(jobs.claim_next("w3", 60))
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.worker_id, first.attempts), ("running", "w1", 1))
+
+    def test_claimed_job_stores_its_result(self):
+        jobs.enqueue(jpeg_bytes(), "leaf.jpg")
+        job = jobs.claim_next("w1", 60)
+        jobs.run_job(job, "w1")
+        payload = self.client.get(f"/api/jobs/{job.pk}/").json()
+        self.assertEqual(payload["status"], "done")
+        self.assertIn("class", payload["result"])
+
+        jobs.enqueue(b"broken")
+        job = jobs.claim_next("w1", 60)
+        jobs.run_job(job, "w1")
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        self.assertIn("Failed to process image", job.error)
+
+    def expire(self, job):
+        PredictionJob.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_expired_lease_is_retried_then_failed(self):
+        job = jobs.enqueue(jpeg_bytes())
+        for attempt in (1, 2):
+            self.assertEqual(jobs.claim_next(f"w{attempt}", 60).pk, job.pk)
+            self.expire(job)
+            self.assertEqual(jobs.requeue_expired(max_attempts=2), ((1, 0) if attempt == 1 else (0, 1)))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 2))
+        self.assertEqual(job.error, "Gave up after 2 attempts")
+
+    def test_worker_that_lost_its_lease_cannot_finish_the_job(self):
+        job = jobs.enqueue(jpeg_bytes())
+        stale = jobs.claim_next("w1", 60)
+        self.expire(job)
+        jobs.requeue_expired(max_attempts=3)
+        current = jobs.claim_next("w2", 60)
+        self.assertEqual(jobs.run_job(stale, "w1"), 0)
+        self.assertEqual(jobs.run_job(current, "w2"), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker_id, job.attempts), ("done", "w2", 2))
+
+    def test_events_stream_ends_with_the_finished_job(self):
+        job = jobs.enqueue(jpeg_bytes())
+        jobs.run_job(jobs.claim_next("w1", 60), "w1")
+        response = self.client.get(f"/api/jobs/{job.pk}/events/")
+        body = b"".join(response.streaming_content).decode()
+        self.assertTrue(body.startswith("retry: 2000\n\n"))
+        self.assertIn('"status": "done"', body)
+
+    def test_events_stream_closes_after_its_window(self):
+        job = jobs.enqueue(jpeg_bytes())
+        env = {"SMARTPEST_JOB_EVENTS_WINDOW": "0.2", "SMARTPEST_JOB_EVENTS_POLL_SECONDS": "0.05"}
+        with mock.patch.dict(os.environ, env):
+            started = time.monotonic()
+            body = b"".join(self.client.get(f"/api/jobs/{job.pk}/events/").streaming_content).decode()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(body.count("event: status"), 1)
+        self.assertNotIn("event: timeout", body)
+
+
+class InferenceBenchmarkTests(SimpleTestCase):
+    def run_config(self, env):
+        import torch
+        with mock.patch.dict(os.environ), \
+                mock.patch.multiple(inference, model=None, transform=None, device=None, model_source=None):
+            return benchmark_inference._run_config(
+                {"SMARTPEST_USE_MOCK": "0", "SMARTPEST_MODEL_SERVER": None, **env},
+                torch.get_num_threads(), 32, [1], [("a.jpg", jpeg_bytes())], 0, 1, False,
+            )
+
+    def test_missing_export_is_an_error_not_an_eager_run(self):
+        with tempfile.TemporaryDirectory() as exports, \
+                mock.patch.object(inference, "EXPORT_DIR", exports), \
+                mock.patch.object(inference, "_load_eager_model") as eager:
+            outcome = self.run_config({"SMARTPEST_INFERENCE_BACKEND": inference.BACKEND_ONNXRUNTIME})
+        self.assertEqual(outcome, {"error": "model failed to load"})
+        eager.assert_not_called()
+
+    def test_model_loaded_from_another_file_is_an_error(self):
+        def load(strict=False):
+            inference.model_source = "/models/pretrained_efficientnet_b0.pth"
+            return True
+        with mock.patch.object(inference, "load_model", side_effect=load):
+            outcome = self.run_config({"SMARTPEST_INFERENCE_BACKEND": inference.BACKEND_EAGER})
+        self.assertIn("instead of", outcome["error"])
+        self.assertTrue(outcome["error"].endswith("best_model_b5.pth"))
+
+
+class PredictTopKTests(TestCase):
+    def predict(self, **fields):
+        upload = SimpleUploadedFile("leaf.jpg", jpeg_bytes(), content_type="image/jpeg")
+        return self.client.post("/api/predict/", {"image": upload, **fields})
+
+    def test_top_k_lists_the_best_classes_in_order(self):
+        response = self.predict(top_k=3)
+        self.assertEqual(response.status_code, 200)
+        predictions = response.json()["predictions"]
+        self.assertEqual(len(predictions), 3)
+        self.assertEqual(predictions[0]["class"], response.json()["class"])
+        confidences = [p["confidence"] for p in predictions]
+        self.assertEqual(confidences, sorted(confidences, reverse=True))
+
+    def test_invalid_top_k_is_rejected(self):
+        for value in ("0", str(inference.top_k_limit() + 1), "three"):
+            with self.subTest(top_k=value):
+                response = self.predict(top_k=value)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("top_k", response.json()["error"])
+
+    def test_include_info_embeds_pest_details(self):
+        aphids = Pest.objects.create(name="Aphids", description="Sap-sucking insects")
+        PestPesticide.objects.create(
+            pest=aphids, pesticide=Pesticide.objects.create(name="Neem oil"), dosage="5 ml/l",
+        )
+        with mock.patch.object(inference, "class_names", ["aphids", "thrips"]):
+            response = self.predict(top_k=2, include_info=1)
+        self.assertEqual(response.status_code, 200)
+        predictions = {p["class"]: p for p in response.json()["predictions"]}
+        self.assertEqual(predictions["aphids"]["description"], "Sap-sucking insects")
+        self.assertEqual(predictions["aphids"]["pesticides"][0]["name"], "Neem oil")
+        self.assertEqual(predictions["thrips"]["pesticides"][0]["name"], "No pesticide data available")
+
+    def test_include_info_alone_lists_the_top_class(self):
+        response = self.predict(include_info=1)
+        predictions = response.json()["predictions"]
+        self.assertEqual(len(predictions), 1)
+        self.assertIn("description", predictions[0])
+
+
+class PestDetailsTests(TestCase):
+    def test_spellings_resolve_to_the_reference_name(self):
+        index = pest_data.NameIndex(["army_worm", "oides_decempunctata"], version=None)
+        for spelling in ("Army Worm", "army-worm", " ARMY__worm ", "armyworm"):
+            with self.subTest(spelling=spelling):
+                self.assertEqual(index.canonical(spelling), "army_worm")
+        self.assertEqual(index.canonical("oides decellantata"), "oides_decempunctata")
+        self.assertIsNone(index.canonical("locust"))
+        self.assertEqual(len(index), 2)
+
+    def test_details_are_found_under_any_spelling(self):
+        pest = Pest.objects.create(name="army_worm", description="Eats leaves")
+        PestPesticide.objects.create(pest=pest, pesticide=Pesticide.objects.create(name="Spinosad"), position=0)
+        index = pest_data.NameIndex(["army_worm"], version=None)
+        with mock.patch.object(pest_data, "name_index", return_value=index), self.assertNumQueries(2):
+            details = pest_data.pest_details_many(["Army Worm", "army-worm", "locust"])
+        self.assertEqual(details["Army Worm"]["description"], "Eats leaves")
+        self.assertEqual(details["army-worm"]["pesticides"][0]["name"], "Spinosad")
+        self.assertEqual(details["locust"]["description"], pest_data.DEFAULT_DESCRIPTION)
+        self.assertEqual(details["locust"]["pesticides"], list(pest_data.NO_PESTICIDES))
+
+    def test_index_is_rebuilt_when_a_reference_file_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            descriptions = os.path.join(tmp, "pest_description.json")
+            with open(descriptions, "w") as f:
+                json.dump([{"pest_name": "army_worm", "description": ""}], f)
+            with mock.patch.multiple(
+                pest_data, DESCRIPTIONS_FILE=descriptions, PESTICIDES_FILE=os.path.join(tmp, "none.json"),
+                CLASSES_FILE=os.path.join(tmp, "classes.txt"), _index=None,
+            ), mock.patch.dict(os.environ, {"SMARTPEST_PEST_DATA_CHECK_SECONDS": "0"}):
+                self.assertIsNone(pest_data.name_index().canonical("locust"))
+                with open(descriptions, "w") as f:
+                    json.dump([{"pest_name": "army_worm"}, {"pest_name": "Locust"}], f)
+                self.assertEqual(pest_data.name_index().canonical("locust"), "Locust")
+
+
+class ReferenceImportTests(TestCase):
+    records = [
+        {"name": "army_worm", "description": "Eats leaves", "pesticides": [
+            {"name": "Spinosad", "dosage": "1 ml/l", "safety_precautions": "Gloves"},
+            {"name": "Neem oil ", "dosage": "5 ml/l"},
+        ]},
+        {"name": "aphids", "description": None, "pesticides": [{"name": "neem-oil"}]},
+    ]
+
+    def pesticides_of(self, pest_name):
+        return list(
+            PestPesticide.objects.filter(pest__name=pest_name).order_by("position")
+            .values_list("pesticide__name", "dosage")
+        )
+
+    def test_fills_in_missing_data(self):
+        counts = import_reference_data.import_records(self.records)
+        self.assertEqual(counts, {"pests": 2, "pesticides": 2, "links": 3, "kept": 0})
+        self.assertEqual(Pest.objects.get(name="army_worm").description, "Eats leaves")
+        self.assertIsNone(Pest.objects.get(name="aphids").description)
+        self.assertEqual(self.pesticides_of("army_worm"), [("Spinosad", "1 ml/l"), ("Neem oil", "5 ml/l")])
+        self.assertEqual(self.pesticides_of("aphids"), [("Neem oil", "")])
+
+    def test_admin_edits_survive_unless_forced(self):
+        pest = Pest.objects.create(name="army_worm", description="Edited by hand")
+        PestPesticide.objects.create(pest=pest, pesticide=Pesticide.objects.create(name="Malathion"))
+        counts = import_reference_data.import_records(self.records)
+        self.assertEqual(counts["kept"], 1)
+        self.assertEqual(Pest.objects.get(name="army_worm").description, "Edited by hand")
+        self.assertEqual(self.pesticides_of("army_worm"), [("Malathion", "")])
+
+        import_reference_data.import_records(self.records, force=True)
+        self.assertEqual(Pest.objects.get(name="army_worm").description, "Eats leaves")
+        self.assertEqual(self.pesticides_of("army_worm"), [("Spinosad", "1 ml/l"), ("Neem oil", "5 ml/l")])
+
+    def test_other_spellings_are_updated_not_duplicated(self):
+        Pest.objects.create(name="Army worm", description="")
+        Pesticide.objects.create(name="NEEM OIL")
+        import_reference_data.import_records(self.records)
+        self.assertEqual(
+            sorted(Pest.objects.values_list("name", "description")),
+            [("Army worm", "Eats leaves"), ("aphids", None)],
+        )
+        self.assertEqual(sorted(Pesticide.objects.values_list("name", flat=True)), ["NEEM OIL", "Spinosad"])
+        self.assertEqual(self.pesticides_of("Army worm"), [("Spinosad", "1 ml/l"), ("NEEM OIL", "5 ml/l")])
+
+    def test_if_empty_skips_an_imported_database(self):
+        import_reference_data.import_records(self.records)
+        out = io.StringIO()
+        with mock.patch.object(import_reference_data, "import_records") as import_records:
+            call_command("import_reference_data", if_empty=True, stdout=out)
+        import_records.assert_not_called()
+        self.assertIn("skipping", out.getvalue())
+
+
+class ReferenceCacheTests(TestCase):
+    def test_unchanged_data_is_not_modified(self):
+        first = self.client.get("/api/pests/")
+        self.assertEqual(first.status_code, 200)
+        etag = first["ETag"]
+        with self.assertNumQueries(1):
+            second = self.client.get("/api/pests/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, 304)
+
+    def test_a_write_changes_the_etag(self):
+        etag = self.client.get("/api/pest-info/aphids/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            data_version.bump()
+        response = self.client.get("/api/pest-info/aphids/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_api_writes_bump_the_version(self):
+        user = User.objects.create_user(email="admin@example.com", password="secret", is_staff=True)
+        client = Client(HTTP_AUTHORIZATION="Token " + Token.objects.create(user=user).key)
+        etag = self.client.get("/api/pesticides/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.post("/api/pesticides/", {"name": "Spinosad"}).status_code, 201)
+        self.assertEqual(self.client.get("/api/pesticides/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SearchTests(TestCase):
+    def search(self, **params):
+        return self.client.get("/api/search/", params)
+
+    def test_prefix_matches_are_highlighted(self):
+        pest = Pest.objects.create(name="Aphids", description="Small <sap-sucking> insects")
+        Pesticide.objects.create(name="Neem oil", chemical_name="Azadirachtin")
+        body = self.search(q="aphi").json()
+        self.assertEqual(body["count"], 1)
+        result = body["results"][0]
+        self.assertEqual((result["type"], result["id"]), ("pest", pest.id))
+        self.assertEqual(result["title_highlight"], "<mark>Aphids</mark>")
+
+        body = self.search(q="sap").json()
+        self.assertIn("&lt;<mark>sap</mark>", body["results"][0]["snippet"])
+
+    def test_index_follows_updates_and_deletes(self):
+        pest = Pest.objects.create(name="Aphids")
+        pest.name = "Thrips"
+        pest.save()
+        self.assertEqual(self.search(q="aphids").json()["count"], 0)
+        self.assertEqual(self.search(q="thrips").json()["count"], 1)
+        pest.delete()
+        self.assertEqual(self.search(q="thrips").json()["count"], 0)
+
+    def test_type_filter_and_equal_ranks_newest_first(self):
+        Pest.objects.create(name="Aphids")
+        older = Report.objects.create(pest_name="Aphids", confidence=0.9, description="")
+        newer = Report.objects.create(pest_name="Aphids", confidence=0.8, description="")
+        SearchDocument.objects.filter(kind="report", object_id=older.id).update(
+            updated_at=timezone.now() - timedelta(days=1),
+        )
+        body = self.search(q="aphids", type="report").json()
+        self.assertEqual([r["id"] for r in body["results"]], [newer.id, older.id])
+
+    def test_paging(self):
+        for n in range(3):
+            Report.objects.create(pest_name="Aphids", confidence=0.9, description="")
+        body = self.search(q="aphids", page=2, page_size=2).json()
+        self.assertEqual((body["count"], len(body["results"]), body["has_next"]), (3, 1, False))
+
+    def test_bad_queries_are_rejected(self):
+        for params in ({}, {"q": "aphids", "type": "insect"}, {"q": "aphids", "page_size": "500"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.search(**params).status_code, 400)
+
+    def test_operators_are_treated_as_words(self):
+        Pest.objects.create(name="Aphids")
+        self.assertEqual(self.search(q='aphids" OR "x').status_code, 200)
+        self.assertEqual(self.search(q="NEAR(*").json()["count"], 0)
+
+
+class ReportListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        # Two reports share a timestamp, so paging has to break the tie on id
+        cls.reports = [
+            Report.objects.create(pest_name="Aphids", confidence=0.9, description="", timestamp=now - timedelta(minutes=n))
+            for n in (0, 1, 1, 2, 3)
+        ]
+        cls.newest_first = sorted(cls.reports, key=lambda r: (r.timestamp, r.id), reverse=True)
+
+    def ids(self, response):
+        return [report["id"] for report in response.json()["results"]]
+
+    def test_cursor_walks_forward_and_back(self):
+        first = self.client.get("/api/reports/", {"page_size": 2})
+        body = first.json()
+        self.assertEqual((body["count"], body["count_is_exact"], body["previous"]), (5, True, None))
+        expected = [r.id for r in self.newest_first]
+        self.assertEqual(self.ids(first), expected[:2])
+
+        second = self.client.get(body["next"])
+        self.assertEqual(self.ids(second), expected[2:4])
+        third = self.client.get(second.json()["next"])
+        self.assertEqual(self.ids(third), expected[4:])
+        self.assertIsNone(third.json()["next"])
+
+        back = self.client.get(third.json()["previous"])
+        self.assertEqual(self.ids(back), expected[2:4])
+        self.assertEqual(self.ids(self.client.get(back.json()["previous"])), expected[:2])
+
+    def test_new_rows_do_not_shift_the_next_page(self):
+        first = self.client.get("/api/reports/", {"page_size": 2})
+        Report.objects.create(pest_name="Thrips", confidence=0.5, description="")
+        second = self.client.get(first.json()["next"])
+        self.assertEqual(self.ids(second), [r.id for r in self.newest_first[2:4]])
+
+    def test_count_is_capped(self):
+        with mock.patch.dict(os.environ, {"SMARTPEST_REPORTS_COUNT_CAP": "3"}):
+            body = self.client.get("/api/reports/").json()
+        self.assertEqual((body["count"], body["count_is_exact"], len(body["results"])), (3, False, 5))
+
+    def test_invalid_cursor_is_not_found(self):
+        self.assertEqual(self.client.get("/api/reports/", {"cursor": "not-a-cursor"}).status_code, 404)
+
+
+class ReportFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = timezone.make_aware(datetime(2026, 5, 10, 12, 0))
+        rows = [
+            ("Army worm", 0.95, "farmer-1", 0),
+            ("army_worm", 0.60, "farmer-2", 1),
+            ("Aphids", 0.80, "farmer-1", 2),
+            ("Thrips", 0.50, "farmer-2", 3),
+        ]
+        for name, confidence, user, days in rows:
+            Report.objects.create(
+                pest_name=name, confidence=confidence, description="", user_id=user,
+                timestamp=cls.day - timedelta(days=days),
+            )
+
+    def names(self, **params):
+        response = self.client.get("/api/reports/", params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(report["pest_name"] for report in response.json()["results"])
+
+    def test_pest_name_and_prefix(self):
+        self.assertEqual(self.names(pest_name="Aphids"), ["Aphids"])
+        self.assertEqual(self.names(pest_name="aphids"), [])
+        self.assertEqual(self.names(pest_name_prefix="ARMY"), ["Army worm", "army_worm"])
+        self.assertEqual(self.names(pest_name_prefix="a"), ["Aphids", "Army worm", "army_worm"])
+
+    def test_confidence_band_includes_the_minimum_only(self):
+        self.assertEqual(self.names(min_confidence="0.6", max_confidence="0.95"), ["Aphids", "army_worm"])
+
+    def test_date_range_and_user(self):
+        self.assertEqual(self.names(since="2026-05-08", until="2026-05-10T12:00:00"), ["Aphids", "army_worm"])
+        self.assertEqual(self.names(since="2026-05-10T12:00:00+00:00"), ["Army worm"])
+        self.assertEqual(self.names(user_id="farmer-2", min_confidence="0.55"), ["army_worm"])
+
+    def test_bad_filters_are_rejected(self):
+        for params in ({"min_confidence": "high"}, {"max_confidence": "1.5"}, {"since": "last week"}):
+            with self.subTest(params=params):
+                response = self.client.get("/api/reports/", params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
+
+
+class AdminStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_user(email="admin@example.com", password="secret", is_staff=True)
+        self.admin = Client(HTTP_AUTHORIZATION="Token " + Token.objects.create(user=admin).key)
+        for pest_name, confidence in (("Aphids", 0.9), ("Aphids", 0.7), ("Thrips", 0.5)):
+            self.save_report(pest_name, confidence)
+        Pest.objects.create(name="Aphids")
+
+    def save_report(self, pest_name, confidence):
+        response = self.client.post(
+            "/api/save-report/", {"pest_name": pest_name, "confidence": confidence, "description": "leaf"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_totals_per_pest_and_per_day(self):
+        body = self.admin.get("/api/admin/stats/", {"latest": 2, "days": 7}).json()
+        self.assertEqual(body["totals"], {"users": 1, "feedback": 0, "pests": 1, "pesticides": 0, "reports": 3})
+        self.assertEqual(body["avg_confidence"], 0.7)
+        self.assertEqual(
+            body["per_pest"],
+            [{"pest_name": "Aphids", "count": 2, "avg_confidence": 0.8},
+             {"pest_name": "Thrips", "count": 1, "avg_confidence": 0.5}],
+        )
+        self.assertEqual([r["pest_name"] for r in body["latest_detections"]], ["Thrips", "Aphids"])
+        self.assertEqual(len(body["per_day"]), 7)
+        self.assertEqual(body["per_day"][-1], {"date": timezone.localdate().isoformat(), "count": 3, "avg_confidence": 0.7})
+
+    def test_cached_for_the_ttl(self):
+        first = self.admin.get("/api/admin/stats/").json()
+        self.save_report("Thrips", 0.6)
+        with self.assertNumQueries(1):  # The token lookup only
+            self.assertEqual(self.admin.get("/api/admin/stats/").json(), first)
+        with mock.patch.dict(os.environ, {"SMARTPEST_ADMIN_STATS_TTL": "0"}):
+            self.assertEqual(self.admin.get("/api/admin/stats/").json()["totals"]["reports"], 4)
+
+    def test_staff_only_and_bounded(self):
+        self.assertIn(self.client.get("/api/admin/stats/").status_code, (401, 403))
+        self.assertEqual(self.admin.get("/api/admin/stats/", {"days": "0"}).status_code, 400)
+        self.assertEqual(self.admin.get("/api/admin/stats/", {"latest": "all"}).status_code, 400)
+
+
+class RollupTests(TestCase):
+    def daily(self):
+        return {(r.pest_name, r.day): (r.count, round(r.confidence_sum, 4)) for r in PestDailyRollup.objects.all()}
+
+    def hourly(self):
+        return {r.hour: r.count for r in HourlyRollup.objects.all()}
+
+    def report(self, pest_name="Aphids", confidence=0.5, **fields):
+        return Report.objects.create(pest_name=pest_name, confidence=confidence, description="leaf", **fields)
+
+    def assertRollupsMatch(self):
+        self.assertEqual(rollups.check(), {"daily": [], "hourly": []})
+
+    def test_reports_saved_any_way_are_counted_once(self):
+        today = timezone.localdate()
+        self.report(confidence=0.9)
+        response = self.client.post(
+            "/api/save-report/", {"pest_name": "Aphids", "confidence": 0.7, "description": "leaf"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.client.post(
+            "/api/reports/bulk/", [{"pest_name": "Thrips", "confidence": 0.4, "description": "leaf"}],
+            content_type="application/json",
+        )
+        self.assertEqual(self.daily(), {("Aphids", today): (2, 1.6), ("Thrips", today): (1, 0.4)})
+        self.assertEqual(sum(self.hourly().values()), 3)
+        self.assertRollupsMatch()
+
+    def test_edits_move_the_report(self):
+        report = self.report(confidence=0.8)
+        report.save()  # Unchanged: counted once still
+        yesterday = timezone.now() - timedelta(days=1)
+        report.pest_name, report.timestamp, report.confidence = "Thrips", yesterday, 0.6
+        report.save()
+        self.assertEqual(self.daily(), {("Thrips", timezone.localdate(yesterday)): (1, 0.6)})
+        self.assertEqual(list(self.hourly().values()), [1])
+        self.assertRollupsMatch()
+
+    def test_deleted_reports_are_forgotten(self):
+        keep, drop = self.report(), self.report("Thrips")
+        drop.delete()
+        self.assertEqual(list(self.daily()), [("Aphids", timezone.localdate())])
+        keep.delete()
+        self.assertEqual((self.daily(), self.hourly()), ({}, {}))
+
+    def test_hourly_rows_are_kept_for_the_retention_window(self):
+        old = timezone.now() - timedelta(days=3)
+        HourlyRollup.objects.create(hour=old.replace(minute=0, second=0, microsecond=0), count=1, confidence_sum=0.5)
+        with mock.patch.dict(os.environ, {"SMARTPEST_HOURLY_ROLLUP_DAYS": "2"}):
+            self.report(timestamp=old)
+            self.report()
+            self.assertRollupsMatch()
+        self.assertEqual(len(self.daily()), 2)
+        self.assertEqual(list(self.hourly().values()), [1])
+
+    def test_check_reports_drift_until_rebuilt(self):
+        self.report()
+        call_command("rebuild_rollups", check=True, stdout=io.StringIO())
+        Report.objects.update(pest_name="Thrips")  # QuerySet.update sends no signals
+        with self.assertRaisesMessage(CommandError, "2 daily and 0 hourly rollup rows differ"):
+            call_command("rebuild_rollups", check=True, stdout=io.StringIO())
+        call_command("rebuild_rollups", stdout=io.StringIO())
+        call_command("rebuild_rollups", check=True, stdout=io.StringIO())
+        self.assertEqual(list(self.daily()), [("Thrips", timezone.localdate())])
+
+
+class BulkReportTests(TestCase):
+    def upload(self, records, content_type="application/json"):
+        body = "\n".join(json.dumps(r) for r in records) if "ndjson" in content_type else json.dumps(records)
+        response = self.client.post("/api/reports/bulk/", body, content_type=content_type)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def record(self, key=None, **fields):
+        return {"pest_name": "aphids", "confidence": 0.8, "description": "leaf", "idempotency_key": key, **fields}
+
+    def test_key_repeated_in_one_upload_is_saved_once(self):
+        body = self.upload([self.record("a"), self.record("a"), self.record()])
+        self.assertEqual((body["created"], body["duplicates"], body["errors"]), (2, 1, 0))
+        first, repeat, _ = body["results"]
+        self.assertEqual(repeat, {"index": 1, "status": "duplicate", "id": first["id"]})
+        self.assertEqual(Report.objects.count(), 2)
+
+    def test_stored_key_is_a_duplicate(self):
+        stored = Report.objects.create(pest_name="aphids", confidence=0.8, description="leaf", idempotency_key="a")
+        body = self.upload([self.record("a"), self.record("b")], content_type="application/x-ndjson")
+        self.assertEqual(body["results"][0], {"index": 0, "status": "duplicate", "id": stored.id})
+        self.assertEqual(body["results"][1]["status"], "created")
+
+    def test_invalid_records_do_not_stop_the_others(self):
+        body = self.upload([self.record(confidence="high"), self.record("b")])
+        self.assertEqual(body["results"][0]["status"], "error")
+        self.assertIn("confidence", body["results"][0]["errors"])
+        self.assertEqual(body["created"], 1)
+        response = self.client.post("/api/reports/bulk/", "{}", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_detected_at_becomes_the_timestamp(self):
+        captured = (timezone.now() - timedelta(days=2)).replace(microsecond=0)
+        body = self.upload([self.record(detected_at=captured.isoformat())])
+        report = Report.objects.get(id=body["results"][0]["id"])
+        self.assertEqual(report.timestamp, captured)
+        self.assertEqual(
+            list(PestDailyRollup.objects.values_list("day", flat=True)), [timezone.localdate(captured)],
+        )
+
+    def test_detected_at_must_be_a_plausible_aware_time(self):
+        now = timezone.now()
+        for value in (
+            "2026-05-10T09:30:00",  # No UTC offset
+            (now + timedelta(hours=1)).isoformat(),
+            (now - timedelta(days=400)).isoformat(),
+            "yesterday",
+        ):
+            with self.subTest(detected_at=value):
+                result = self.upload([self.record(detected_at=value)])["results"][0]
+                self.assertEqual(result["status"], "error")
+                self.assertIn("detected_at", result["errors"])
+
+
+class SaveReportTests(TestCase):
+    def save(self, **fields):
+        return self.client.post(
+            "/api/save-report/", {"pest_name": "aphids", "confidence": 0.8, "description": "leaf", **fields},
+            content_type="application/json",
+        )
+
+    def test_retry_with_the_same_key_returns_the_saved_report(self):
+        first = self.save(idempotency_key="retry-1")
+        self.assertEqual(first.status_code, 201)
+        retry = self.save(idempotency_key="retry-1")
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json()["report_id"], first.json()["report_id"])
+        self.assertEqual(Report.objects.count(), 1)
+        self.assertEqual(self.save().status_code, 201)
+
+    def test_key_is_not_listed(self):
+        self.save(idempotency_key="retry-1")
+        report = self.client.get("/api/reports/").json()["results"][0]
+        self.assertNotIn("idempotency_key", report)
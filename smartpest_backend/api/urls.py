@@ -1,11 +1,20 @@
 from django.urls import path
-from .views import PestDetectionView, pest_info, save_report, ReportListView, register_user, login_user, UserListView, FeedbackListView, FeedbackCreateView, PesticideListView, PesticideDetailView, FeedbackDestroyView, FeedbackUpdateView, PestListView, PestDetailView
+from .views import PestDetectionView, pest_info, save_report, ReportListView, register_user, login_user, UserListView, FeedbackListView, FeedbackCreateView, PesticideListView, PesticideDetailView, FeedbackDestroyView, FeedbackUpdateView, PestListView, PestDetailView, inference_stats_view, BatchPestDetectionView, PredictionJobCreateView, prediction_job_status, prediction_job_events, search_view, admin_stats_view, detection_analytics, bulk_save_reports
 
 urlpatterns = [
     path('predict/', PestDetectionView.as_view(), name='predict'),
+    path('predict/batch/', BatchPestDetectionView.as_view(), name='predict-batch'),
+    path('jobs/', PredictionJobCreateView.as_view(), name='job-create'),
+    path('jobs/<uuid:job_id>/', prediction_job_status, name='job-status'),
+    path('jobs/<uuid:job_id>/events/', prediction_job_events, name='job-events'),
+    path('inference/stats/', inference_stats_view, name='inference-stats'),
     path('pest-info/<str:pest_name>/', pest_info, name='pest-info'),
+    path('search/', search_view, name='search'),
+    path('admin/stats/', admin_stats_view, name='admin-stats'),
+    path('analytics/detections/', detection_analytics, name='detection-analytics'),
     path('save-report/', save_report, name='save-report'),
     path('reports/', ReportListView.as_view(), name='report-list'),
+    path('reports/bulk/', bulk_save_reports, name='report-bulk'),
     path('register/', register_user, name='register'),
     path('login/', login_user, name='login'),
     path('users/', UserListView.as_view(), name='user-list'),
@@ -2,7 +2,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser
 from rest_framework.decorators import api_view, permission_classes
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
@@ -10,17 +10,30 @@ from rest_framework.permissions import (
     AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser
 )
 
-from .inference import predict_image
-from .models import Report, User, Feedback, Pesticide, Pest
+from . import data_version, ingest, metrics, rollups, search, stats
+from .data_version import reference_cache
+from .inference import predict_image, predict_images, inference_stats, batch_limits, top_k_limit
+from .jobs import enqueue, get_job, job_payload, job_settings, job_stats, TERMINAL_STATUSES
+from .models import Report, User, Feedback, Pesticide, Pest, PredictionJob
+from .pagination import ReportCursorPagination
+from .pest_data import pest_details, pest_details_many
 from .serializers import (
     ReportSerializer, UserSerializer, FeedbackSerializer,
     PesticideSerializer, PestSerializer
 )
-import tempfile
+import datetime
 import json
 import os
+import time
+import zipfile
 
 from rest_framework import generics
+from rest_framework.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.decorators import method_decorator
 
 
 def _ensure_admin_flags(user: User) -> None:
@@ -52,82 +65,302 @@ def _ensure_admin_flags(user: User) -> None:
         if changed:
             user.save()
 
+def _truthy(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
 class PestDetectionView(APIView):
+    """Classify one image.
+
+    Optional form fields (or query parameters): ``top_k`` lists the k most likely classes
+    under ``predictions``, and ``include_info=1`` adds each one's description and
+    pesticides so the client doesn't need a follow-up /pest-info/ request.
+    """
     parser_classes = [MultiPartParser]
     permission_classes = [AllowAny]
 
     def post(self, request, format=None):
-        image_file = request.FILES.get('image')
+        # Multipart parsing happens on first access to request.FILES
+        with metrics.stage("upload"):
+            image_file = request.FILES.get('image')
         if not image_file:
             return Response({"error": "No image uploaded."}, status=400)
 
-        # Save image temporarily
-        with tempfile.NamedTemporaryFile(delete=False) as temp:
-            for chunk in image_file.chunks():
-                temp.write(chunk)
-            temp_path = temp.name
-
+        top_k = request.data.get('top_k') or request.query_params.get('top_k')
+        include_info = _truthy(request.data.get('include_info') or request.query_params.get('include_info'))
+        if top_k is not None:
+            try:
+                top_k = int(top_k)
+            except ValueError:
+                return Response({"error": "top_k must be an integer."}, status=400)
+            if not 1 <= top_k <= top_k_limit():
+                return Response({"error": f"top_k must be between 1 and {top_k_limit()}."}, status=400)
+        elif include_info:
+            top_k = 1
+
+        # Decoded straight from the upload: small files never touch the disk, large ones are
+        # spooled by Django itself (see FILE_UPLOAD_MAX_MEMORY_SIZE) and cleaned up after the request
         try:
-            result = predict_image(temp_path)
+            with metrics.stage("predict"):
+                result = predict_image(image_file, top_k=top_k)
+            if include_info and 'predictions' in result:
+                details = pest_details_many([prediction['class'] for prediction in result['predictions']])
+                result['predictions'] = [
+                    {**prediction, **details[prediction['class']]} for prediction in result['predictions']
+                ]
             return Response(result)
         except Exception as e:
             return Response({"error": f"Prediction failed: {str(e)}"}, status=500)
-        finally:
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
 
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticatedOrReadOnly])
-def pest_info(request, pest_name):
-    """Get detailed information about a specific pest"""
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    desc_path = os.path.join(base_dir, 'pest_description.json')
-    pest_path = os.path.join(base_dir, 'pesticides_info.json')
+def _zip_images(archive, max_images, max_member_bytes):
+    """(filename, bytes) for each image inside a zip upload, read one member at a time."""
+    image_exts = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+    with zipfile.ZipFile(archive) as zf:
+        members = [
+            m for m in zf.infolist()
+            if not m.is_dir() and m.filename.lower().endswith(image_exts)
+            and not os.path.basename(m.filename).startswith('.')
+        ]
+        for member in members[:max_images]:
+            if member.file_size > max_member_bytes:
+                yield member.filename, _RejectedFile(f"File is larger than {max_member_bytes} bytes")
+                continue
+            yield member.filename, zf.read(member)
+
+
+class _RejectedFile:
+    """Stand-in for an upload that must not be read; reading it reports why."""
+
+    def __init__(self, reason):
+        self.reason = reason
+
+    def read(self):
+        raise ValueError(self.reason)
+
+
+class BatchPestDetectionView(APIView):
+    """Classify many images in one request and stream one NDJSON line per image as results come in.
+
+    Accepts any number of ``images`` file fields and/or one ``archive`` zip file.
+    """
+    parser_classes = [MultiPartParser]
+    permission_classes = [AllowAny]
+
+    def post(self, request, format=None):
+        files = request.FILES.getlist('images')
+        archive = request.FILES.get('archive')
+        if not files and not archive:
+            return Response({"error": "No images uploaded. Send 'images' files or an 'archive' zip."}, status=400)
+
+        limits = batch_limits()
+        if len(files) > limits["max_images"]:
+            return Response({"error": f"At most {limits['max_images']} images per request."}, status=400)
+        if archive is not None and not zipfile.is_zipfile(archive):
+            return Response({"error": "'archive' is not a zip file."}, status=400)
+
+        def items():
+            for f in files:
+                # Refused before reading, like oversized zip members: big uploads are spooled, not decoded
+                if f.size > limits["max_file_bytes"]:
+                    yield f.name, _RejectedFile(f"File is larger than {limits['max_file_bytes']} bytes")
+                else:
+                    yield f.name, f
+            if archive is not None:
+                remaining = limits["max_images"] - len(files)
+                yield from _zip_images(archive, remaining, limits["max_file_bytes"])
+
+        def stream():
+            total = errors = 0
+            for entry in predict_images(items()):
+                total += 1
+                errors += 'error' in entry
+                yield json.dumps(entry) + "\n"
+            yield json.dumps({"summary": {"images": total, "errors": errors}}) + "\n"
+
+        response = StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class PredictionJobCreateView(APIView):
+    """Queue an image for classification and return a job id immediately (202).
+
+    Poll ``/api/jobs/<job_id>/`` or subscribe to ``/api/jobs/<job_id>/events/`` for the result.
+    """
+    parser_classes = [MultiPartParser]
+    permission_classes = [AllowAny]
+
+    def post(self, request, format=None):
+        image_file = request.FILES.get('image')
+        if not image_file:
+            return Response({"error": "No image uploaded."}, status=400)
+        max_bytes = job_settings()["max_image_bytes"]
+        if image_file.size > max_bytes:
+            return Response({"error": f"Image is larger than {max_bytes} bytes."}, status=413)
+
+        user_id = str(request.user.id) if request.user.is_authenticated else 'anonymous'
+        job = enqueue(image_file.read(), image_file.name or '', user_id)
+        return Response({
+            "job_id": str(job.id),
+            "status": job.status,
+            "status_url": request.build_absolute_uri(f"/api/jobs/{job.id}/"),
+            "events_url": request.build_absolute_uri(f"/api/jobs/{job.id}/events/"),
+        }, status=status.HTTP_202_ACCEPTED)
 
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def prediction_job_status(request, job_id):
+    """Current status of a prediction job, with the result once it is done"""
     try:
-        with open(desc_path, 'r', encoding='utf-8') as f:
-            desc_data = json.load(f)
-        # Normalize keys to lowercase for case-insensitive matching
-        desc_dict = {str(item.get('pest_name', '')).strip().lower(): item.get('description', '') for item in desc_data}
-    except FileNotFoundError:
-        desc_dict = {}
+        job = get_job(job_id)
+    except PredictionJob.DoesNotExist:
+        return Response({"error": "Job not found."}, status=404)
+    return Response(job_payload(job))
+
+
+def prediction_job_events(request, job_id):
+    """Server-sent events: a `status` event on every change, ending with the finished job.
 
+    Each connection holds a web thread, so it only lasts SMARTPEST_JOB_EVENTS_WINDOW seconds
+    (default 10); the browser's EventSource then reconnects after the ``retry`` delay and
+    gets the current status again. Polling ``/api/jobs/<job_id>/`` costs no thread between polls.
+    """
+    if request.method != 'GET':
+        return JsonResponse({"error": "Method not allowed."}, status=405)
     try:
-        with open(pest_path, 'r', encoding='utf-8') as f:
-            pest_data = json.load(f)
-        # Normalize keys to lowercase for case-insensitive matching
-        pest_dict = {str(item.get('pest_name', '')).strip().lower(): item.get('pesticides', []) for item in pest_data}
-    except FileNotFoundError:
-        pest_dict = {}
-
-    normalized_name = str(pest_name).strip().lower()
-    description = desc_dict.get(normalized_name, 'No detailed description available.')
-    pesticides = pest_dict.get(normalized_name, [])
-
-    if not pesticides:
-        pesticides = [{
-            'name': 'No pesticide data available',
-            'dosage': '',
-            'safety_precautions': ''
-        }]
+        get_job(job_id)
+    except PredictionJob.DoesNotExist:
+        return JsonResponse({"error": "Job not found."}, status=404)
+
+    poll = float(os.environ.get('SMARTPEST_JOB_EVENTS_POLL_SECONDS', '0.5'))
+    window = float(os.environ.get('SMARTPEST_JOB_EVENTS_WINDOW', '10'))
+
+    def stream():
+        deadline = time.monotonic() + window
+        last_status = None
+        yield "retry: 2000\n\n"
+        while time.monotonic() < deadline:
+            try:
+                job = get_job(job_id)
+            except PredictionJob.DoesNotExist:
+                yield f"event: error\ndata: {json.dumps({'error': 'Job not found.'})}\n\n"
+                return
+            if job.status != last_status:
+                last_status = job.status
+                yield f"event: status\ndata: {json.dumps(job_payload(job))}\n\n"
+                if job.status in TERMINAL_STATUSES:
+                    return
+            time.sleep(poll)
+        # End of the window: closing the stream frees the thread and the client reconnects
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def inference_stats_view(request):
+    """Queue depth and batch size histograms of the inference engine, plus async job counts"""
+    return JsonResponse({**inference_stats(), **job_stats()})
 
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrReadOnly])
+@reference_cache
+def pest_info(request, pest_name):
+    """Get detailed information about a specific pest"""
+    details = pest_details(pest_name)
     return JsonResponse({
         'pest_name': pest_name,
-        'description': description,
-        'pesticides': pesticides
+        'description': details['description'],
+        'pesticides': details['pesticides']
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_stats_view(request):
+    """Dashboard totals, latest detections, per-pest counts and a per-day series (?latest=5&days=30&pests=20)"""
+    limits = {'latest': (5, stats.MAX_LATEST), 'days': (30, stats.MAX_DAYS), 'pests': (20, stats.MAX_PESTS)}
+    params = {}
+    for name, (default, maximum) in limits.items():
+        try:
+            params[name] = int(request.query_params.get(name, default))
+        except ValueError:
+            return JsonResponse({"error": f"{name} must be an integer."}, status=400)
+        if not 1 <= params[name] <= maximum:
+            return JsonResponse({"error": f"{name} must be between 1 and {maximum}."}, status=400)
+    return JsonResponse(stats.admin_stats(**params))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrReadOnly])
+def detection_analytics(request):
+    """Detections per hour, day or week from the rollup tables (?bucket=day&days=30&pest_name=)"""
+    bucket = request.query_params.get('bucket', 'day')
+    pest_name = request.query_params.get('pest_name') or None
+    try:
+        days = int(request.query_params.get('days', 30))
+    except ValueError:
+        return JsonResponse({"error": "days must be an integer."}, status=400)
+    if not 1 <= days <= stats.MAX_DAYS:
+        return JsonResponse({"error": f"days must be between 1 and {stats.MAX_DAYS}."}, status=400)
+    try:
+        series = rollups.detection_series(bucket, days, pest_name)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"bucket": bucket, "days": days, "pest_name": pest_name, "series": series})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticatedOrReadOnly])
+def search_view(request):
+    """Ranked, highlighted full-text search: ?q=...&type=pest,pesticide,report,feedback&page=1&page_size=20"""
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return JsonResponse({"error": "Missing search query (?q=)."}, status=400)
+    kinds = [kind.strip() for kind in request.query_params.get('type', '').split(',') if kind.strip()]
+    unknown = sorted(set(kinds) - set(search.KINDS))
+    if unknown:
+        return JsonResponse({"error": f"Unknown type(s): {', '.join(unknown)}. Choose from {', '.join(search.KINDS)}."}, status=400)
+    try:
+        page = int(request.query_params.get('page', 1))
+        page_size = int(request.query_params.get('page_size', 20))
+    except ValueError:
+        return JsonResponse({"error": "page and page_size must be integers."}, status=400)
+    if page < 1 or not 1 <= page_size <= search.MAX_PAGE_SIZE:
+        return JsonResponse({"error": f"page must be >= 1 and page_size between 1 and {search.MAX_PAGE_SIZE}."}, status=400)
+    return JsonResponse(search.search(query, kinds or search.KINDS, page, page_size))
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def save_report(request):
     """Save a pest detection report"""
     try:
         data = json.loads(request.body)
+        key = data.get('idempotency_key') if isinstance(data, dict) else None
+        if key:
+            existing = Report.objects.filter(idempotency_key=key).values_list('id', flat=True).first()
+            if existing is not None:
+                return JsonResponse({"message": "Report already saved", "report_id": existing}, status=200)
         serializer = ReportSerializer(data=data)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                # The rollups are counted by a post_save handler in the same transaction
+                with transaction.atomic():
+                    serializer.save()
+            except IntegrityError:
+                # A concurrent retry with the same key got there first
+                existing = Report.objects.filter(idempotency_key=key).values_list('id', flat=True).first() if key else None
+                if existing is None:
+                    raise
+                return JsonResponse({"message": "Report already saved", "report_id": existing}, status=200)
             return JsonResponse({
                 "message": "Report saved successfully",
                 "report_id": serializer.data['id']
@@ -138,13 +371,82 @@ def save_report(request):
         return JsonResponse({"error": f"Failed to save report: {str(e)}"}, status=500)
 
 
-class ReportListView(APIView):
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def bulk_save_reports(request):
+    """Save many reports at once from a JSON array or an NDJSON body, with a status per record"""
+    limits = ingest.ingest_limits()
+    try:
+        if request.content_type.split(';')[0].strip() in ingest.NDJSON_TYPES:
+            stream = request.stream  # None for an empty body
+            items = ingest.read_ndjson(stream.readline if stream else (lambda: b''), limits["max_records"])
+        else:
+            items = ingest.parse_json_array(request.body, limits["max_records"])
+    except ingest.IngestError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if not items:
+        return JsonResponse({"error": "No reports in the request body."}, status=400)
+    return JsonResponse(ingest.ingest(items, limits["batch_size"]))
+
+
+def _parse_timestamp(name, value):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: "Expected an ISO 8601 date or date-time."})
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def _parse_confidence(name, value):
+    try:
+        confidence = float(value)
+    except ValueError:
+        raise ValidationError({name: "Expected a number between 0 and 1."})
+    if not 0.0 <= confidence <= 1.0:
+        raise ValidationError({name: "Expected a number between 0 and 1."})
+    return confidence
+
+
+def filter_reports(queryset, params):
+    """Apply the /api/reports/ filters in ``params``; each one is served by an index on ``Report``.
+
+    ``pest_name`` (exact) or ``pest_name_prefix`` (ignoring case), ``user_id``, ``min_confidence`` (inclusive),
+    ``max_confidence`` (exclusive), ``since`` (inclusive) and ``until`` (exclusive).
+    """
+    if params.get('pest_name'):
+        queryset = queryset.filter(pest_name=params['pest_name'])
+    if params.get('pest_name_prefix'):
+        prefix = params['pest_name_prefix'].lower()
+        # The range lets the Lower(pest_name) index bound the scan; LIKE alone wouldn't on SQLite
+        queryset = queryset.alias(pest_name_lower=Lower('pest_name')).filter(
+            pest_name_lower__gte=prefix, pest_name_lower__lt=prefix + '\U0010ffff', pest_name_lower__startswith=prefix,
+        )
+    if params.get('user_id'):
+        queryset = queryset.filter(user_id=params['user_id'])
+    if params.get('min_confidence'):
+        queryset = queryset.filter(confidence__gte=_parse_confidence('min_confidence', params['min_confidence']))
+    if params.get('max_confidence'):
+        queryset = queryset.filter(confidence__lt=_parse_confidence('max_confidence', params['max_confidence']))
+    if params.get('since'):
+        queryset = queryset.filter(timestamp__gte=_parse_timestamp('since', params['since']))
+    if params.get('until'):
+        queryset = queryset.filter(timestamp__lt=_parse_timestamp('until', params['until']))
+    return queryset
+
+
+class ReportListView(generics.ListAPIView):
+    """Newest reports first, one page at a time: ``{"count", "count_is_exact", "next", "previous", "results"}``.
+
+    Takes ``cursor`` and ``page_size`` plus the filters of ``filter_reports``.
+    """
+    serializer_class = ReportSerializer
+    pagination_class = ReportCursorPagination
     permission_classes = [IsAuthenticatedOrReadOnly]
 
-    def get(self, request, format=None):
-        reports = Report.objects.all().order_by('-timestamp')
-        serializer = ReportSerializer(reports, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        return filter_reports(Report.objects.all(), self.request.query_params)
 
 
 class UserListView(APIView):
@@ -187,25 +489,44 @@ class FeedbackUpdateView(generics.UpdateAPIView):
         return super().get_serializer(*args, **kwargs)
 
 
-class PesticideListView(generics.ListCreateAPIView):
+class ReferenceDataMixin:
+    """Bumps the reference data version (ETags of pest-info, pests and pesticides) on every write."""
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        data_version.bump()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        data_version.bump()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        data_version.bump()
+
+
+# The admin pages poll these lists, so clients revalidate every time (a 304 while unchanged)
+@method_decorator(reference_cache(max_age=0), name='get')
+class PesticideListView(ReferenceDataMixin, generics.ListCreateAPIView):
     queryset = Pesticide.objects.all().order_by('name')
     serializer_class = PesticideSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class PesticideDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PesticideDetailView(ReferenceDataMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Pesticide.objects.all()
     serializer_class = PesticideSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class PestListView(generics.ListCreateAPIView):
+@method_decorator(reference_cache(max_age=0), name='get')
+class PestListView(ReferenceDataMixin, generics.ListCreateAPIView):
     queryset = Pest.objects.all().order_by('name')
     serializer_class = PestSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class PestDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PestDetailView(ReferenceDataMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Pest.objects.all()
     serializer_class = PestSerializer
     permission_classes = [IsAdminUser]
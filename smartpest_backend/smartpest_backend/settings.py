@@ -56,6 +56,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # Must be high, before CommonMiddleware
     'whitenoise.middleware.WhiteNoiseMiddleware', # Add Whitenoise middleware
+    'api.metrics.MetricsMiddleware',  # Request counts and timings for /metrics
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -172,6 +173,10 @@ CORS_ALLOW_HEADERS = [
 ]
 
 
+# Uploads up to this size stay in memory and go straight to the model; larger ones are spooled to disk
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.environ.get('SMARTPEST_UPLOAD_SPOOL_BYTES', 10 * 1024 * 1024))
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
@@ -14,16 +14,38 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import os
+
 from django.contrib import admin
 from django.urls import path, include
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+
+from api import metrics
+from api.inference import STATE_NOT_STARTED, model_status, start_background_loading
 
 def health_check(request):
     """Simple health check endpoint for Render"""
     return JsonResponse({"status": "healthy", "service": "smartpest-backend"})
 
+def readiness_check(request):
+    """Readiness endpoint: 200 once the model is warm (or mock mode is active), 503 otherwise"""
+    if model_status()["state"] == STATE_NOT_STARTED:
+        # Without SMARTPEST_PRELOAD_MODEL nothing else would start the load before traffic arrives
+        start_background_loading(on_demand=True)
+    status = model_status()
+    return JsonResponse(status, status=200 if status["ready"] else 503)
+
+def metrics_view(request):
+    """Prometheus text-format metrics merged across all worker processes"""
+    token = os.environ.get('SMARTPEST_METRICS_TOKEN', '')
+    if token and request.headers.get('Authorization', '') != f'Bearer {token}':
+        return HttpResponse(status=401)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path('healthz/', health_check, name='health_check'),
+    path('readyz/', readiness_check, name='readiness_check'),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smartpest_backend.settings')
 
 application = get_wsgi_application()
+
+# Load and warm up the classifier in the background so the first request doesn't pay for it
+from api.inference import start_background_loading  # noqa: E402
+from api.jobs import start_workers  # noqa: E402
+
+start_background_loading()
+# Async prediction job workers (SMARTPEST_JOB_WORKERS, default 0: run `manage.py run_prediction_workers` instead)
+start_workers()